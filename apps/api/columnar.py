@@ -0,0 +1,233 @@
+"""
+Columnar opinion export.
+
+The same eleven fields as ``opinions.tsv``, stored column by column in a
+directory so readers can load only the columns they need, without splitting
+TSV lines::
+
+    opinions.columns/
+        schema.json         row count, byte order, column types, dictionaries
+        id.bin              fixed width integers (array module typecodes)
+        type.bin            dictionary codes, 8, 16 or 32 bit per row
+        url.bin             UTF-8 data of all values, back to back
+        url.offsets         row i is data[offsets[i]:offsets[i + 1]]
+        ...
+
+Integer columns are typed arrays, low-cardinality columns (type, product,
+version, platform, locale, manufacturer, device) are dictionary encoded and
+free text (url, description) is stored Arrow-style as offsets plus data.
+Dictionary codes are as wide as the column's dictionary needs: a column with
+up to 256 distinct values costs one byte per row.
+
+This module does not depend on Django.
+"""
+import json
+import os
+import shutil
+import sys
+from array import array
+from itertools import izip
+
+
+INT, DICT, STRING = 'int', 'dict', 'string'
+
+# (name, kind, array typecode) in TSV column order. Dictionary codes start
+# out 8 bit and are widened to the next of DICT_TYPECODES once a column has
+# more distinct values; text offsets are as wide as a C long (64 bit on 64
+# bit Unix; the array module has no 'Q' typecode in Python 2).
+COLUMNS = (
+    ('id', INT, 'I'),
+    ('created', INT, 'I'),
+    ('type', DICT, 'B'),
+    ('product', DICT, 'B'),
+    ('version', DICT, 'B'),
+    ('platform', DICT, 'B'),
+    ('locale', DICT, 'B'),
+    ('manufacturer', DICT, 'B'),
+    ('device', DICT, 'B'),
+    ('url', STRING, 'L'),
+    ('description', STRING, 'L'),
+)
+COLUMN_NAMES = [c[0] for c in COLUMNS]
+DICT_TYPECODES = ('B', 'H', 'I')
+
+
+def _max(typecode):
+    """Largest value an item of ``typecode`` holds."""
+    return (1 << 8 * array(typecode).itemsize) - 1
+
+
+class ColumnWriter(object):
+    """
+    Write rows to a columnar export directory. Rows are buffered per column
+    and flushed with ``flush()``; ``close()`` writes the schema and moves the
+    finished export into place.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp = '%s_exporting' % path
+        if os.path.exists(self.tmp):
+            shutil.rmtree(self.tmp)
+        os.makedirs(self.tmp)
+
+        self.rows = 0
+        self.columns = []
+        for name, kind, typecode in COLUMNS:
+            col = {'name': name, 'kind': kind, 'typecode': typecode,
+                   'buffer': array(typecode), 'max': _max(typecode),
+                   'file': open(self._file(name, '.bin'), 'wb')}
+            if kind == DICT:
+                col['codes'] = {}
+                col['dictionary'] = []
+                # Typecodes to widen to, narrowest first.
+                col['wider'] = list(
+                    DICT_TYPECODES[DICT_TYPECODES.index(typecode) + 1:])
+            elif kind == STRING:
+                col['offset'] = 0
+                col['offsets'] = open(self._file(name, '.offsets'), 'wb')
+                array(typecode, [0]).tofile(col['offsets'])
+            self.columns.append(col)
+
+    def _file(self, name, ext):
+        return os.path.join(self.tmp, name + ext)
+
+    def append(self, row):
+        """
+        Add one row of eleven values, as written to the TSV export: ints for
+        id/created, UTF-8 encoded strings or None for the rest.
+        """
+        for col, value in zip(self.columns, row):
+            kind = col['kind']
+            if kind == INT:
+                col['buffer'].append(value)
+            elif kind == DICT:
+                code = col['codes'].get(value)
+                if code is None:
+                    code = len(col['dictionary'])
+                    if code > col['max'] and col['wider']:
+                        self._widen(col)
+                    if code > col['max']:
+                        raise ValueError('Column %s has more than %d distinct '
+                                         'values.' % (col['name'],
+                                                      col['max'] + 1))
+                    col['codes'][value] = code
+                    col['dictionary'].append(value)
+                col['buffer'].append(code)
+            else:
+                value = value or ''
+                if col['offset'] + len(value) > col['max']:
+                    raise ValueError('Column %s holds more than %d bytes of '
+                                     'text.' % (col['name'], col['max']))
+                col['file'].write(value)
+                col['offset'] += len(value)
+                col['buffer'].append(col['offset'])
+        self.rows += 1
+
+    def _widen(self, col):
+        """
+        Switch a dictionary column to its next wider typecode, rewriting the
+        codes written so far.
+        """
+        self._flush(col)
+        col['file'].close()
+        filename = self._file(col['name'], '.bin')
+        codes = array(col['typecode'])
+        with open(filename, 'rb') as f:
+            codes.fromstring(f.read())
+
+        typecode = col['wider'].pop(0)
+        col['typecode'], col['max'] = typecode, _max(typecode)
+        col['buffer'] = array(typecode)
+        col['file'] = open(filename, 'wb')
+        array(typecode, codes).tofile(col['file'])
+
+    def _flush(self, col):
+        f = col['offsets'] if col['kind'] == STRING else col['file']
+        col['buffer'].tofile(f)
+        del col['buffer'][:]
+
+    def flush(self):
+        for col in self.columns:
+            self._flush(col)
+
+    def close(self):
+        self.flush()
+        schema = {'rows': self.rows, 'byteorder': sys.byteorder,
+                  'columns': []}
+        for col in self.columns:
+            col['file'].close()
+            if col['kind'] == STRING:
+                col['offsets'].close()
+            info = {'name': col['name'], 'kind': col['kind'],
+                    'typecode': col['typecode'],
+                    'itemsize': array(col['typecode']).itemsize}
+            if col['kind'] == DICT:
+                info['dictionary'] = [v if v is None else v.decode('utf-8')
+                                      for v in col['dictionary']]
+            schema['columns'].append(info)
+
+        with open(os.path.join(self.tmp, 'schema.json'), 'w') as f:
+            json.dump(schema, f, indent=2)
+
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        shutil.move(self.tmp, self.path)
+
+
+def read_schema(path):
+    with open(os.path.join(path, 'schema.json')) as f:
+        return json.load(f)
+
+
+def _read_array(filename, info, count, byteorder):
+    data = array(info['typecode'])
+    if data.itemsize != info['itemsize']:
+        raise ValueError('Column %s was written with %d byte items, this '
+                         'platform uses %d.' % (info['name'], info['itemsize'],
+                                                data.itemsize))
+    with open(filename, 'rb') as f:
+        data.fromfile(f, count)
+    if byteorder != sys.byteorder:
+        data.byteswap()
+    return data
+
+
+def read_column(path, name, schema=None):
+    """
+    Load a single column: an ``array`` for integer columns, a list of
+    (unicode or None) values for dictionary columns and a list of unicode
+    strings for text columns.
+    """
+    schema = schema or read_schema(path)
+    info = dict((c['name'], c) for c in schema['columns'])[name]
+    rows, byteorder = schema['rows'], schema['byteorder']
+    filename = lambda ext: os.path.join(path, name + ext)
+
+    if info['kind'] == INT:
+        return _read_array(filename('.bin'), info, rows, byteorder)
+
+    if info['kind'] == DICT:
+        codes = _read_array(filename('.bin'), info, rows, byteorder)
+        dictionary = info['dictionary']
+        return [dictionary[code] for code in codes]
+
+    offsets = _read_array(filename('.offsets'), info, rows + 1, byteorder)
+    with open(filename('.bin'), 'rb') as f:
+        data = f.read()
+    return [data[offsets[i]:offsets[i + 1]].decode('utf-8')
+            for i in xrange(rows)]
+
+
+def read_columns(path, names=None):
+    """Load the named columns (default: all) into a dict of name -> column."""
+    schema = read_schema(path)
+    return dict((name, read_column(path, name, schema))
+                for name in (names or COLUMN_NAMES))
+
+
+def iter_rows(path, names=None):
+    """Iterate over rows of the named columns (default: all), as tuples."""
+    names = names or COLUMN_NAMES
+    columns = read_columns(path, names)
+    return izip(*[columns[name] for name in names])
@@ -0,0 +1,154 @@
+"""
+Compression stage for the opinion exports.
+
+``bz2`` exports are a single bz2 stream, compressed in one process, so they
+can be read with ``bz2.BZ2File`` (which stops after the first stream) as well
+as ``bzip2 -d``.
+
+For the other formats, chunks of serialized TSV data are compressed
+independently, optionally in a process pool, and written out back to back:
+
+* ``gz``: concatenated gzip members, read by ``zcat`` and ``gzip.GzipFile``.
+* ``pbz2``: concatenated bz2 streams, like ``pbzip2`` writes. Read by
+  ``bzip2 -d``, Hadoop and ``read_chunks`` below, but *not* by
+  ``bz2.BZ2File``, so these files get their own suffix.
+
+This module does not depend on Django, so it can be benchmarked standalone.
+"""
+import bz2
+import gzip
+import multiprocessing
+from cStringIO import StringIO
+
+
+READ_CHUNK_SIZE = 1024 * 1024  # Bytes to read at a time when decompressing.
+
+
+def _compress_bz2(data):
+    return bz2.compress(data, 9)
+
+
+def _compress_gz(data):
+    buf = StringIO()
+    member = gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6)
+    member.write(data)
+    member.close()
+    return buf.getvalue()
+
+
+def _compress_none(data):
+    return data
+
+
+# Export format -> (file name suffix, compression function)
+FORMATS = {
+    'bz2': ('.bz2', _compress_bz2),
+    'pbz2': ('.multistream.bz2', _compress_bz2),
+    'gz': ('.gz', _compress_gz),
+    'tsv': ('', _compress_none),
+}
+
+
+def compressed_name(name, format):
+    """Append the suffix for ``format`` to an uncompressed file name."""
+    return name + FORMATS[format][0]
+
+
+def format_for(path):
+    """Guess the export format from a file name."""
+    # Longest suffix first: '.multistream.bz2' also ends in '.bz2'.
+    for format, (suffix, _) in sorted(FORMATS.items(),
+                                      key=lambda f: -len(f[1][0])):
+        if suffix and path.endswith(suffix):
+            return format
+    return 'tsv'
+
+
+def _windows(chunks, size):
+    window = []
+    for chunk in chunks:
+        window.append(chunk)
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+def write_compressed(outfile, chunks, format='bz2', processes=None):
+    """
+    Compress each chunk of ``chunks`` and write the results to ``outfile`` in
+    order.
+
+    ``bz2`` is written as one stream, in this process. For other formats,
+    with more than one process, chunks are compressed concurrently in a
+    process pool. Only ``2 * processes`` chunks are held in memory at a time,
+    so ``chunks`` may be a (lazy) generator over a huge table.
+    """
+    compress = FORMATS[format][1]
+    processes = processes or multiprocessing.cpu_count()
+
+    if format == 'bz2':
+        compressor = bz2.BZ2Compressor(9)
+        for chunk in chunks:
+            outfile.write(compressor.compress(chunk))
+        outfile.write(compressor.flush())
+        return
+
+    if processes == 1 or compress is _compress_none:
+        for chunk in chunks:
+            outfile.write(compress(chunk))
+        return
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for window in _windows(chunks, 2 * processes):
+            for data in pool.map(compress, window):
+                outfile.write(data)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _read_bz2(f):
+    """Decompress all (concatenated) bz2 streams in a file."""
+    decompressor = bz2.BZ2Decompressor()
+    while True:
+        data = f.read(READ_CHUNK_SIZE)
+        if not data:
+            break
+        while data:
+            try:
+                out = decompressor.decompress(data)
+            except EOFError:
+                # The previous stream ended exactly at a chunk boundary.
+                decompressor = bz2.BZ2Decompressor()
+                continue
+            if out:
+                yield out
+            data = decompressor.unused_data
+            if data:
+                decompressor = bz2.BZ2Decompressor()
+
+
+def read_chunks(path):
+    """
+    Yield the decompressed contents of an export file in chunks.
+
+    Unlike ``bz2.BZ2File``, this reads *all* streams of a multi-stream
+    (``pbz2``) file.
+    """
+    format = format_for(path)
+    with open(path, 'rb') as f:
+        if format in ('bz2', 'pbz2'):
+            for out in _read_bz2(f):
+                yield out
+            return
+
+        if format == 'gz':
+            f = gzip.GzipFile(fileobj=f)
+        while True:
+            out = f.read(READ_CHUNK_SIZE)
+            if not out:
+                break
+            yield out
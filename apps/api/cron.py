@@ -1,7 +1,10 @@
-import bz2
 import csv
+import errno
+import json
 import os.path
 import shutil
+import time
+from cStringIO import StringIO
 from time import mktime
 
 from django.conf import settings
@@ -9,12 +12,23 @@ from django.conf import settings
 import commonware.log
 import cronjobs
 
+from api.columnar import ColumnWriter
+from api.compress import (compressed_name, format_for, read_chunks,
+                          write_compressed)
 from input import PRODUCT_IDS
 from feedback.models import Opinion
 from input import OPINION_TYPES
 
 
 BUCKET_SIZE = 10000  # Bucket size to split query set into.
+# Columns read from the DB per opinion, in export order. Must start with 'id'.
+EXPORT_FIELDS = ('id', 'created', '_type', 'product', 'version', 'platform',
+                 'locale', 'manufacturer', 'device', 'url', 'description')
+DEFAULT_FORMAT = 'bz2'  # One of api.compress.FORMATS.
+SNAPSHOT_NAME = compressed_name('opinions.tsv', DEFAULT_FORMAT)
+MANIFEST_NAME = 'opinions.manifest.json'
+COLUMNS_NAME = 'opinions.columns'
+DELTA_NAME = 'opinions.delta.%04d.tsv'
 log = commonware.log.getLogger('i.export_tsv')
 
 
@@ -34,57 +48,272 @@ def _fix_row(row):
                           x.replace("\r\n", "\n").encode('utf-8')), row)
 
 
-def _split_queryset(qs):
-    """Generator splitting a queryset into buckets."""
-    start = 0
-    end = BUCKET_SIZE
+def _split_queryset(qs, fields=EXPORT_FIELDS):
+    """
+    Generator splitting a queryset into buckets of value tuples.
+
+    Pages by primary key (``id > last_id``) rather than OFFSET, so every
+    bucket costs the same no matter how deep into the table we are. The
+    first of ``fields`` must be ``id``.
+    """
+    qs = qs.order_by('id').values_list(*fields)
+    last_id = 0
     while True:
-        print start
+        split = list(qs.filter(id__gt=last_id)[:BUCKET_SIZE])
+        if not split:
+            return
+        yield split
+        last_id = split[-1][0]
+
+
+def _opinion_row(values):
+    """Turn an ``EXPORT_FIELDS`` value tuple into a TSV row."""
+    (id, created, type, product, version, platform, locale, manufacturer,
+     device, url, description) = values
+    return _fix_row([
+        id,
+        int(mktime(created.timetuple())),
+        getattr(OPINION_TYPES.get(type), 'short', None),
+        getattr(PRODUCT_IDS.get(product), 'short', None),
+        version,
+        platform,
+        locale,
+        manufacturer,
+        device,
+        url,
+        description,
+    ])
+
+
+class _Progress(object):
+    """Log rows/sec while exporting."""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.start = time.time()
+
+    def update(self, rows):
+        self.rows += rows
+        elapsed = max(time.time() - self.start, 0.001)
+        log.info('%s: %d rows exported (%.0f rows/sec).' % (
+            self.name, self.rows, self.rows / elapsed))
+
+
+def _export_path(name):
+    return os.path.join(settings.TSV_EXPORT_DIR, name)
+
+
+def read_manifest(path=None):
+    """
+    Load the export manifest, or return None if there is none yet.
+
+    The manifest records the full snapshot, the delta segments written since
+    and the watermark (``last_id``, ``last_created``) of the newest exported
+    row.
+    """
+    path = path or _export_path(MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_manifest(manifest):
+    path = _export_path(MANIFEST_NAME)
+    tmp = '%s_exporting' % path
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    shutil.move(tmp, path)
+
+
+def manifest_sources(path=None):
+    """
+    List the files a consumer needs to read, in order, to see all exported
+    opinions: the snapshot followed by all delta segments.
+    """
+    path = path or _export_path(MANIFEST_NAME)
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise ValueError('No export manifest found at %s.' % path)
+    export_dir = os.path.dirname(os.path.abspath(path))
+    return [os.path.join(export_dir, name) for name in
+            [manifest['snapshot']] + [d['file'] for d in manifest['deltas']]]
+
+
+def _tsv_chunks(opinions, progress):
+    """Serialize opinions into one chunk of TSV data per bucket."""
+    for bucket in _split_queryset(opinions):
+        buf = StringIO()
+        tsv = csv.writer(buf, dialect=TSVDialect)
+        for values in bucket:
+            try:
+                row = _opinion_row(values)
+                tsv.writerow(row)
+            except Exception, e:
+                log.warning('Error exporting opinion %d: %s' % (
+                    values[0], str(e)))
+            else:
+                progress.first_id = progress.first_id or row[0]
+                progress.last_id, progress.last_created = row[0], row[1]
+        progress.update(len(bucket))
+        yield buf.getvalue()
+
+
+def _write_tsv(path, opinions, name, format=DEFAULT_FORMAT):
+    """
+    Write all opinions in the queryset to a (compressed) TSV file.
+
+    Unless ``format`` is ``bz2`` (one stream), buckets are compressed in
+    parallel, using ``settings.TSV_EXPORT_PROCESSES`` processes.
+
+    Returns ``(rows, first_id, last_id, last_created)`` of what was written.
+    """
+    tmp = '%s_exporting' % path
+    progress = _Progress(name)
+    progress.first_id = progress.last_id = progress.last_created = None
+    with open(tmp, 'wb') as outfile:
+        write_compressed(outfile, _tsv_chunks(opinions, progress), format,
+                         processes=settings.TSV_EXPORT_PROCESSES)
+    shutil.move(tmp, path)
+    return (progress.rows, progress.first_id, progress.last_id,
+            progress.last_created)
 
-        split = qs[start:end]
-        if split:
-            yield split
-        else:
-            raise StopIteration
 
-        start = end
-        end = end + BUCKET_SIZE
+def _remove_export(name):
+    """
+    Remove a file the manifest no longer lists. The new manifest is already
+    in place, so a file that is gone or can't be removed only gets logged.
+    """
+    try:
+        os.remove(_export_path(name))
+    except OSError, e:
+        if e.errno != errno.ENOENT:
+            log.warning('Could not remove old export %s: %s' % (name, e))
+
+
+def _remove_deltas(manifest):
+    for delta in (manifest or {}).get('deltas', []):
+        _remove_export(delta['file'])
 
 
 @cronjobs.register
-def export_tsv():
+def export_tsv(format=DEFAULT_FORMAT):
     """
     Exports a complete dump of the Opinions table to disk, in
     TSV format.
+
+    ``format`` is one of ``bz2`` (default, a single stream), ``pbz2``
+    (``opinions.tsv.multistream.bz2``, compressed in parallel), ``gz`` or
+    ``tsv`` (uncompressed). See ``api.compress``.
     """
-    opinions_path = os.path.join(settings.TSV_EXPORT_DIR, 'opinions.tsv.bz2')
-    opinions_tmp = '%s_exporting' % opinions_path
+    snapshot = compressed_name('opinions.tsv', format)
+    opinions_path = _export_path(snapshot)
     print 'Dumping all opinions into TSV file %s.' % opinions_path
 
-    opinions = Opinion.objects.order_by('id')
-    try:
-        outfile = bz2.BZ2File(opinions_tmp, 'w')
-        tsv = csv.writer(outfile, dialect=TSVDialect)
-        for bucket in _split_queryset(opinions):
-            for opinion in bucket:
-                try:
-                    tsv.writerow(_fix_row([
-                        opinion.id,
-                        int(mktime(opinion.created.timetuple())),
-                        getattr(OPINION_TYPES.get(opinion._type), 'short', None),
-                        getattr(PRODUCT_IDS.get(opinion.product), 'short', None),
-                        opinion.version,
-                        opinion.platform,
-                        opinion.locale,
-                        opinion.manufacturer,
-                        opinion.device,
-                        opinion.url,
-                        opinion.description,
-                    ]))
-                except Exception, e:
-                    log.warning('Error exporting opinion %d: %s' % (
-                        opinion.id, str(e)))
-    finally:
-        outfile.close()
-    shutil.move(opinions_tmp, opinions_path)
+    old_manifest = read_manifest()
+    rows, _, last_id, last_created = _write_tsv(
+        opinions_path, Opinion.objects.no_cache(), 'export_tsv', format)
+    _write_manifest({
+        'snapshot': snapshot,
+        'format': format,
+        'snapshot_rows': rows,
+        'last_id': last_id or 0,
+        'last_created': last_created,
+        'deltas': [],
+    })
+    _remove_deltas(old_manifest)
+    if old_manifest and old_manifest['snapshot'] != snapshot:
+        _remove_export(old_manifest['snapshot'])
+    print 'All opinions dumped to disk.'
+
+
+@cronjobs.register
+def export_tsv_delta():
+    """
+    Exports all opinions newer than the manifest's watermark into a new,
+    numbered delta segment next to the full snapshot.
+
+    Falls back to a full export if there is no manifest yet.
+    """
+    manifest = read_manifest()
+    if manifest is None:
+        log.info('No export manifest yet, doing a full export.')
+        return export_tsv()
+
+    deltas = manifest['deltas']
+    seq = deltas[-1]['seq'] + 1 if deltas else 1
+    format = manifest.get('format', DEFAULT_FORMAT)
+    name = compressed_name(DELTA_NAME % seq, format)
+    opinions = Opinion.objects.no_cache().filter(id__gt=manifest['last_id'])
+    rows, first_id, last_id, last_created = _write_tsv(
+        _export_path(name), opinions, 'export_tsv_delta', format)
+
+    if not rows:
+        os.remove(_export_path(name))
+        log.info('No new opinions since id %d.' % manifest['last_id'])
+        return
+
+    deltas.append({'seq': seq, 'file': name, 'rows': rows,
+                   'first_id': first_id, 'last_id': last_id})
+    manifest['last_id'] = last_id
+    manifest['last_created'] = last_created
+    _write_manifest(manifest)
+    log.info('Wrote %d opinions to delta segment %s.' % (rows, name))
+
+
+@cronjobs.register
+def compact_tsv():
+    """
+    Fold all delta segments into a new full snapshot, without touching the
+    database.
+    """
+    manifest = read_manifest()
+    if not manifest or not manifest['deltas']:
+        log.info('Nothing to compact.')
+        return
+
+    snapshot_path = _export_path(manifest['snapshot'])
+    tmp = '%s_compacting' % snapshot_path
+    with open(tmp, 'wb') as outfile:
+        write_compressed(
+            outfile, (chunk for source in manifest_sources()
+                      for chunk in read_chunks(source)),
+            format_for(snapshot_path),
+            processes=settings.TSV_EXPORT_PROCESSES)
+    shutil.move(tmp, snapshot_path)
+
+    rows = manifest.get('snapshot_rows', 0) + sum(
+        d['rows'] for d in manifest['deltas'])
+    old_manifest = dict(manifest)
+    manifest.update(snapshot_rows=rows, deltas=[])
+    _write_manifest(manifest)
+    _remove_deltas(old_manifest)
+    log.info('Compacted %d delta segments into %s.' % (
+        len(old_manifest['deltas']), manifest['snapshot']))
+
+
+@cronjobs.register
+def export_columns():
+    """
+    Exports a complete dump of the Opinions table to disk, in columnar
+    format (see ``api.columnar``).
+    """
+    path = _export_path(COLUMNS_NAME)
+    print 'Dumping all opinions into columnar export %s.' % path
+
+    writer = ColumnWriter(path)
+    progress = _Progress('export_columns')
+    for bucket in _split_queryset(Opinion.objects.no_cache()):
+        for values in bucket:
+            try:
+                row = _opinion_row(values)
+            except Exception, e:
+                log.warning('Error exporting opinion %d: %s' % (
+                    values[0], str(e)))
+            else:
+                writer.append(row)
+        writer.flush()
+        progress.update(len(bucket))
+    writer.close()
     print 'All opinions dumped to disk.'
@@ -1,15 +1,26 @@
 # -*- coding: utf-8 -*-
+import bz2
+import gzip
+import shutil
 import tempfile
 import os.path
 
 from django.conf import settings
 
 from mock import patch
+from nose.tools import assert_raises
 import test_utils
 from test_utils import eq_
 
 import api.cron
-from api.cron import _fix_row, _split_queryset, export_tsv
+from api.columnar import (COLUMN_NAMES, ColumnWriter, iter_rows,
+                          read_columns, read_schema)
+from api.compress import FORMATS, format_for, read_chunks, write_compressed
+from api.cron import (_fix_row, _split_queryset, export_tsv,
+                      export_tsv_delta, compact_tsv, export_columns,
+                      read_manifest, manifest_sources, COLUMNS_NAME,
+                      SNAPSHOT_NAME)
+from feedback.models import Opinion
 
 
 def test_fix_row():
@@ -19,27 +30,100 @@ def test_fix_row():
     eq_(_fix_row(data), expected)
 
 
-def test_split_queryset():
-    """Split a queryset into pieces."""
-    # Mock queryset object: List with qs-style count function.
-    class MockQs(list):
-        def count(self):
-            return len(self)
+def test_write_compressed():
+    """Chunks compressed separately read back as one file."""
+    chunks = ['%d\tline\n' % i for i in xrange(100)]
+    expected = ''.join(chunks)
+    for format, (suffix, _) in FORMATS.items():
+        for processes in (1, 2):
+            fd, path = tempfile.mkstemp(suffix='.tsv' + suffix)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    write_compressed(f, iter(chunks), format, processes)
+                eq_(''.join(read_chunks(path)), expected)
+            finally:
+                os.remove(path)
 
-    bucket_size = api.cron.BUCKET_SIZE
+    # gzip understands multi-member files, too, and bz2 exports are a single
+    # stream BZ2File reads completely, however many processes there are.
+    for format, open_ in (('gz', gzip.GzipFile), ('bz2', bz2.BZ2File)):
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write_compressed(f, iter(chunks), format, 2)
+            eq_(open_(path).read(), expected)
+        finally:
+            os.remove(path)
+
+
+def test_format_for():
+    eq_(format_for('opinions.tsv.bz2'), 'bz2')
+    eq_(format_for('opinions.tsv.multistream.bz2'), 'pbz2')
+    eq_(format_for('opinions.tsv'), 'tsv')
+
+
+def test_column_limits():
+    """Values that don't fit a column's items fail the export clearly."""
+    tmp = tempfile.mkdtemp()
     try:
-        api.cron.BUCKET_SIZE = 10
+        writer = ColumnWriter(os.path.join(tmp, 'columns'))
+        version = writer.columns[COLUMN_NAMES.index('version')]
+        version['max'], version['wider'] = 1, []
+        writer.columns[COLUMN_NAMES.index('description')]['max'] = 8
+        row = [1, 2, 'praise', 'firefox', '4.0', 'mac', 'en-US', None, None,
+               '', 'abc']
+        writer.append(row)
+        writer.append(row[:4] + ['4.1'] + row[5:])
+        assert_raises(ValueError, writer.append, row[:4] + ['4.2'] + row[5:])
+        assert_raises(ValueError, writer.append, row[:10] + ['def'])
+    finally:
+        shutil.rmtree(tmp)
+
 
-        my_qs = MockQs(range(100))
-        splits = list(_split_queryset(my_qs))
-        eq_(len(splits), 10)
+def test_dictionary_widths():
+    """Dictionary codes are only as wide as the dictionary needs."""
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, 'columns')
+        writer = ColumnWriter(path)
+        rows = [[i, 2, 'praise', 'firefox', '4.0.%d' % i, 'mac', 'en-US',
+                 None, None, '', 'abc'] for i in xrange(300)]
+        for row in rows[:200]:
+            writer.append(row)
+        writer.flush()
+        for row in rows[200:]:
+            writer.append(row)
+        writer.close()
+
+        typecodes = dict((c['name'], c['typecode'])
+                         for c in read_schema(path)['columns'])
+        eq_(typecodes['type'], 'B')
+        eq_(typecodes['version'], 'H')
+        eq_(os.path.getsize(os.path.join(path, 'type.bin')), 300)
+        eq_(os.path.getsize(os.path.join(path, 'version.bin')), 600)
+        eq_(list(iter_rows(path, ['id', 'version'])),
+            [(i, u'4.0.%d' % i) for i in xrange(300)])
     finally:
-        api.cron.BUCKET_SIZE = bucket_size
+        shutil.rmtree(tmp)
 
 
 class ExportTestCase(test_utils.TestCase):
     fixtures = ['feedback/opinions']
 
+    def test_split_queryset(self):
+        """Split a queryset into keyset-paginated buckets."""
+        bucket_size = api.cron.BUCKET_SIZE
+        try:
+            api.cron.BUCKET_SIZE = 10
+
+            qs = Opinion.objects.no_cache()
+            splits = list(_split_queryset(qs, fields=('id',)))
+            eq_(len(splits), (qs.count() + 9) / 10)
+            ids = [row[0] for split in splits for row in split]
+            eq_(ids, sorted(qs.values_list('id', flat=True)))
+        finally:
+            api.cron.BUCKET_SIZE = bucket_size
+
     def test_export_tsv(self):
         """Export some test data, make sure export file is created."""
         old_export_dir = settings.TSV_EXPORT_DIR
@@ -56,3 +140,84 @@ class ExportTestCase(test_utils.TestCase):
         finally:
             settings.TSV_EXPORT_DIR = old_export_dir
             api.cron.BUCKET_SIZE = bucket_size
+
+    def test_export_tsv_delta(self):
+        """Export new opinions as delta segments, then compact them."""
+        old_export_dir = settings.TSV_EXPORT_DIR
+        try:
+            settings.TSV_EXPORT_DIR = tempfile.mkdtemp()
+
+            export_tsv()
+            manifest = read_manifest()
+            eq_(manifest['deltas'], [])
+            eq_(manifest['snapshot_rows'], Opinion.objects.count())
+
+            # Nothing new: no delta segment.
+            export_tsv_delta()
+            eq_(read_manifest()['deltas'], [])
+
+            o = Opinion.objects.create(product=1, description='Delta!')
+            export_tsv_delta()
+            manifest = read_manifest()
+            eq_(len(manifest['deltas']), 1)
+            eq_(manifest['deltas'][0]['rows'], 1)
+            eq_(manifest['last_id'], o.id)
+            eq_(len(manifest_sources()), 2)
+
+            compact_tsv()
+            manifest = read_manifest()
+            eq_(manifest['deltas'], [])
+            eq_(manifest_sources(), [os.path.join(settings.TSV_EXPORT_DIR,
+                                                  SNAPSHOT_NAME)])
+            data = ''.join(read_chunks(manifest_sources()[0]))
+            eq_(data.count('\n'), Opinion.objects.count())
+        finally:
+            shutil.rmtree(settings.TSV_EXPORT_DIR)
+            settings.TSV_EXPORT_DIR = old_export_dir
+
+    def test_export_tsv_old_files_gone(self):
+        """A new export doesn't fail on old files that are already gone."""
+        old_export_dir = settings.TSV_EXPORT_DIR
+        try:
+            settings.TSV_EXPORT_DIR = tempfile.mkdtemp()
+
+            export_tsv()
+            Opinion.objects.create(product=1, description='Delta!')
+            export_tsv_delta()
+            for path in manifest_sources():
+                os.remove(path)
+
+            export_tsv('gz')
+            manifest = read_manifest()
+            eq_(manifest['snapshot'], 'opinions.tsv.gz')
+            eq_(manifest['deltas'], [])
+            eq_(sorted(os.listdir(settings.TSV_EXPORT_DIR)),
+                ['opinions.manifest.json', 'opinions.tsv.gz'])
+        finally:
+            shutil.rmtree(settings.TSV_EXPORT_DIR)
+            settings.TSV_EXPORT_DIR = old_export_dir
+
+    def test_export_columns(self):
+        """Columnar export holds the same rows as the TSV export."""
+        old_export_dir = settings.TSV_EXPORT_DIR
+        try:
+            settings.TSV_EXPORT_DIR = tempfile.mkdtemp()
+
+            export_tsv('tsv')
+            export_columns()
+            path = os.path.join(settings.TSV_EXPORT_DIR, COLUMNS_NAME)
+            eq_(read_schema(path)['rows'], Opinion.objects.count())
+
+            # Only load what we need.
+            cols = read_columns(path, ['id', 'type'])
+            eq_(sorted(cols.keys()), ['id', 'type'])
+            eq_(list(cols['id']),
+                sorted(Opinion.objects.values_list('id', flat=True)))
+
+            tsv = open(os.path.join(settings.TSV_EXPORT_DIR, 'opinions.tsv'))
+            for line, row in zip(tsv, iter_rows(path)):
+                eq_(line.rstrip('\n').split('\t'),
+                    [unicode(v or '').encode('utf-8') for v in row])
+        finally:
+            shutil.rmtree(settings.TSV_EXPORT_DIR)
+            settings.TSV_EXPORT_DIR = old_export_dir
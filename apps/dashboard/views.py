@@ -1,4 +1,5 @@
 import json
+from datetime import date, timedelta
 
 from django.conf import settings
 from django.contrib.sites.models import Site
@@ -11,7 +12,7 @@ from feedback import stats
 from feedback.models import Opinion, Term
 from input import LATEST_BETAS
 from input.decorators import cache_page, forward_mobile
-from search.client import Client, SearchError
+from search.client import rollup_meta
 from search.forms import PROD_CHOICES, VERSION_CHOICES, ReporterSearchForm
 from search.views import get_sentiment, get_defaults
 from website_issues.models import SiteSummary
@@ -43,23 +44,17 @@ def dashboard(request):
     # Get the desktop site's absolute URL for use in the settings tab
     desktop_site = Site.objects.get(id=settings.DESKTOP_SITE_ID)
 
-    try:
-        c = Client()
-        search_opts = dict(product=prod.short, version=version)
-        c.query('', meta=('type', 'locale', 'manufacturer', 'device',
-                'day_sentiment'), **search_opts)
-        metas = c.meta
-        daily = c.meta.get('day_sentiment', {})
-        chart_data = dict(series=[
-            dict(name=_('Praise'), data=daily['praise']),
-            dict(name=_('Issues'), data=daily['issue']),
-            dict(name=_('Ideas'), data=daily['idea']),
-            ])
-        total = c.total_found
-    except SearchError:
-        metas = {}
-        total = latest_opinions.count()
-        chart_data = None
+    # The dashboard shows the last 60 days.
+    metas, total = rollup_meta(
+        dict(product=prod.id, version=version,
+             date_start=date.today() - timedelta(days=60)),
+        ('type', 'locale', 'manufacturer', 'device', 'day_sentiment'))
+    daily = metas['day_sentiment']
+    chart_data = dict(series=[
+        dict(name=_('Praise'), data=daily['praise']),
+        dict(name=_('Issues'), data=daily['issue']),
+        dict(name=_('Ideas'), data=daily['idea']),
+        ])
 
     data = {
         'opinions': latest_opinions.all()[:settings.MESSAGES_COUNT],
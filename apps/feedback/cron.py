@@ -7,7 +7,8 @@ from django.db import transaction, models
 import cronjobs
 
 import input
-from feedback.models import Opinion, extract_terms
+from feedback.models import DailyCount, Opinion, extract_terms
+from input.utils import flag
 
 
 DEFAULT_NUM_OPINIONS = 100
@@ -91,3 +92,9 @@ def populate(num_opinions=None, product='mobile', type=None, locale=None):
 
     models.signals.post_save.connect(extract_terms, sender=Opinion,
                                      dispatch_uid='extract_terms')
+
+
+@cronjobs.register
+def update_daily_counts(rebuild=False):
+    """Roll new opinions up into the daily counts (or recount them all)."""
+    DailyCount.objects.roll_up(rebuild=flag(rebuild))
@@ -1,7 +1,8 @@
 from datetime import timedelta
 
 from django.conf import settings
-from django.db import models
+from django.core.cache import cache
+from django.db import connection, models, transaction
 from django.db.models import Count, signals
 
 import caching.base
@@ -10,15 +11,22 @@ from elasticutils import es_required
 from pyes import djangoutils
 from pyes.exceptions import NotFoundException as PyesNotFoundException
 
-from feedback import query, utils
-from feedback.utils import ua_parse, extract_terms, smart_truncate
+from feedback import query
+from feedback.utils import ua_parse, smart_truncate
 from input import PRODUCT_IDS, OPINION_TYPES, OPINION_PRAISE, PLATFORMS
+from input.coalesce import CoalescingQueue
 from input.models import ModelBase
 from input.urlresolvers import reverse
+from search.locales import indexed_locale_sql
 
 log = commonware.log.getLogger('feedback')
 
 
+def opinion_cache_key(pk):
+    """Cache key of a single opinion, as cached by ``by_ids``."""
+    return '%sopinion:%s' % (settings.CACHE_PREFIX, pk)
+
+
 class OpinionManager(caching.base.CachingManager):
     def browse(self, **kwargs):
         """Browse all opinions, restricted by search criteria."""
@@ -42,6 +50,27 @@ class OpinionManager(caching.base.CachingManager):
             ret = ret.filter(created__lt=date_end + timedelta(days=1))
         return ret
 
+    def by_ids(self, pks):
+        """
+        Opinions with the given ids, in the same order. Opinions are cached
+        one by one, only the ones not in the cache are fetched (with a plain
+        IN query). Ids of opinions that don't exist are skipped.
+        """
+        keys = dict((pk, opinion_cache_key(pk)) for pk in pks)
+        cached = cache.get_many(keys.values())
+        found = dict((pk, cached[key]) for pk, key in keys.items()
+                     if key in cached)
+
+        missing = [pk for pk in keys if pk not in found]
+        if missing:
+            fetched = dict((o.pk, o) for o in
+                           self.no_cache().filter(pk__in=missing))
+            cache.set_many(dict((keys[pk], o) for pk, o in fetched.items()),
+                           settings.OPINION_CACHE_TIMEOUT)
+            found.update(fetched)
+
+        return [found[pk] for pk in pks if pk in found]
+
 
 class Opinion(ModelBase):
     """A single feedback item."""
@@ -111,25 +140,32 @@ class Opinion(ModelBase):
 
     @es_required
     def update_index(self, es, bulk=False):
+        from search.reindex import write_indexes
         data = djangoutils.get_values(self)
-        try:
-            es.index(data, settings.ES_INDEX, 'opinion', self.id, bulk=bulk)
-        except Exception, e:
-            log.error("ElasticSearch errored for opinion (%s): %s" % (self, e))
-        else:
-            log.debug('Opinion %d added to search index.' % self.id)
+        for index in write_indexes():
+            try:
+                es.index(data, index, 'opinion', self.id, bulk=bulk)
+            except Exception, e:
+                log.error("ElasticSearch errored for opinion (%s): %s" %
+                          (self, e))
+            else:
+                log.debug('Opinion %d added to search index %s.' % (
+                    self.id, index))
 
     @es_required
     def remove_from_index(self, es, bulk=False):
-        try:
-            es.delete(settings.ES_INDEX, 'opinion', self.id, bulk=bulk)
-        except PyesNotFoundException:
-            pass
-        except Exception, e:
-            log.error("ElasticSearch error removing opinion (%s): %s" %
-                      (self, e))
-        else:
-            log.debug('Opinion %d removed from search index.' % self.id)
+        from search.reindex import write_indexes
+        for index in write_indexes():
+            try:
+                es.delete(index, 'opinion', self.id, bulk=bulk)
+            except PyesNotFoundException:
+                pass
+            except Exception, e:
+                log.error("ElasticSearch error removing opinion (%s): %s" %
+                          (self, e))
+            else:
+                log.debug('Opinion %d removed from search index %s.' % (
+                    self.id, index))
 
 
 def parse_user_agent(sender, instance, **kw):
@@ -140,20 +176,21 @@ def parse_user_agent(sender, instance, **kw):
         instance.platform = parsed['platform']
 
 
-# TODO: add this to celery
-def extract_terms(sender, instance, **kw):
-    if instance.terms.all() or settings.DISABLE_TERMS:
+terms_queue = CoalescingQueue('feedback.tasks.extract_terms')
+
+
+def extract_terms(sender, instance, created=False, **kw):
+    """Asynchronously extract terms from new opinions, in batches."""
+    if not created or settings.DISABLE_TERMS:
         return
-    terms = (t for t in utils.extract_terms(instance.description) if
-             len(t) >= settings.MIN_TERM_LENGTH)
-    for term in terms:
-        this_term, created = Term.objects.get_or_create(term=term)
-        instance.terms.add(this_term)
+    terms_queue.add(instance.id)
+
+index_queue = CoalescingQueue('search.tasks.add_to_index')
+
 
 def post_to_elastic(sender, instance, **kw):
-    """Asynchronously update the opinion in ElasticSearch."""
-    from search import tasks
-    tasks.add_to_index.delay([instance.id])
+    """Asynchronously update the opinion in ElasticSearch, in batches."""
+    index_queue.add(instance.id)
 
 signals.pre_save.connect(parse_user_agent, sender=Opinion)
 signals.post_save.connect(extract_terms, sender=Opinion,
@@ -163,6 +200,14 @@ signals.post_save.connect(post_to_elastic, sender=Opinion)
 unindex_opinion = lambda instance, **kwargs: instance.remove_from_index()
 signals.post_delete.connect(unindex_opinion, sender=Opinion)
 
+
+def uncache_opinion(sender, instance, **kw):
+    """Drop a changed or deleted opinion from the ``by_ids`` cache."""
+    cache.delete(opinion_cache_key(instance.pk))
+
+signals.post_save.connect(uncache_opinion, sender=Opinion)
+signals.post_delete.connect(uncache_opinion, sender=Opinion)
+
 # post_Save for POST to metrics
 
 class TermManager(models.Manager):
@@ -212,3 +257,98 @@ class Term(ModelBase):
 
     class Meta:
         ordering = ('term',)
+
+
+ROLLUP_SQL = """
+    INSERT INTO feedback_daily_count
+        (day, product, version, type, platform, locale, manufacturer,
+         device, dimensions, count)
+    SELECT day, product, version, type, platform, locale, manufacturer,
+           device,
+           MD5(CONCAT_WS(CHAR(31), product, version, type, platform, locale,
+                         manufacturer, device)),
+           COUNT(*)
+    FROM (SELECT CAST(UNIX_TIMESTAMP(created) / 86400 AS UNSIGNED) * 86400
+                 AS day,
+                 product, IFNULL(version, '') AS version, type,
+                 IFNULL(platform, '') AS platform,
+                 %(locale)s AS locale,
+                 IFNULL(manufacturer, '') AS manufacturer,
+                 IFNULL(device, '') AS device
+          FROM feedback_opinion
+          WHERE id > %%s AND id <= %%s) AS o
+    GROUP BY day, product, version, type, platform, locale, manufacturer,
+             device
+    ON DUPLICATE KEY UPDATE
+        count = feedback_daily_count.count + VALUES(count)
+""" % {'locale': indexed_locale_sql("IFNULL(locale, '')")}
+
+
+class DailyCountManager(models.Manager):
+
+    def roll_up(self, batch_size=100000, lag=60, rebuild=False):
+        """
+        Add opinions created since the last run to the daily counts, in
+        batches of ``batch_size`` ids, each in one transaction together with
+        the id watermark.
+
+        Opinions younger than ``lag`` seconds are left for the next run, so
+        rows still being inserted with lower ids than already committed ones
+        are not skipped. Deleted opinions are only accounted for with
+        ``rebuild=True``, which recounts everything.
+        """
+        cursor = connection.cursor()
+        if rebuild:
+            cursor.execute('DELETE FROM feedback_daily_count')
+            cursor.execute('DELETE FROM feedback_rollup_state '
+                           'WHERE name = %s', ['daily_count'])
+            transaction.commit_unless_managed()
+
+        cursor.execute('SELECT MAX(id) FROM feedback_opinion '
+                       'WHERE created < NOW() - INTERVAL %s SECOND', [lag])
+        upto = cursor.fetchone()[0] or 0
+
+        rows = 0
+        while True:
+            cursor.execute('INSERT IGNORE INTO feedback_rollup_state '
+                           '(name, last_id) VALUES (%s, 0)', ['daily_count'])
+            cursor.execute('SELECT last_id FROM feedback_rollup_state '
+                           'WHERE name = %s FOR UPDATE', ['daily_count'])
+            last_id = cursor.fetchone()[0]
+            if last_id >= upto:
+                transaction.commit_unless_managed()
+                break
+            batch_end = min(last_id + batch_size, upto)
+            cursor.execute(ROLLUP_SQL, [last_id, batch_end])
+            rows += cursor.rowcount
+            cursor.execute('UPDATE feedback_rollup_state SET last_id = %s '
+                           'WHERE name = %s', [batch_end, 'daily_count'])
+            transaction.commit_unless_managed()
+            log.debug('Rolled up opinions %d to %d.' % (last_id, batch_end))
+        return rows
+
+
+class DailyCount(models.Model):
+    """
+    Number of opinions per day and product, version, type, platform, locale
+    (as indexed by Sphinx), manufacturer and device. Maintained by
+    ``DailyCount.objects.roll_up()``.
+    """
+    # Unix timestamp of the day, like the day in Sphinx's day_sentiment.
+    day = models.PositiveIntegerField()
+    product = models.PositiveSmallIntegerField()
+    version = models.CharField(max_length=30)
+    type = models.PositiveSmallIntegerField()
+    platform = models.CharField(max_length=30)
+    locale = models.CharField(max_length=30)
+    manufacturer = models.CharField(max_length=255)
+    device = models.CharField(max_length=255)
+    # MD5 of all of the above but day, for the unique key.
+    dimensions = models.CharField(max_length=32)
+    count = models.PositiveIntegerField()
+
+    objects = DailyCountManager()
+
+    class Meta:
+        db_table = 'feedback_daily_count'
+        unique_together = (('day', 'dimensions'),)
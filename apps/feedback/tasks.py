@@ -0,0 +1,54 @@
+from django.conf import settings
+
+import commonware.log
+from celeryutils import task
+
+from input.utils import bulk_insert
+from feedback import utils
+from feedback.models import Opinion, Term
+
+log = commonware.log.getLogger('i.task')
+
+
+@task
+def extract_terms(pks, **kw):
+    """
+    Extract terms for a batch of opinions.
+
+    Existing terms are looked up with one query, new terms and all
+    opinion/term links are written with one multi-row INSERT each.
+    Opinions that already have terms are skipped.
+    """
+    if settings.DISABLE_TERMS:
+        return
+
+    Link = Opinion.terms.through
+    done = set(Link.objects.filter(opinion__in=pks)
+                           .values_list('opinion', flat=True))
+
+    found = {}
+    words = set()
+    for pk, description in (Opinion.objects.filter(pk__in=pks)
+                                           .values_list('id', 'description')):
+        if pk in done:
+            continue
+        found[pk] = set(utils.extract_terms(description))
+        words.update(found[pk])
+    if not words:
+        return
+
+    lookup = lambda: dict((term.lower(), pk) for term, pk in
+                          Term.objects.filter(term__in=words)
+                                      .values_list('term', 'id'))
+    term_ids = lookup()
+    new = [Term(term=w) for w in words if w not in term_ids]
+    if new:
+        # Other workers may be adding the same terms concurrently.
+        bulk_insert(Term, new, ignore=True)
+        term_ids = lookup()
+
+    links = [Link(opinion_id=pk, term_id=term_ids[w])
+             for pk, terms in found.items() for w in terms if w in term_ids]
+    bulk_insert(Link, links, ignore=True)
+    log.debug('Extracted %d terms (%d new) for %d opinions.' %
+              (len(links), len(new), len(found)))
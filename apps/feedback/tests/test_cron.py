@@ -2,8 +2,9 @@ import test_utils
 from nose.tools import eq_
 
 import input
-from feedback.cron import populate, DEFAULT_NUM_OPINIONS
-from feedback.models import Opinion
+from feedback.cron import populate, update_daily_counts, DEFAULT_NUM_OPINIONS
+from feedback.models import DailyCount, Opinion
+from search.client import rollup_meta
 
 
 class TestPopulate(test_utils.TestCase):
@@ -16,3 +17,30 @@ class TestPopulate(test_utils.TestCase):
         count = Opinion.objects.filter(
                 _type=input.OPINION_IDEA.id).count()
         eq_(count, DEFAULT_NUM_OPINIONS)
+
+
+class TestDailyCounts(test_utils.TestCase):
+    def setUp(self):
+        populate(DEFAULT_NUM_OPINIONS, 'desktop', input.OPINION_IDEA)
+
+    def total(self):
+        return sum(DailyCount.objects.values_list('count', flat=True))
+
+    def test_roll_up(self):
+        """Each opinion is counted once, however often the cron runs."""
+        DailyCount.objects.roll_up(batch_size=7, lag=0)
+        DailyCount.objects.roll_up(lag=0)
+        eq_(self.total(), DEFAULT_NUM_OPINIONS)
+
+        Opinion.objects.all()[0].delete()
+        update_daily_counts(rebuild=True)
+        eq_(self.total(), DEFAULT_NUM_OPINIONS - 1)
+
+    def test_rollup_meta(self):
+        DailyCount.objects.roll_up(lag=0)
+        meta, total = rollup_meta({}, ('type', 'day_sentiment'))
+        eq_(total, DEFAULT_NUM_OPINIONS)
+        eq_(meta['type'], [dict(type=input.OPINION_IDEA.id,
+                                count=DEFAULT_NUM_OPINIONS)])
+        eq_(sum(n for day, n in meta['day_sentiment']['idea']),
+            DEFAULT_NUM_OPINIONS)
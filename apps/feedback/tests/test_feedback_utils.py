@@ -4,7 +4,8 @@ from django import http
 from nose.tools import eq_
 
 from input import FIREFOX, MOBILE
-from feedback.utils import detect_language, ua_parse, smart_truncate
+from feedback.utils import (detect_language, extract_terms, ua_parse,
+                            smart_truncate, _extract_terms)
 
 
 def test_ua_parse():
@@ -42,6 +43,13 @@ def test_ua_parse():
         ('Mozilla/5.0 (Android; Linux armv71; rv:2.0b6pre) Gecko/'
          '20100924 Namoroka/4.0b7pre Fennec/2.0b1pre',
          MOBILE, '2.0b1pre', 'android'),
+        ('Mozilla/5.0 (Android; Linux armv71; rv:2.0b8) Gecko/20101221 '
+         'Firefox/4.0b8 Fennec/4.0b3',
+         MOBILE, '4.0b3', 'android'),
+        # Fennec only wins if it is the last product token.
+        ('Mozilla/5.0 (X11; Linux i686; rv:2.0b8) Gecko/20101221 '
+         'Fennec/4.0b3 Firefox/4.0b8',
+         FIREFOX, '4.0b8', 'linux'),
 
         # invalid
         ('A completely bogus Firefox user agent string.', None),
@@ -86,3 +94,17 @@ def test_smart_truncate():
     for pattern in patterns:
         eq_(smart_truncate(pattern[0], length=pattern[1]), pattern[2])
 
+
+def test_extract_terms():
+    """Cached word tags give the terms topia finds in the whole text."""
+    texts = (
+        # After a modal, "crash" is a verb.
+        (u'The tab will crash.', [u'tab']),
+        # Capitalized common noun at the start of a sentence.
+        (u'It will load pages. Mark my words, Firefox crashes.',
+         [u'crash', u'firefox', u'mark', u'page', u'word']),
+    )
+    for text, terms in texts:
+        for i in xrange(2):
+            eq_(sorted(extract_terms(text)), terms)
+        eq_(sorted(_extract_terms(text)), terms)
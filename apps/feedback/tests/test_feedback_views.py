@@ -1,3 +1,4 @@
+import json
 from datetime import datetime
 
 from django.conf import settings
@@ -5,7 +6,7 @@ from django.conf import settings
 from nose.tools import eq_
 from pyquery import PyQuery as pq
 
-from input import OPINION_PRAISE, OPINION_ISSUE
+from input import OPINION_PRAISE, OPINION_ISSUE, OPINION_IDEA
 from input.tests import ViewTestCase, enforce_ua
 from input.urlresolvers import reverse
 from feedback.models import Opinion
@@ -161,3 +162,48 @@ class BetaViewTests(ViewTestCase):
                             HTTP_USER_AGENT=(self.FX_UA % '20.0b2'),
                             follow=True)
         eq_(r.status_code, 200)
+
+
+class BulkFeedbackTests(ViewTestCase):
+    """Tests for batched feedback submissions."""
+
+    FX_UA = BetaViewTests.FX_UA
+
+    def _post(self, items, **extra):
+        return self.client.post(reverse('feedback.bulk'), json.dumps(items),
+                                content_type='application/json', **extra)
+
+    def test_bulk_feedback(self):
+        items = [
+            {'_type': OPINION_PRAISE.id, 'description': 'Bulk happy!'},
+            {'_type': OPINION_ISSUE.id, 'description': 'Bulk sad!',
+             'add_url': True, 'url': 'http://example.com/',
+             'user_agent': self.FX_UA % '20.0a1'},
+            {'_type': OPINION_IDEA.id, 'description': ''},
+            {'_type': OPINION_PRAISE.id, 'description': 'Bulk happy!'},
+            {'_type': 99, 'description': 'Unknown type'},
+        ]
+        r = self._post(items, HTTP_USER_AGENT=self.FX_UA % '20.0b2')
+        eq_(r.status_code, 200)
+        data = json.loads(r.content)
+        eq_(sorted(data['errors'].keys()), ['2', '3', '4'])
+        assert 'description' in data['errors']['2']
+
+        eq_(len(data['saved']), 2)
+        happy, sad = Opinion.objects.no_cache().filter(
+            pk__in=data['saved']).order_by('id')
+        eq_(happy.description, 'Bulk happy!')
+        eq_(happy.version, '20.0b2')
+        eq_(sad.url, 'http://example.com/')
+        eq_(sad.version, '20.0a1')
+
+    def test_bulk_feedback_invalid(self):
+        r = self._post({'description': 'Not a list'})
+        eq_(r.status_code, 400)
+
+        r = self.client.post(reverse('feedback.bulk'), 'nope',
+                             content_type='application/json')
+        eq_(r.status_code, 400)
+
+        r = self.client.get(reverse('feedback.bulk'))
+        eq_(r.status_code, 405)
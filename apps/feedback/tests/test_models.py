@@ -6,6 +6,7 @@ from mock import patch
 from test_utils import eq_, TestCase
 
 from input import FIREFOX, WINDOWS_7
+from feedback import tasks
 from feedback.models import Opinion, Term
 from feedback.stats import frequent_terms
 
@@ -61,8 +62,46 @@ class TermTestCase(TestCase):
         """Make sure we create our terms."""
         settings.DISABLE_TERMS = False
         op = Opinion.objects.create(product=1, description='This is a test')
+        op2 = Opinion.objects.create(product=1,
+                                     description='This is a test, too')
+        tasks.extract_terms([op.id, op2.id])
         terms = [term.term for term in op.terms.all()]
         eq_(terms, ['test'])
+        eq_([t.id for t in op2.terms.all()], [t.id for t in op.terms.all()])
+
+        # Opinions that already have terms are left alone.
+        tasks.extract_terms([op.id])
+        eq_(op.terms.count(), 1)
+
+    @patch.object(settings._wrapped, 'DISABLE_TERMS', False)
+    @patch('feedback.models.terms_queue')
+    def test_terms_queued(self, queue):
+        """New opinions are batched for term extraction, once."""
+        op = Opinion.objects.create(product=1, description='This is a test')
+        queue.add.assert_called_with(op.id)
+        op.save()
+        eq_(queue.add.call_count, 1)
+
+
+class OpinionByIdsTestCase(TestCase):
+    fixtures = ['feedback/opinions']
+
+    def test_by_ids(self):
+        """Opinions come back in the order asked for, from the cache."""
+        pks = list(Opinion.objects.no_cache().values_list('id', flat=True))
+        pks = pks[2:5] + pks[:2] + [10 ** 9]
+        eq_([o.pk for o in Opinion.objects.by_ids(pks)], pks[:-1])
+
+        # Saving drops the cached copy.
+        o = Opinion.objects.by_ids(pks[:1])[0]
+        o.description = 'Changed'
+        o.save()
+        eq_(Opinion.objects.by_ids(pks[:1])[0].description, 'Changed')
+
+        # The rest is cached: no queries.
+        with patch.object(Opinion.objects, 'no_cache') as no_cache:
+            eq_(len(Opinion.objects.by_ids(pks[1:-1])), 4)
+            assert not no_cache.called
 
 
 @patch('django.db.models.query.QuerySet.filter')
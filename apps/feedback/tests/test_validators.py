@@ -2,7 +2,11 @@ from django.core.exceptions import ValidationError
 
 import test_utils
 
+from nose.tools import eq_
+
 from feedback.validators import (validate_no_urls, validate_no_private_ips,
+                                 validate_swearwords, validate_no_html,
+                                 validate_no_email, validate_description,
                                  ExtendedURLValidator)
 
 
@@ -53,3 +57,31 @@ class ValidatorTests(test_utils.TestCase):
                                   pattern[0])
             else:
                 validate_no_urls(pattern[0]) # Will fail if exception raised.
+
+    def test_description(self):
+        """The combined validator reports what the single ones do."""
+        single = (validate_swearwords, validate_no_html, validate_no_email,
+                  validate_no_urls)
+        texts = (
+            'This is fine.',
+            'Damn <b>you</b>, mail me at a@example.com or visit www.foo.com',
+            'I like the www. Do you?',
+            'a < b and c > d',
+            'Write to me@there.org',
+            # Non-ASCII whitespace doesn't separate words for the patterns.
+            u'mail me@example\xa0.com',
+            u'visit www.\xa0foo',
+        )
+        for text in texts:
+            expected = []
+            for validator in single:
+                try:
+                    validator(text)
+                except ValidationError, e:
+                    expected.extend(e.messages)
+            try:
+                validate_description(text)
+            except ValidationError, e:
+                eq_(e.messages, expected)
+            else:
+                eq_(expected, [])
@@ -8,6 +8,7 @@ urlpatterns = patterns('feedback.views',
     url(r'^idea/?', redirect_to, {'url': '/feedback#idea'}),
 
     url(r'^thanks/?', 'thanks', name='feedback.thanks'),
+    url(r'^feedback/bulk/?$', 'bulk_feedback', name='feedback.bulk'),
     url(r'^feedback/?', 'feedback', name='feedback'),
     url(r'^download/?', 'download', name='feedback.download'),
     url(r'^opinion/(?P<id>\d+)$', 'opinion_detail', name='opinion.detail'),
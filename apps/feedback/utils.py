@@ -1,18 +1,33 @@
+import Queue
 import re
 
 from django.conf import settings
-from django.utils.functional import memoize
 from django.utils.translation import to_locale
 from django.utils.translation.trans_real import parse_accept_lang_header
 
 from product_details import product_details
 from product_details.version_compare import Version
-from topia.termextract import extract
+from topia.termextract import extract, tag
 
-from input import BROWSERS, PLATFORM_OTHER, PLATFORM_PATTERNS
+from input import (FIREFOX, MOBILE, PLATFORM_OTHER, PLATFORM_PATTERNS,
+                   UA_TOKENS_FIREFOX, UA_TOKENS_MOBILE)
+from input.lru import LRUCache, lru_cache
 
 
-def ua_parse(ua):
+# One regex finding every browser product token and platform token in a UA
+# string in a single scan. Everything is inside a lookahead, so overlapping
+# tokens (e.g. a product token inside another one's version) are all seen.
+# Group 1 is the product name, group 2 its version; platform patterns follow
+# in PLATFORM_PATTERNS order, i.e. group 3 + n is the n-th platform.
+_UA_TOKENS = UA_TOKENS_FIREFOX + tuple(t for t in UA_TOKENS_MOBILE
+                                      if t not in UA_TOKENS_FIREFOX)
+UA_SCANNER = re.compile(r'(?=(?:(%s)/(\S*))|%s)' % (
+    '|'.join(re.escape(t) for t in _UA_TOKENS),
+    '|'.join('(%s)' % re.escape(p[0]) for p in PLATFORM_PATTERNS)))
+_VERSION_GROUP, _FIRST_PLATFORM_GROUP = 2, 3
+
+
+def _ua_parse(ua):
     """
     Simple user agent string parser for Firefox and friends.
 
@@ -23,41 +38,55 @@ def ua_parse(ua):
         locale: locale code matching locale_details, else None
         }
     or None if detection failed.
+
+    Equivalent to matching ``input.BROWSERS`` in order and picking the first
+    of ``input.PLATFORM_PATTERNS`` found in the string.
     """
 
-    if not ua:
+    if not ua or not ua.startswith('Mozilla'):
         return None
 
-    # Detect browser
-    detected = {}
-    for browser in BROWSERS:
-        match = re.match(browser[1], ua)
-        if match:
-            try:
-                version = Version(match.group(2))
-            except:
-                # Unable to parse version? No dice.
-                return None
-            detected = {
-                'browser': browser[0],
-                'version': str(version),
-            }
-            break
-    # Browser not recognized? Bail.
-    if not detected:
+    firefox = mobile = None
+    platform = len(PLATFORM_PATTERNS)
+    for match in UA_SCANNER.finditer(ua):
+        group = match.lastindex
+        if group == _VERSION_GROUP:
+            # The last product token wins, but mobile ones only count if
+            # their version ends the string.
+            name, version = match.group(1, 2)
+            if name in UA_TOKENS_FIREFOX:
+                firefox = version
+            if name in UA_TOKENS_MOBILE and match.end(2) == len(ua):
+                mobile = version
+        else:
+            platform = min(platform, group - _FIRST_PLATFORM_GROUP)
+
+    # Detect browser. Since Fennec is Firefox too, detect it first.
+    if mobile is not None:
+        browser, version = MOBILE, mobile
+    elif firefox is not None:
+        browser, version = FIREFOX, firefox
+    else:
+        # Browser not recognized? Bail.
+        return None
+    try:
+        version = Version(version)
+    except:
+        # Unable to parse version? No dice.
         return None
 
     # Detect Platform
-    platform = PLATFORM_OTHER.short
-    for pattern in PLATFORM_PATTERNS:
-        if ua.find(pattern[0]) >= 0:
-            platform = pattern[1]
-            break
-    detected['platform'] = platform
+    if platform < len(PLATFORM_PATTERNS):
+        platform = PLATFORM_PATTERNS[platform][1]
+    else:
+        platform = PLATFORM_OTHER.short
 
-    return detected
-_ua_parse_cache = {}
-ua_parse = memoize(ua_parse, _ua_parse_cache, 1)
+    return {
+        'browser': browser,
+        'version': str(version),
+        'platform': platform,
+    }
+ua_parse = lru_cache(settings.UA_PARSE_CACHE_SIZE, name='ua_parse')(_ua_parse)
 
 
 def detect_language(request):
@@ -82,22 +111,100 @@ def detect_language(request):
     return ''
 
 
-def extract_terms(text):
-    """
-    Use topia.termextract to perform a simple tag extraction from
-    user comments.
-    """
-    extractor = extract.TermExtractor()
-    # Use permissive filter to find all possibly relevant terms in short texts.
-    extractor.filter = extract.permissiveFilter
-    terms = extractor(text)
+# Idle term extractors, shared by all threads of this process. Creating one
+# loads the tagger's lexicon, so they are reused rather than thrown away.
+_extractors = Queue.Queue()
+# (lexicon tag, tag, normalized form) of single words, see _tag_word.
+_terms_cache = LRUCache(settings.TERMS_CACHE_SIZE, name='extract_terms')
+
 
+def _get_extractor():
+    try:
+        return _extractors.get_nowait()
+    except Queue.Empty:
+        extractor = extract.TermExtractor()
+        # Use permissive filter to find all possibly relevant terms in short
+        # texts.
+        extractor.filter = extract.permissiveFilter
+        return extractor
+
+
+def _single_words(terms):
     # Collect terms in lower case, but only the ones that consist of single
     # words (t[2] == 1), and are at most 25 chars long.
     return [t[0].lower() for t in terms if t[2] == 1 and
             settings.MIN_TERM_LENGTH <= len(t[0]) <= settings.MAX_TERM_LENGTH]
 
 
+def _extract_terms(text):
+    """Extract terms with topia's own tagger, without the word cache."""
+    extractor = _get_extractor()
+    try:
+        terms = extractor(text)
+    finally:
+        _extractors.put(extractor)
+    return _single_words(terms)
+
+
+def _tag_word(tagger, word):
+    """
+    Tag a word with the lexicon and the tagger rules that only look at the
+    word itself: default nouns and plural forms. Returns (lexicon tag, tag,
+    normalized form), cached by word.
+    """
+    tags = _terms_cache.get(word)
+    if tags is None:
+        lexicon = tagger.tags_by_term
+        tagged = [word, lexicon.get(word, 'NND'), word]
+        tag.correctDefaultNounTag(0, tagged, [tagged], lexicon)
+        tag.normalizePluralForms(0, tagged, [tagged], lexicon)
+        tags = (lexicon.get(word, 'NND'), tagged[1], tagged[2])
+        _terms_cache.set(word, tags)
+    return tags
+
+
+def _tag(tagger, words):
+    """
+    Same as ``tagger.tag(words)``, with per word results from _tag_word.
+    Only the rules that depend on the neighbouring words run here.
+    """
+    tagged = []
+    after_modal = False
+    for word in words:
+        lexicon_tag, word_tag, norm = _tag_word(tagger, word)
+        if after_modal and lexicon_tag == 'NN':
+            # determineVerbAfterModal: a verb, not a noun.
+            word_tag = 'VB'
+        elif (lexicon_tag in ('NNP', 'NNPS') and
+              (not tagged or tagged[-1][1] == '.')):
+            # verifyProperNounAtSentenceStart: capitalized common nouns.
+            lower_tags = _tag_word(tagger, word.lower())
+            if lower_tags[0] in ('NN', 'NNS'):
+                word = word.lower()
+                word_tag, norm = lower_tags[1:]
+        after_modal = word_tag == 'MD' or (after_modal and word_tag == 'RB')
+        tagged.append([word, word_tag, norm])
+    return tagged
+
+
+def extract_terms(text):
+    """
+    Use topia.termextract to perform a simple tag extraction from
+    user comments.
+
+    Words are tagged from a per-word cache (see _tag_word); the rest of
+    topia's tagging and extraction looks at neighbouring words and runs on
+    every text.
+    """
+    extractor = _get_extractor()
+    try:
+        tagger = extractor.tagger
+        terms = extractor.extract(_tag(tagger, tagger.tokenize(text)))
+    finally:
+        _extractors.put(extractor)
+    return _single_words(terms)
+
+
 def smart_truncate(content, length=100, suffix='...'):
     """Truncate text at word boundaries."""
     if len(content) <= length:
@@ -29,31 +29,50 @@ PRIVATE_IP_RE = re.compile(
 URL_RE = re.compile(r'(://|www\.[^\s]|\.\w{2,}/)')
 
 
+# What strip_tags removes.
+HTML_RE = re.compile(r'<[^>]*?>')
+
+
+def _swearwords_message(matches):
+    # L10n: "Swear words" are cuss words/offensive words.
+    return _('Your comment contains swear words (%s). In order to help us '
+             'improve our products, please use words that help us create an '
+             'action or to-do from your constructive feedback. Thanks!') % (
+                 ', '.join(matches))
+
+
+def _html_message():
+    return _('Feedback must not contain HTML.')
+
+
+def _email_message():
+    return _('Your feedback seems to contain an email address. Please remove '
+             'this and similar personal data from the text, then try again. '
+             'Thanks!')
+
+
+def _url_message():
+    return _('Your feedback seems to contain a URL. Please remove this and '
+             'similar personal data from the text, then try again. Thanks!')
+
+
 def validate_swearwords(str):
     """Soft swear word filter to encourage contructive feedback."""
     matches = swearwords.find_swearwords(str)
     if matches:
-        # L10n: "Swear words" are cuss words/offensive words.
-        raise ValidationError(
-            _('Your comment contains swear words (%s). In order to help us '
-              'improve our products, please use words that help us create an '
-              'action or to-do from your constructive feedback. Thanks!') % (
-                ', '.join(matches)))
+        raise ValidationError(_swearwords_message(matches))
 
 
 def validate_no_html(str):
     """Disallow HTML."""
     if strip_tags(str) != str:
-        raise ValidationError(_('Feedback must not contain HTML.'))
+        raise ValidationError(_html_message())
 
 
 def validate_no_email(str):
     """Disallow texts possibly containing emails addresses."""
     if EMAIL_RE.search(str):
-        raise ValidationError(
-            _('Your feedback seems to contain an email address. Please remove '
-              'this and similar personal data from the text, then try again. '
-              'Thanks!'))
+        raise ValidationError(_email_message())
 
 
 def validate_no_private_ips(str):
@@ -66,9 +85,33 @@ def validate_no_private_ips(str):
 def validate_no_urls(str):
     """Disallow text possibly containing a URL."""
     if URL_RE.search(str):
-        raise ValidationError(
-            _('Your feedback seems to contain a URL. Please remove this and '
-              'similar personal data from the text, then try again. Thanks!'))
+        raise ValidationError(_url_message())
+
+
+def validate_description(str):
+    """
+    All checks for feedback texts at once: no swear words, HTML, email
+    addresses or URLs. Raises one ValidationError with the messages of all
+    failed checks, in that order.
+
+    Each check still scans the text, but the regexes only run on texts that
+    contain what any match must: "<" for HTML, "@" for email addresses, and
+    "/" or "www." for URLs.
+    """
+    errors = []
+    matches = swearwords.find_swearwords(str)
+    if matches:
+        errors.append(_swearwords_message(matches))
+    if '<' in str and HTML_RE.search(str):
+        errors.append(_html_message())
+
+    if '@' in str and EMAIL_RE.search(str):
+        errors.append(_email_message())
+    if ('/' in str or 'www.' in str) and URL_RE.search(str):
+        errors.append(_url_message())
+
+    if errors:
+        raise ValidationError(errors)
 
 
 class ExtendedURLValidator(validators.URLValidator):
@@ -1,3 +1,4 @@
+import json
 from functools import wraps
 
 from django import http
@@ -5,6 +6,7 @@ from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.views.decorators.vary import vary_on_headers
 
 import jingo
@@ -14,9 +16,19 @@ from tower import ugettext as _
 import input
 from input.decorators import cache_page, forward_mobile
 from input.urlresolvers import reverse
+from input.utils import bulk_insert
+from feedback import tasks
 from feedback.forms import PraiseForm, IssueForm, IdeaForm
-from feedback.models import Opinion
+from feedback.models import Opinion, parse_user_agent
 from feedback.utils import detect_language, ua_parse
+from search.tasks import add_to_index
+
+
+def _outdated(parsed):
+    """Is this (parsed) user agent older than the latest release?"""
+    this_ver = Version(parsed['version'])
+    ref_ver = Version(input.LATEST_RELEASE[parsed['browser']])
+    return this_ver < ref_ver
 
 
 def enforce_ua(f):
@@ -43,10 +55,8 @@ def enforce_ua(f):
         if not settings.ENFORCE_USER_AGENT:
             return f(request, ua=ua, *args, **kwargs)
 
-        this_ver = Version(parsed['version'])
-        ref_ver = Version(input.LATEST_RELEASE[parsed['browser']])
         # Check for outdated release.
-        if this_ver < ref_ver:
+        if _outdated(parsed):
             return http.HttpResponseRedirect(reverse('feedback.download'))
 
         # If we made it here, it's a valid version.
@@ -132,10 +142,99 @@ def opinion_detail(request, id):
     return jingo.render(request, template, {'opinion': o})
 
 
+BULK_FORMS = {
+    input.OPINION_PRAISE.id: PraiseForm,
+    input.OPINION_ISSUE.id: IssueForm,
+    input.OPINION_IDEA.id: IdeaForm,
+}
+
+
+@never_cache
+@csrf_exempt
+@require_POST
+def bulk_feedback(request):
+    """
+    Receive a batch of opinions as a JSON array in the request body, e.g.
+    queued up by a client while offline::
+
+        [{"_type": 1, "description": "...", "add_url": true, "url": "...",
+          "manufacturer": "", "device": "", "user_agent": "..."}, ...]
+
+    Each item is validated like a regular submission; ``user_agent`` defaults
+    to the request's User-Agent header. Valid opinions are saved with one
+    multi-row INSERT and indexed/term-extracted asynchronously. Responds with
+    ``{"saved": [ids], "errors": {"<index>": {"<field>": [messages]}}}``.
+    """
+    try:
+        items = json.loads(request.raw_post_data)
+    except ValueError:
+        return http.HttpResponseBadRequest(_('Invalid JSON.'))
+    if not isinstance(items, list):
+        return http.HttpResponseBadRequest(_('Expected a list of opinions.'))
+    if len(items) > settings.BULK_FEEDBACK_MAX:
+        return http.HttpResponseBadRequest(
+            _('Too many opinions, please send at most %d at a time.') %
+            settings.BULK_FEEDBACK_MAX)
+
+    locale = detect_language(request)
+    default_ua = request.META.get('HTTP_USER_AGENT', None)
+    opinions, errors, seen = [], {}, set()
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors[i] = {'__all__': [_('Expected an object.')]}
+            continue
+
+        ua = item.get('user_agent') or default_ua
+        parsed = ua_parse(ua)
+        if not parsed or (settings.ENFORCE_USER_AGENT and _outdated(parsed)):
+            errors[i] = {'user_agent': [_('Unsupported User-Agent.')]}
+            continue
+
+        try:
+            typ = int(item.get('_type'))
+        except (TypeError, ValueError):
+            typ = None
+        if typ not in BULK_FORMS:
+            errors[i] = {'_type': [_('Unknown feedback type.')]}
+            continue
+
+        form = BULK_FORMS[typ](item)
+        if not form.is_valid():
+            errors[i] = dict((field, [unicode(e) for e in errs]) for
+                             field, errs in form.errors.items())
+            continue
+
+        # The form only catches duplicates already in the DB.
+        if form.cleaned_data['description'] in seen:
+            errors[i] = {'__all__': [
+                _('We already got your feedback! Thanks.')]}
+            continue
+        seen.add(form.cleaned_data['description'])
+
+        opinion = opinion_from_form(typ, ua, locale, form)
+        parse_user_agent(Opinion, opinion)
+        opinions.append(opinion)
+
+    ids = bulk_insert(Opinion, opinions)
+    if ids:
+        add_to_index.delay(ids)
+        if not settings.DISABLE_TERMS:
+            tasks.extract_terms.delay(ids)
+
+    return http.HttpResponse(json.dumps({'saved': ids, 'errors': errors}),
+                             mimetype='application/json')
+
+
 def save_opinion_from_form(request, type, ua, form):
     """Given a (valid) form and feedback type, save it to the DB."""
-    locale = detect_language(request)
+    opinion = opinion_from_form(type, ua, detect_language(request), form)
+    opinion.save()
+
+    return opinion
 
+
+def opinion_from_form(type, ua, locale, form):
+    """Build an (unsaved) opinion from a valid form and feedback type."""
     # Remove URL if checkbox disabled or no URL submitted. Broken Website
     # report does not have the option to disable URL submission.
     if (type != input.OPINION_BROKEN.id and
@@ -153,6 +252,5 @@ def save_opinion_from_form(request, type, ua, form):
         user_agent=ua, locale=locale,
         manufacturer=form.cleaned_data['manufacturer'],
         device=form.cleaned_data['device'])
-    opinion.save()
 
     return opinion
@@ -121,10 +121,15 @@ PRODUCT_USAGE = _prods = (FIREFOX, MOBILE)
 PRODUCTS = dict((prod.short, prod) for prod in _prods)
 PRODUCT_IDS = dict((prod.id, prod) for prod in _prods)
 
-UA_PATTERN_FIREFOX = (
-    r'^Mozilla.*(Firefox|Minefield|Namoroka|Shiretoko|GranParadiso|BonEcho|'
-    'Iceweasel|Fennec|MozillaDeveloperPreview)\/([^\s]*).*$')
-UA_PATTERN_MOBILE = r'^Mozilla.*(Fennec)\/([^\s]*)$'
+# Product tokens ("Name/version") identifying each browser in a UA string.
+UA_TOKENS_FIREFOX = ('Firefox', 'Minefield', 'Namoroka', 'Shiretoko',
+                     'GranParadiso', 'BonEcho', 'Iceweasel', 'Fennec',
+                     'MozillaDeveloperPreview')
+UA_TOKENS_MOBILE = ('Fennec',)
+
+UA_PATTERN_FIREFOX = (r'^Mozilla.*(%s)\/([^\s]*).*$' %
+                      '|'.join(UA_TOKENS_FIREFOX))
+UA_PATTERN_MOBILE = r'^Mozilla.*(%s)\/([^\s]*)$' % '|'.join(UA_TOKENS_MOBILE)
 
 # Order is important: Since Fennec is Firefox too, it'll match the second
 # pattern as well, so we must detect it first.
@@ -0,0 +1,133 @@
+"""
+Coalescing task queue: collects ids and passes them to a Celery task in
+batches, instead of queueing one task per id.
+
+Ids are buffered in memory. When a batch is dispatched, it is written to
+the ``coalesce_pending`` table with one INSERT first, and deleted once its
+task is queued. If queueing fails, or the process dies in between, the
+``flush_coalesced`` cron job sends the batch later.
+"""
+import atexit
+import threading
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils.importlib import import_module
+
+import commonware.log
+from celeryutils import chunked
+
+from input.models import PendingId
+from input.utils import bulk_insert
+
+
+QUEUES = []
+
+log = commonware.log.getLogger('i.coalesce')
+
+
+def _import_task(path):
+    module, name = path.rsplit('.', 1)
+    return getattr(import_module(module), name)
+
+
+class CoalescingQueue(object):
+    """
+    Buffers ids for ``task`` (a task or its dotted path) and dispatches them
+    as one ``task.delay(ids)`` ``window`` seconds after the first id came in,
+    or as soon as ``size`` distinct ids are buffered. An id added several
+    times before that is dispatched once.
+
+    With a ``window`` of 0, or with CELERY_ALWAYS_EAGER, ids are dispatched
+    right away, and not stored. Ids still buffered when the process exits
+    are dispatched then; only those of a process killed before its window
+    ended are lost.
+    """
+
+    def __init__(self, task, window=None, size=None):
+        self._task = task
+        self.name = task if isinstance(task, basestring) else task.name
+        self.window = settings.COALESCE_WINDOW if window is None else window
+        self.size = size or settings.COALESCE_SIZE
+        self.lock = threading.Lock()
+        self.ids = set()
+        self.timer = None
+        QUEUES.append(self)
+
+    @property
+    def task(self):
+        if isinstance(self._task, basestring):
+            self._task = _import_task(self._task)
+        return self._task
+
+    @property
+    def coalescing(self):
+        return bool(self.window and
+                    not getattr(settings, 'CELERY_ALWAYS_EAGER', False))
+
+    def add(self, *ids):
+        with self.lock:
+            self.ids.update(ids)
+            wait = self.coalescing and len(self.ids) < self.size
+            if wait and not self.timer:
+                self.timer = threading.Timer(self.window, self._expire)
+                self.timer.daemon = True
+                self.timer.start()
+        if not wait:
+            self.flush()
+
+    def _expire(self):
+        """Flush, in the timer's thread, which has a connection of its own."""
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        with self.lock:
+            ids, self.ids = sorted(self.ids), set()
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+        if not ids:
+            return
+        if not self.coalescing:
+            self.task.delay(ids)
+            return
+        bulk_insert(PendingId, [PendingId(task=self.name, object_id=id)
+                                for id in ids], ignore=True)
+        try:
+            self.task.delay(ids)
+        except Exception, e:
+            log.error('Queueing %s failed, %d ids left for flush_coalesced: '
+                      '%s' % (self.name, len(ids), e))
+            return
+        PendingId.objects.filter(task=self.name, object_id__in=ids).delete()
+
+
+def flush_all():
+    for queue in QUEUES:
+        queue.flush()
+
+atexit.register(flush_all)
+
+
+def flush_stale(age=None):
+    """
+    Dispatch the ids stored more than ``age`` seconds ago (by default,
+    ``settings.COALESCE_STALE``) whose task was never queued, because
+    queueing failed or the process died. Returns how many were sent.
+    """
+    age = settings.COALESCE_STALE if age is None else age
+    cutoff = datetime.now() - timedelta(seconds=age)
+    pending = PendingId.objects.filter(created__lt=cutoff)
+    rows = list(pending.values_list('id', 'task', 'object_id'))
+    tasks = {}
+    for id, task, object_id in rows:
+        tasks.setdefault(task, []).append(object_id)
+    for task, ids in tasks.items():
+        for chunk in chunked(sorted(ids), settings.COALESCE_SIZE):
+            _import_task(task).delay(chunk)
+    PendingId.objects.filter(id__in=[row[0] for row in rows]).delete()
+    return len(rows)
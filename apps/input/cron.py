@@ -7,6 +7,8 @@ from django.contrib.sites.models import Site
 
 import cronjobs
 
+from input.coalesce import flush_stale
+
 log = logging.getLogger('reporter')
 
 @cronjobs.register
@@ -49,3 +51,14 @@ def set_domains(desktop_domain, mobile_domain):
         site.name = domain
         site.save()
         log.debug('Changed site %d domain to %s' % (id, domain))
+
+
+@cronjobs.register
+def flush_coalesced():
+    """
+    Send the batches of ids coalescing queues stored but never queued,
+    because queueing failed or their process died. Run every few minutes.
+    """
+    count = flush_stale()
+    if count:
+        log.info('Sent %d stale coalesced ids.' % count)
@@ -0,0 +1,108 @@
+"""
+Bounded, thread-safe LRU caches with hit/miss/eviction counters.
+
+Every named cache registers itself in ``CACHES`` so its counters can be
+reported (see ``stats()``). This module does not depend on Django.
+"""
+import threading
+from functools import wraps
+
+
+CACHES = {}  # name -> LRUCache
+
+_missing = object()
+
+# Linked list node fields.
+PREV, NEXT, KEY, VALUE = 0, 1, 2, 3
+
+
+class LRUCache(object):
+    """
+    A dict-like cache holding at most ``maxsize`` items, dropping the least
+    recently used one when full.
+
+    Entries live in a dict and a circular doubly linked list ordered from
+    least to most recently used, so lookups, inserts and evictions are O(1).
+    """
+
+    def __init__(self, maxsize=1000, name=None):
+        self.maxsize = maxsize
+        self.name = name
+        self.lock = threading.Lock()
+        self.clear()
+        if name:
+            CACHES[name] = self
+
+    def clear(self):
+        self.data = {}
+        self.root = root = []
+        root[:] = [root, root, None, None]
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        with self.lock:
+            link = self.data.get(key)
+            if link is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            # Move to the most recently used end.
+            link[PREV][NEXT] = link[NEXT]
+            link[NEXT][PREV] = link[PREV]
+            last = self.root[PREV]
+            last[NEXT] = self.root[PREV] = link
+            link[PREV], link[NEXT] = last, self.root
+            return link[VALUE]
+
+    def set(self, key, value):
+        with self.lock:
+            link = self.data.get(key)
+            if link is not None:
+                link[VALUE] = value
+                return
+            if len(self.data) >= self.maxsize:
+                oldest = self.root[NEXT]
+                oldest[PREV][NEXT] = oldest[NEXT]
+                oldest[NEXT][PREV] = oldest[PREV]
+                del self.data[oldest[KEY]]
+                self.evictions += 1
+            last = self.root[PREV]
+            link = [last, self.root, key, value]
+            last[NEXT] = self.root[PREV] = self.data[key] = link
+
+    def stats(self):
+        return {'size': len(self.data), 'maxsize': self.maxsize,
+                'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions}
+
+
+def lru_cache(maxsize=1000, name=None):
+    """
+    Decorator caching a function's results by its (hashable) positional
+    arguments. The cache is available as the wrapper's ``cache`` attribute
+    and registered as ``name`` (default: the function's name).
+    """
+    def decorator(f):
+        cache = LRUCache(maxsize, name or f.__name__)
+
+        @wraps(f)
+        def wrapper(*args):
+            value = cache.get(args, _missing)
+            if value is _missing:
+                value = f(*args)
+                cache.set(args, value)
+            return value
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def stats():
+    """Counters of all registered caches, as a dict of name -> stats."""
+    return dict((name, cache.stats()) for name, cache in CACHES.items())
@@ -13,3 +13,18 @@ class ModelBase(caching.base.CachingMixin, models.Model):
 
     class Meta:
         abstract = True
+
+
+class PendingId(models.Model):
+    """
+    An id an ``input.coalesce.CoalescingQueue`` is sending, until its task
+    is queued.
+    """
+    # Dotted path of the queue's task.
+    task = models.CharField(max_length=100)
+    object_id = models.PositiveIntegerField()
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = 'coalesce_pending'
+        unique_together = (('task', 'object_id'),)
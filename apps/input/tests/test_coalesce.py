@@ -0,0 +1,74 @@
+from django.conf import settings
+
+from mock import Mock, patch
+from nose.tools import eq_
+import test_utils
+
+from input.coalesce import CoalescingQueue, flush_stale
+from input.models import PendingId
+
+
+def task_mock():
+    task = Mock()
+    task.name = 'input.tests.task'
+    return task
+
+
+class CoalesceTest(test_utils.TestCase):
+
+    def test_dedupe_and_size(self):
+        """Repeated ids are sent once; a full batch is sent right away."""
+        task = task_mock()
+        queue = CoalescingQueue(task, window=60, size=3)
+        queue.add(1)
+        queue.add(2)
+        queue.add(1)
+        assert not task.delay.called
+        queue.add(3)
+        task.delay.assert_called_with([1, 2, 3])
+        assert queue.timer is None
+        eq_(PendingId.objects.count(), 0)
+
+    def test_window(self):
+        """Ids are sent when the window ends."""
+        task = task_mock()
+        queue = CoalescingQueue(task, window=60, size=100)
+        queue.add(2, 1)
+        queue.add(1)
+        assert not task.delay.called
+
+        queue.flush()
+        eq_(task.delay.call_args_list, [(([1, 2],), {})])
+        assert queue.timer is None
+        eq_(PendingId.objects.count(), 0)
+
+    def test_queueing_fails(self):
+        """A batch that couldn't be queued stays stored."""
+        task = task_mock()
+        task.delay.side_effect = IOError('Broker is down.')
+        queue = CoalescingQueue(task, window=60, size=100)
+        queue.add(2, 1)
+        eq_(PendingId.objects.count(), 0)
+        queue.flush()
+        eq_(sorted(PendingId.objects.values_list('object_id', flat=True)),
+            [1, 2])
+
+    @patch('input.coalesce._import_task')
+    def test_flush_stale(self, import_task):
+        """Ids left by a process that died are sent by flush_stale."""
+        for id in (4, 3):
+            PendingId.objects.create(task='input.tests.task', object_id=id)
+        eq_(flush_stale(), 0)
+
+        eq_(flush_stale(age=-60), 2)
+        import_task.assert_called_with('input.tests.task')
+        import_task.return_value.delay.assert_called_with([3, 4])
+        eq_(PendingId.objects.count(), 0)
+
+    @patch.object(settings, 'CELERY_ALWAYS_EAGER', True, create=True)
+    def test_eager(self):
+        task = task_mock()
+        queue = CoalescingQueue(task, window=60)
+        queue.add(1)
+        task.delay.assert_called_with([1])
+        eq_(PendingId.objects.count(), 0)
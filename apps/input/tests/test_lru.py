@@ -0,0 +1,31 @@
+from nose.tools import eq_
+
+from input.lru import LRUCache, lru_cache, stats
+
+
+def test_lru_eviction():
+    """The least recently used item is dropped when the cache is full."""
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    eq_(cache.get('a'), 1)
+    cache.set('c', 3)
+    assert 'a' in cache
+    assert 'b' not in cache
+    eq_(cache.get('b'), None)
+    eq_(cache.stats(), {'size': 2, 'maxsize': 2, 'hits': 1, 'misses': 1,
+                        'evictions': 1})
+
+
+def test_lru_cache_decorator():
+    calls = []
+
+    @lru_cache(2, name='test_lru_square')
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    eq_([square(x) for x in (1, 2, 1, 3, 2)], [1, 4, 1, 9, 4])
+    eq_(calls, [1, 2, 3, 2])
+    eq_(stats()['test_lru_square'], square.cache.stats())
+    eq_(square.cache.evictions, 2)
@@ -0,0 +1,10 @@
+from nose.tools import eq_
+
+from input.utils import flag
+
+
+def test_flag():
+    for value in ('0', 'false', 'No', 'off', '', 0, False, None):
+        eq_(flag(value), False)
+    for value in ('1', 'true', 'yes', 1, True):
+        eq_(flag(value), True)
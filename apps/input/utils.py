@@ -1,5 +1,8 @@
 import zlib
 
+from django.db import connections, router, transaction
+from django.db.models import AutoField
+
 
 # TODO(davedash): liberate this
 def manual_order(qs, pks, pk_name='id'):
@@ -20,3 +23,58 @@ def manual_order(qs, pks, pk_name='id'):
 
 
 crc32 = lambda x: zlib.crc32(x) & 0xffffffff
+
+
+def bulk_insert(model, objects, batch_size=1000, ignore=False):
+    """
+    Insert unsaved model instances using multi-row INSERT statements, at most
+    ``batch_size`` rows each, and assign their primary keys.
+
+    This bypasses ``save()`` and the pre/post_save signals, so callers must do
+    whatever work those would have done. Primary keys are derived from the
+    first id of each statement: MySQL hands out consecutive auto-increment
+    ids for a multi-row INSERT (innodb_autoinc_lock_mode 0 or 1).
+
+    With ``ignore=True``, rows violating a unique key are skipped (INSERT
+    IGNORE). Ids can't be derived then, so none are assigned or returned.
+    """
+    if not objects:
+        return []
+
+    using = router.db_for_write(model)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    fields = [f for f in model._meta.local_fields
+              if not isinstance(f, AutoField)]
+    sql = 'INSERT %sINTO %s (%s) VALUES (%s)' % (
+        'IGNORE ' if ignore else '', qn(model._meta.db_table),
+        ', '.join(qn(f.column) for f in fields),
+        ', '.join(['%s'] * len(fields)))
+
+    cursor = connection.cursor()
+    for start in xrange(0, len(objects), batch_size):
+        batch = objects[start:start + batch_size]
+        rows = [[f.get_db_prep_save(f.pre_save(obj, True),
+                                    connection=connection) for f in fields]
+                for obj in batch]
+        # MySQLdb turns this into a single multi-row INSERT.
+        cursor.executemany(sql, rows)
+        if ignore:
+            continue
+        first_id = cursor.lastrowid
+        for i, obj in enumerate(batch):
+            setattr(obj, model._meta.pk.attname, first_id + i)
+            obj._state.db = using
+    transaction.commit_unless_managed(using=using)
+
+    return [] if ignore else [obj.pk for obj in objects]
+
+
+def flag(value):
+    """
+    A cron job or command argument as a boolean. Arguments arrive as
+    strings, so '0', 'false', 'no', 'off' and '' (in any case) are false.
+    """
+    if isinstance(value, basestring):
+        return value.strip().lower() not in ('', '0', 'false', 'no', 'off')
+    return bool(value)
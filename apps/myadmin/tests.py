@@ -1,3 +1,5 @@
+import json
+
 from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
 
@@ -16,6 +18,11 @@ class ViewTestCase(test_utils.TestCase):
 
         assert self.client.login(username='a', password='b')
 
+    def test_cache_stats(self):
+        r = self.client.get(reverse('myadmin.cache_stats'))
+        eq_(r.status_code, 200)
+        assert 'ua_parse' in json.loads(r.content)
+
     def test_export_tsv(self):
         r = self.client.get(reverse('myadmin.export_tsv'))
         eq_(r.status_code, 200)
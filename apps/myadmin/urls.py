@@ -8,6 +8,7 @@ urlpatterns = patterns('',
     url('^recluster/?$', views.recluster, name='myadmin.recluster'),
     url('^export_tsv/?$', views.export_tsv, name='myadmin.export_tsv'),
     url('^settings/?$', views.settings, name='myadmin.settings'),
+    url('^cache_stats/?$', views.cache_stats, name='myadmin.cache_stats'),
 
     # The Django admin.
     url('^', include(admin.site.urls)),
@@ -1,4 +1,7 @@
+import json
+
 from django.contrib import admin
+from django.http import HttpResponse
 from django.shortcuts import redirect
 from django.views import debug
 
@@ -6,6 +9,7 @@ import jingo
 
 import api.tasks
 import themes.tasks
+from input import lru
 
 
 # TODO(davedash): remove when metrics.json is in place
@@ -36,3 +40,10 @@ def settings(request):
     return jingo.render(request, 'myadmin/settings.html',
                         {'settings_dict': settings_dict})
 
+
+
+@admin.site.admin_view
+def cache_stats(request):
+    """Counters of this process's in-memory LRU caches, for metrics."""
+    return HttpResponse(json.dumps(lru.stats()),
+                        mimetype='application/json')
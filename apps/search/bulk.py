@@ -0,0 +1,155 @@
+"""
+Bulk ElasticSearch indexing.
+
+``BulkIndexer`` turns rows as returned by ``QuerySet.values()`` straight into
+``_bulk`` request bodies, without building model instances, and sends one
+request per batch of documents, capped in documents and bytes.
+"""
+import json
+import time
+
+from django.conf import settings
+
+import commonware.log
+
+from feedback.models import Opinion
+
+
+log = commonware.log.getLogger('i.es')
+
+SIMPLE_TYPES = (int, long, float, bool, basestring, list, dict, type(None))
+
+# Errors of items ES had no capacity for: those are retried after a pause.
+RETRY_STATUSES = (429, 503)
+RETRY_ERRORS = ('EsRejectedExecutionException',)
+
+
+def opinion_doc(row):
+    """
+    The document for an opinion ``values()`` row, shaped like
+    ``pyes.djangoutils.get_values(opinion)``.
+    """
+    doc = dict((k, v if isinstance(v, SIMPLE_TYPES) else unicode(v))
+               for k, v in row.iteritems())
+    doc['pk'] = row['id']
+    return doc
+
+
+class BulkIndexer(object):
+    """
+    Collects documents with ``add()`` and sends them in ``_bulk`` requests of
+    at most ``max_docs`` documents and (roughly) ``max_bytes`` bytes.
+
+    Requests are sent synchronously, so a slow cluster slows down whoever
+    produces the documents. Items ES rejects for lack of capacity are retried
+    up to ``retries`` times, with exponential backoff; other failures (and
+    items still rejected after that) end up in ``failed``, a dict of
+    ``id: error``.
+    """
+
+    def __init__(self, es, index=None, doc_type='opinion', max_docs=None,
+                 max_bytes=None, retries=None, backoff=1):
+        self.es = es
+        self.index = index or settings.ES_INDEX
+        self.doc_type = doc_type
+        self.max_docs = max_docs or settings.ES_BULK_DOCS
+        self.max_bytes = max_bytes or settings.ES_BULK_BYTES
+        self.retries = settings.ES_BULK_RETRIES if retries is None else retries
+        self.backoff = backoff
+
+        self.batch = []  # (id, action and document lines)
+        self.batch_bytes = 0
+        self.failed = {}
+        self.indexed = self.bytes = self.requests = 0
+        self.elapsed = 0.0
+
+    def add(self, id, doc):
+        action = {'index': {'_index': self.index, '_type': self.doc_type,
+                            '_id': id}}
+        lines = '%s\n%s\n' % (json.dumps(action), json.dumps(doc))
+        if self.batch and (len(self.batch) >= self.max_docs or
+                           self.batch_bytes + len(lines) > self.max_bytes):
+            self.flush()
+        self.batch.append((id, lines))
+        self.batch_bytes += len(lines)
+
+    def add_rows(self, rows):
+        """Add opinion ``values()`` rows."""
+        for row in rows:
+            self.add(row['id'], opinion_doc(row))
+
+    def flush(self):
+        batch, self.batch, self.batch_bytes = self.batch, [], 0
+        for attempt in xrange(self.retries + 1):
+            if not batch:
+                return
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            batch = self._send(batch, last=attempt == self.retries)
+
+    def _send(self, batch, last):
+        """Send one request, return the items to retry."""
+        body = ''.join(lines for id, lines in batch)
+        start = time.time()
+        try:
+            response = self.es._send_request('POST', '/_bulk', body)
+        except Exception, e:
+            return self._fail(batch, e, last)
+        finally:
+            self.elapsed += time.time() - start
+            self.requests += 1
+        if not isinstance(response, dict) or 'items' not in response:
+            # The whole request was refused, e.g. too large or overloaded.
+            error = (response.get('error', response)
+                     if isinstance(response, dict) else response)
+            return self._fail(batch, error, last)
+
+        self.bytes += len(body)
+        retry = []
+        for (id, lines), item in zip(batch, response['items']):
+            result = item.values()[0]
+            error = result.get('error')
+            if not error and result.get('status', 200) < 300:
+                self.indexed += 1
+            elif (not last and (result.get('status') in RETRY_STATUSES or
+                                any(e in str(error) for e in RETRY_ERRORS))):
+                retry.append((id, lines))
+            else:
+                self.failed[id] = error or result.get('status')
+        return retry
+
+    def _fail(self, batch, error, last):
+        """A request failed as a whole: retry it, or record its items."""
+        log.warning('Bulk request of %d documents failed: %s' %
+                    (len(batch), error))
+        if not last:
+            return batch
+        self.failed.update((id, str(error)) for id, lines in batch)
+        return []
+
+    def close(self):
+        """Send what's left and log the throughput. Returns ``failed``."""
+        self.flush()
+        elapsed = self.elapsed or 1e-9
+        log.info('Indexed %d documents (%d failed) in %d requests, %.1fs: '
+                 '%.0f docs/s, %.2f MB/s.' % (
+                     self.indexed, len(self.failed), self.requests,
+                     self.elapsed, self.indexed / elapsed,
+                     self.bytes / elapsed / 2 ** 20))
+        return self.failed
+
+
+def index_queryset(es, qs, **kwargs):
+    """
+    Index the opinions of ``qs`` in bulk. Returns ``{id: error}`` of the
+    ones that failed.
+    """
+    indexer = BulkIndexer(es, **kwargs)
+    indexer.add_rows(qs.values().iterator())
+    return indexer.close()
+
+
+def index_opinions(es, pks, **kwargs):
+    """Index the opinions with the given ids in bulk, as index_queryset."""
+    return index_queryset(es, Opinion.objects.no_cache().filter(pk__in=pks),
+                          **kwargs)
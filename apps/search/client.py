@@ -1,6 +1,10 @@
+import hashlib
+import json
 import os
 import re
+import select
 import socket
+import threading
 import time
 from calendar import timegm
 from collections import defaultdict
@@ -8,20 +12,28 @@ from datetime import timedelta, date
 from operator import itemgetter
 
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
 
+import commonware.log
 from product_details import product_details
 from tower import ugettext as _
 
 from input import (KNOWN_DEVICES, KNOWN_MANUFACTURERS, OPINION_PRAISE,
-                   OPINION_IDEA, PLATFORM_USAGE)
-from input.utils import crc32, manual_order
-from feedback.models import Opinion
+                   OPINION_IDEA, OPINION_RATING, OPINION_BROKEN,
+                   PLATFORM_USAGE)
+from input.utils import crc32
+from feedback.models import DailyCount, Opinion
+
+from search import partitions
 
 import sphinxapi as sphinx
 
 
 SPHINX_HARD_LIMIT = 1000  # A hard limit that sphinx imposes.
 
+log = commonware.log.getLogger('i.sphinx')
+
 
 def collapsed(matches, trans, name):
     """
@@ -73,10 +85,12 @@ def extract_filters(kwargs):
         else:
             filters['locale'] = crc32(kwargs['locale'])
 
-    # TODO: We should allow infinite queries when we get hardware or ES
-    many_days_ago = date.today() - timedelta(days=60)
-    start = time_as_int(kwargs.get('date_start') or many_days_ago,
-                        utc=kwargs.get('utc'))
+    # Without a start date, all of history is searched; the index is
+    # partitioned by month, so only the partitions in range are queried.
+    if kwargs.get('date_start'):
+        start = time_as_int(kwargs['date_start'], utc=kwargs.get('utc'))
+    else:
+        start = 0
     end_date = (kwargs.get('date_end') or date.today()) + timedelta(days=1)
     end = time_as_int(end_date)
     ranges['created'] = (start, end)
@@ -93,20 +107,172 @@ def time_as_int(date, utc=False):
     return int(timegm(t) if utc else time.mktime(t))
 
 
+def facet_cache_key(term, filters, metas):
+    """
+    Cache key of the facet (meta query) results of a search: the same for
+    all searches with the same term, filters and facets.
+    """
+    canonical = json.dumps([term] + [sorted(f.items()) for f in filters] +
+                           [sorted(metas)])
+    return '%sfacets:%s' % (settings.CACHE_PREFIX,
+                            hashlib.md5(canonical).hexdigest())
+
+
+def rollup_meta(kwargs, wanted):
+    """
+    Facets of a search without a term, counted from the daily rollup table
+    instead of Sphinx, in the same shape as ``Client.meta``. Dates are only
+    honoured to the day. Returns ``(meta, total)``.
+    """
+    (_, ranges, _) = extract_filters(kwargs)
+    start, end = ranges['created']
+    qs = (DailyCount.objects
+          .exclude(type__in=(OPINION_RATING.id, OPINION_BROKEN.id))
+          .filter(day__gte=start - start % 86400, day__lt=end))
+
+    if isinstance(kwargs.get('product'), int):
+        qs = qs.filter(product=kwargs['product'])
+    if kwargs.get('version'):
+        qs = qs.filter(version=kwargs['version'])
+    if kwargs.get('type'):
+        qs = qs.filter(type=kwargs['type'])
+    for field in ('platform', 'manufacturer', 'device', 'locale'):
+        val = kwargs.get(field)
+        if val:
+            qs = qs.filter(**{field: '' if val.lower() == 'unknown' else val})
+
+    def counts(field):
+        return [(row[field], row['n']) for row in
+                qs.values(field).annotate(n=Sum('count')).order_by('-n')]
+
+    meta = {}
+    if 'type' in wanted:
+        meta['type'] = [dict(type=t, count=n) for t, n in counts('type')]
+    if 'locale' in wanted:
+        languages = product_details.languages
+        meta['locale'] = [dict(locale=l if l in languages else None, count=n)
+                          for l, n in counts('locale')]
+    if 'platform' in wanted:
+        platforms = set(p.short for p in PLATFORM_USAGE)
+        meta['platform'] = [dict(platform=p if p in platforms else None,
+                                 count=n) for p, n in counts('platform')]
+    for field, known in (('manufacturer', KNOWN_MANUFACTURERS),
+                         ('device', KNOWN_DEVICES)):
+        if field in wanted:
+            matches = [{'attrs': {field: v, 'count': n}}
+                       for v, n in counts(field)]
+            meta[field] = collapsed(matches, dict((k, k) for k in known),
+                                    field)
+    if 'day_sentiment' in wanted:
+        days = dict(praise=[], issue=[], idea=[])
+        rows = (qs.values('day', 'type').annotate(n=Sum('count'))
+                .order_by('day'))
+        for row in rows:
+            if row['type'] == OPINION_PRAISE.id:
+                days['praise'].append((row['day'], row['n']))
+            elif row['type'] == OPINION_IDEA.id:
+                days['idea'].append((row['day'], row['n']))
+            else:
+                days['issue'].append((row['day'], row['n']))
+        meta['day_sentiment'] = days
+
+    total = qs.aggregate(n=Sum('count'))['n'] or 0
+    return meta, total
+
+
 class SearchError(Exception):
     pass
 
 
-class Client(object):
+def sphinx_server():
+    if os.environ.get('DJANGO_ENVIRONMENT') == 'test':
+        return settings.SPHINX_HOST, settings.TEST_SPHINX_PORT
+    else:  # pragma: nocover
+        return settings.SPHINX_HOST, settings.SPHINX_PORT
+
+
+class TimedSphinxClient(sphinx.SphinxClient):
+    """SphinxClient keeping track of the time spent connecting to searchd."""
 
     def __init__(self):
-        self.sphinx = sphinx.SphinxClient()
+        sphinx.SphinxClient.__init__(self)
+        self.connect_time = 0
+
+    def _Connect(self):
+        start = time.time()
+        try:
+            return sphinx.SphinxClient._Connect(self)
+        finally:
+            self.connect_time += time.time() - start
 
-        if os.environ.get('DJANGO_ENVIRONMENT') == 'test':
-            self.sphinx.SetServer(settings.SPHINX_HOST,
-                                  settings.TEST_SPHINX_PORT)
-        else:  # pragma: nocover
-            self.sphinx.SetServer(settings.SPHINX_HOST, settings.SPHINX_PORT)
+
+def _alive(sock):
+    """An idle persistent connection is readable only if searchd hung up."""
+    try:
+        readable, writable, _ = select.select([sock], [sock], [], 0)
+    except (select.error, socket.error):
+        return False
+    return not readable and bool(writable)
+
+
+class ConnectionPool(object):
+    """
+    Persistent searchd connections (searchd's "persist" command), shared by
+    all Clients of this process. Connections are checked before they are
+    handed out; dead ones are dropped and replaced by new ones.
+    """
+
+    def __init__(self, server, size):
+        self.server = server
+        self.size = size
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        """A live persistent connection, or None if searchd is unreachable."""
+        while True:
+            with self.lock:
+                if not self.idle:
+                    break
+                sock = self.idle.pop()
+            if _alive(sock):
+                return sock
+            sock.close()
+
+        sc = sphinx.SphinxClient()
+        sc.SetServer(*self.server)
+        if not sc.Open():
+            log.warning('Could not open persistent connection: %s' %
+                        sc.GetLastError())
+            return None
+        return sc._socket
+
+    def put(self, sock):
+        """Return a connection to the pool, closing it if the pool is full."""
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(sock)
+                return
+        sock.close()
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def connection_pool(server):
+    with _pools_lock:
+        if server not in _pools:
+            _pools[server] = ConnectionPool(server, settings.SPHINX_POOL_SIZE)
+        return _pools[server]
+
+
+class Client(object):
+
+    def __init__(self):
+        self.sphinx = TimedSphinxClient()
+        self.sphinx.SetServer(*sphinx_server())
+        # Seconds spent connecting to searchd and running queries.
+        self.timings = {'connect': 0, 'query': 0}
 
         self.index = 'opinions'
         self.meta = {}
@@ -176,6 +342,7 @@ class Client(object):
 
         # Extract and apply various filters.
         (includes, ranges, metas) = extract_filters(kwargs)
+        self.index = ' '.join(partitions.indexes_for(*ranges['created']))
 
         for filter, value in includes.iteritems():
             self.add_filter(filter, value)
@@ -187,25 +354,54 @@ class Client(object):
             self.add_filter(filter, value, meta=True)
 
         url_re = re.compile(r'\burl:\*\B')
-
-        if url_re.search(term):
+        has_url = bool(url_re.search(term))
+        if has_url:
             parts = url_re.split(term)
             sc.SetFilter('has_url', (1,))
             term = ''.join(parts)
 
-        if 'meta' in kwargs:
-            for meta in kwargs['meta']:
-                self.add_meta_query(meta, term)
+        # Facets of term-less searches are counted from the daily rollup.
+        # Otherwise they come from the cache if possible; when they are
+        # stale, one request recomputes them while the others still use the
+        # old ones.
+        wanted = kwargs.get('meta', ())
+        facets_key = facet_cache_key(term, (includes, ranges, metas,
+                                            {'has_url': has_url}), wanted)
+        cached = None
+        if wanted and settings.SEARCH_ROLLUP_FACETS and not (term or has_url):
+            self.meta = rollup_meta(kwargs, wanted)[0]
+            wanted = ()
+        elif wanted:
+            cached = cache.get(facets_key)
+        if cached and (cached['expires'] > time.time() or
+                       not cache.add(facets_key + ':lock', 1,
+                                     settings.SEARCH_FACET_CACHE_TIMEOUT)):
+            self.meta = cached['meta']
+            wanted = ()
+
+        for meta in wanted:
+            self.add_meta_query(meta, term)
 
         sc.SetLimits(min(SPHINX_HARD_LIMIT - limit, offset), limit)
 
+        # Keyset pagination: with a (created, id) cursor, only results older
+        # than it, so paging past SPHINX_HARD_LIMIT works.
+        before = kwargs.get('before')
+        if before:
+            created, id = before
+            sc.SetSelect('*, created < %d OR (created = %d AND @id < %d) '
+                         'AS before_cursor' % (created, created, id))
+            sc.SetFilter('before_cursor', (1,))
+        else:
+            sc.SetSelect('*')
+
         # Always sort in reverse chronological order.
-        sc.SetSortMode(sphinx.SPH_SORT_EXTENDED, 'created DESC')
+        sc.SetSortMode(sphinx.SPH_SORT_EXTENDED, 'created DESC, @id DESC')
         sc.AddQuery(term, self.index)
         self.queries['primary'] = self.query_index
         self.query_index += 1
         try:
-            results = sc.RunQueries()
+            results = self.run_queries()
         except socket.timeout:
             raise SearchError(_("Query has timed out."))
         except Exception, e:
@@ -221,13 +417,49 @@ class Client(object):
         if result['error']:
             raise SearchError(result['error'])
 
-        self.handle_metas(results, kwargs.get('meta', {}), kwargs)
+        if wanted:
+            self.handle_metas(results, wanted, kwargs)
+            fresh = settings.SEARCH_FACET_CACHE_TIMEOUT
+            cache.set(facets_key,
+                      {'meta': self.meta, 'expires': time.time() + fresh},
+                      fresh + settings.SEARCH_FACET_STALE_TIMEOUT)
+            cache.delete(facets_key + ':lock')
 
         if result and 'total' in result:
             return self.get_result_set(term, result, offset, limit)
         else:
             return []
 
+    def run_queries(self):
+        """
+        Run the queued queries, over a pooled persistent connection if
+        settings.SPHINX_PERSISTENT is set, and record connect/query timings.
+        """
+        sc = self.sphinx
+        pool = None
+        start = time.time()
+        if settings.SPHINX_PERSISTENT:
+            pool = connection_pool(sphinx_server())
+            sc._socket = pool.get()
+            sc.connect_time += time.time() - start
+
+        results = None
+        try:
+            results = sc.RunQueries()
+            return results
+        finally:
+            if sc._socket:
+                if pool and results is not None and not sc.GetLastError():
+                    pool.put(sc._socket)
+                else:
+                    # Don't reuse a connection in an unknown state.
+                    sc._socket.close()
+                sc._socket = None
+            self.timings['connect'] = sc.connect_time
+            self.timings['query'] = time.time() - start - sc.connect_time
+            log.debug('Sphinx: %.1fms connecting, %.1fms querying.' % (
+                self.timings['connect'] * 1000, self.timings['query'] * 1000))
+
     def _day_sentiment(self, results, **kwargs):
         result = results[self.queries['day_sentiment']]
         pos = []
@@ -280,19 +512,25 @@ class Client(object):
     def get_result_set(self, term, result, offset, limit):
         # Return results as a ResultSet of opinions
         opinion_ids = [m['id'] for m in result['matches']]
-        opinions = manual_order(Opinion.objects.all(), opinion_ids)
-        return ResultSet(opinions, self.total_found, offset)
+        opinions = Opinion.objects.by_ids(opinion_ids)
+        cursor = None
+        if result['matches'] and offset + limit < self.total_found:
+            last = result['matches'][-1]
+            cursor = (last['attrs']['created'], last['id'])
+        return ResultSet(opinions, self.total_found, offset, cursor)
 
 
 class ResultSet(object):
     """
     ResultSet wraps around a query set and provides meta data used for
-    pagination.
+    pagination. ``cursor`` is the (created, id) to pass as ``before`` to get
+    the results after these, if there are any.
     """
-    def __init__(self, queryset, total, offset):
+    def __init__(self, queryset, total, offset, cursor=None):
         self.queryset = queryset
         self.total = total
         self.offset = offset
+        self.cursor = cursor
 
     def __len__(self):
         return self.total
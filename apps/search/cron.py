@@ -1,3 +1,7 @@
+import datetime
+
+from django.db.models import Max, Min
+
 import commonware.log
 import cronjobs
 from celery.messaging import establish_connection
@@ -5,7 +9,9 @@ from celeryutils import chunked
 
 import input
 from feedback.models import Opinion
-from search import tasks
+from search import partitions, tasks
+from search.models import SphinxCounter
+from search.utils import indexer_lock, rotate_indexes
 
 log = commonware.log.getLogger('i.cron')
 
@@ -14,7 +20,8 @@ log = commonware.log.getLogger('i.cron')
 def index_all():
     """
     This reindexes all the Opinions in usage.  This is not intended to be run
-    other than to initially seed Elastic Search.
+    other than to initially seed Elastic Search.  See the ``reindex``
+    management command for a resumable, parallel reindex.
     """
     ids = (Opinion.objects
            .filter(_type__in=[i.id for i in input.OPINION_USAGE])
@@ -22,3 +29,67 @@ def index_all():
     with establish_connection() as conn:
         for chunk in chunked(ids, 1000):
             tasks.add_to_index.apply_async(args=[chunk], connection=conn)
+
+
+def _counter(counter_id):
+    try:
+        return SphinxCounter.objects.get(counter_id=counter_id).max_doc_id
+    except SphinxCounter.DoesNotExist:
+        return None
+
+
+def _set_counter(counter_id, max_doc_id):
+    SphinxCounter(counter_id=counter_id, max_doc_id=max_doc_id).save()
+
+
+def _index_delta():
+    max_id = Opinion.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+    _set_counter(partitions.DELTA_COUNTER, max_id)
+    rotate_indexes(partitions.DELTA_INDEX)
+    return max_id
+
+
+@cronjobs.register
+def index_delta():
+    """
+    Reindex the Sphinx delta index, which holds the opinions added since the
+    last merge. Run every minute, so new feedback is searchable right away.
+    """
+    with indexer_lock(blocking=False) as locked:
+        if not locked:
+            log.info('Indexer busy, skipping delta.')
+            return
+        _index_delta()
+
+
+@cronjobs.register
+def merge_delta():
+    """
+    Merge the Sphinx delta index into the partition of the current month and
+    start a new, empty delta. Run nightly.
+
+    If the delta holds opinions of earlier months (after a month changed or
+    before the first merge), the partitions of those months are reindexed
+    instead.
+    """
+    with indexer_lock():
+        main_id, delta_id = (_counter(partitions.MAIN_COUNTER),
+                             _index_delta())
+        this_month = partitions.month_of(datetime.date.today())
+        if main_id is None:
+            first = partitions.FIRST_MONTH
+        else:
+            oldest = (Opinion.objects.filter(id__gt=main_id, id__lte=delta_id)
+                      .aggregate(oldest=Min('created'))['oldest'])
+            first = partitions.month_of(oldest) if oldest else this_month
+
+        _set_counter(partitions.MAIN_COUNTER, delta_id)
+        if first < this_month:
+            months = partitions.months(first, this_month)
+            log.info('Reindexing %d partitions.' % len(months))
+            rotate_indexes(*map(partitions.index_name, months))
+        else:
+            log.info('Merging delta up to id %d.' % delta_id)
+            rotate_indexes('--merge', partitions.index_name(this_month),
+                           partitions.DELTA_INDEX)
+        _index_delta()
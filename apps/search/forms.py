@@ -72,6 +72,9 @@ class ReporterSearchForm(forms.Form):
         # L10n: This indicates the second part of a date range.
         attrs={'class': 'datepicker'}), label=_lazy('to'))
     page = forms.IntegerField(widget=forms.HiddenInput, required=False)
+    # Keyset pagination cursor: "<created timestamp>-<id>" of the last
+    # opinion of the previous page.
+    before = forms.CharField(widget=forms.HiddenInput, required=False)
 
     # TODO(davedash): Make this prettier.
     def __init__(self, *args, **kwargs):
@@ -113,6 +116,14 @@ class ReporterSearchForm(forms.Form):
         except (TypeError, AssertionError):
             cleaned['page'] = 1
 
+        # Ignore broken cursors.
+        try:
+            cleaned['before'] = tuple(int(i) for i in
+                                      cleaned.get('before').split('-'))
+            assert len(cleaned['before']) == 2
+        except (AttributeError, ValueError, AssertionError):
+            cleaned['before'] = None
+
         if not cleaned.get('version'):
             cleaned['version'] = (getattr(FIREFOX, 'default_version', None) or
                                     Version(LATEST_BETAS[FIREFOX]).simplified)
@@ -0,0 +1,20 @@
+"""
+Locales as Sphinx indexes them.
+
+The locales below are indexed as they are; all others are shortened to
+their language, e.g. "de-AT" to "de". The daily counts (see
+feedback.models.DailyCount) group opinions the same way. This module does
+not depend on Django, so sphinx.conf can import it.
+"""
+
+INDEXED_LONG_LOCALES = ('zh-TW', 'pa-IN', 'ne-NP', 'en-GB', 'bn-IN', 'en-NZ',
+                        'pt-BR', 'nb-NO', 'gu-IN', 'zh-CN', 'tt-RU', 'fur-IT',
+                        'pt-PT', 'nn-NO', 'fy-NL', 'en-CA', 'fj-FJ', 'en-US',
+                        'en-ZA', 'bn-BD', 'sv-SE', 'en-AU', 'hy-AM')
+
+
+def indexed_locale_sql(column='locale'):
+    """SQL expression for the indexed locale of the locale in ``column``."""
+    return "IF(%s IN (%s), %s, SUBSTRING_INDEX(%s, '-', 1))" % (
+        column, ', '.join("'%s'" % l for l in INDEXED_LONG_LOCALES), column,
+        column)
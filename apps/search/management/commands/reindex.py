@@ -0,0 +1,54 @@
+import os
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from search.reindex import reindex
+
+
+class Command(BaseCommand):
+    """
+    Index all opinions into ElasticSearch, in parallel, resuming an
+    interrupted run from its checkpoint file.
+    """
+
+    option_list = BaseCommand.option_list + (
+        make_option('--processes',
+                    action='store',
+                    type='int',
+                    dest='processes',
+                    default=None,
+                    help='Worker processes (default: one per CPU).'),
+        make_option('--step',
+                    action='store',
+                    type='int',
+                    dest='step',
+                    default=1000,
+                    help='Opinions per id range handed to a worker.'),
+        make_option('--checkpoint',
+                    action='store',
+                    dest='checkpoint',
+                    default=os.path.join(settings.ROOT, 'tmp',
+                                         'reindex.json'),
+                    help='Progress file to resume from.'),
+        make_option('--new-index',
+                    action='store_true',
+                    dest='new_index',
+                    default=False,
+                    help='Build a fresh index, then point the ES_INDEX '
+                         'alias to it and delete the old index.'),
+        make_option('--restart',
+                    action='store_true',
+                    dest='restart',
+                    default=False,
+                    help='Ignore the checkpoint and start over.'),
+    )
+
+    def handle(self, *args, **options):
+        failed = reindex(options['checkpoint'], options['processes'],
+                         options['step'], options['new_index'],
+                         options['restart'])
+        if failed:
+            print '%d opinions failed to index: %s' % (
+                len(failed), ' '.join(map(str, failed)))
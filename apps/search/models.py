@@ -0,0 +1,13 @@
+from django.db import models
+
+
+class SphinxCounter(models.Model):
+    """
+    Highest opinion id in the Sphinx partitions and in the delta index (see
+    search.partitions and configs/sphinx/sphinx.conf).
+    """
+    counter_id = models.IntegerField(primary_key=True)
+    max_doc_id = models.PositiveIntegerField()
+
+    class Meta:
+        db_table = 'sph_counter'
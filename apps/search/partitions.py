@@ -0,0 +1,84 @@
+"""
+Monthly partitions of the Sphinx opinion index.
+
+Opinions are indexed into one index per calendar month, ``opinions_YYYYMM``
+(see configs/sphinx/sphinx.conf), and searches only query the months their
+date range overlaps, so searching a few weeks costs the same however much
+history there is.
+
+The partitions hold opinions up to the id in ``sph_counter`` row
+``MAIN_COUNTER``; newer ones are in the small ``opinions_delta`` index, up to
+the id in row ``DELTA_COUNTER``. The delta is reindexed every minute and
+merged into the partition of the current month nightly (see search.cron).
+``opinions`` is a distributed index over all partitions and the delta.
+
+Months are ``(year, month)`` tuples. This module does not depend on Django,
+so sphinx.conf can import it.
+"""
+import datetime
+
+
+# The first month with opinions.
+FIRST_MONTH = (2010, 1)
+INDEX_PREFIX = 'opinions_'
+DELTA_INDEX = 'opinions_delta'
+# Name of the distributed index over all partitions and the delta.
+ALL_INDEXES = 'opinions'
+
+# sph_counter rows.
+MAIN_COUNTER, DELTA_COUNTER = 1, 2
+
+
+def add_months(month, n):
+    year, month = divmod(month[0] * 12 + month[1] - 1 + n, 12)
+    return (year, month + 1)
+
+
+def months(first, last):
+    """All months from ``first`` to ``last``, inclusive."""
+    result = []
+    while first <= last:
+        result.append(first)
+        first = add_months(first, 1)
+    return result
+
+
+def month_of(date):
+    return (date.year, date.month)
+
+
+def index_name(month):
+    return '%s%04d%02d' % (INDEX_PREFIX, month[0], month[1])
+
+
+def month_bounds(month):
+    """The first day of ``month`` and of the month after it."""
+    return (datetime.date(month[0], month[1], 1),
+            datetime.date(*add_months(month, 1) + (1,)))
+
+
+def configured_months(today=None):
+    """
+    Months sphinx.conf has a partition for: up to next month, so a config
+    written on the last day of a month still covers the next one.
+    """
+    today = today or datetime.date.today()
+    return months(FIRST_MONTH, add_months(month_of(today), 1))
+
+
+def indexes_for(start, end, today=None):
+    """
+    Names of the partitions overlapping the unix timestamp range
+    ``[start, end)`` plus the delta, or the distributed index if no
+    partition is in range. The range is widened by a day on both ends, so
+    time zones don't matter.
+    """
+    today = today or datetime.date.today()
+    first = max(FIRST_MONTH, month_of(
+        datetime.date.fromtimestamp(max(start - 86400, 0))))
+    last = min(month_of(today),
+               month_of(datetime.date.fromtimestamp(end + 86400)))
+    names = [index_name(m) for m in months(first, last)]
+    if not names:
+        return [ALL_INDEXES]
+    return names + [DELTA_INDEX]
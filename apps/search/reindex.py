@@ -0,0 +1,199 @@
+"""
+Resumable, parallel full reindex of opinions into ElasticSearch.
+
+Opinion ids are walked in ascending order and cut into ranges of ``step``
+ids, which a pool of worker processes indexes in bulk. After each range
+(in order) the last indexed id is written to a JSON checkpoint file, so an
+interrupted reindex picks up where it stopped.
+
+With ``new_index``, opinions are indexed into a fresh index, and the
+``settings.ES_INDEX`` alias is switched to it in one ``_aliases`` request
+when all are done, so searches never see a half built index. While it is
+built, the new index is kept in the cache under ``BUILDING_KEY``, and
+opinions saved or deleted in the meantime are written to both indexes (see
+``write_indexes``). Opinions created after the last range are indexed right
+before the switch, and the indexes the alias pointed to before are deleted
+after it.
+"""
+import json
+import multiprocessing
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+import commonware.log
+from elasticutils import get_es
+
+import input
+from feedback.models import Opinion
+from search.bulk import index_queryset
+
+log = commonware.log.getLogger('i.es')
+
+# Cache key of the index a ``new_index`` reindex is building, and how long it
+# is kept without progress, in seconds: long enough for an interrupted
+# reindex to be resumed (memcached takes at most 30 days).
+BUILDING_KEY = '%ses:building' % settings.CACHE_PREFIX
+BUILDING_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def write_indexes():
+    """Indexes changed opinions go to: ES_INDEX, and one being built."""
+    building = cache.get(BUILDING_KEY)
+    if building and building != settings.ES_INDEX:
+        return [settings.ES_INDEX, building]
+    return [settings.ES_INDEX]
+
+
+def opinions():
+    return (Opinion.objects.no_cache()
+            .filter(_type__in=[t.id for t in input.OPINION_USAGE]))
+
+
+def id_ranges(start, step):
+    """
+    Yield ``(after, upto)`` ranges holding ``step`` opinions each, above id
+    ``start``. Only the id index is read, ``step`` rows further each time.
+    """
+    ids = opinions().order_by('id').values_list('id', flat=True)
+    while True:
+        upto = list(ids.filter(id__gt=start)[step - 1:step])
+        if not upto:
+            upto = list(ids.filter(id__gt=start).order_by('-id')[:1])
+            if upto:
+                yield start, upto[0]
+            return
+        yield start, upto[0]
+        start = upto[0]
+
+
+def _index_range(args):
+    """Index one range, in a worker process."""
+    after, upto, index = args
+    failed = index_queryset(get_es(),
+                            opinions().filter(id__gt=after, id__lte=upto),
+                            index=index)
+    return upto, failed
+
+
+def read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except IOError:
+        return None
+
+
+def write_checkpoint(path, checkpoint):
+    """Write the checkpoint to a temporary file and move it into place."""
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+    os.rename(path + '.tmp', path)
+
+
+def swap_alias(es, alias, index):
+    """
+    Point ``alias`` at ``index`` (only), atomically, then delete the indexes
+    it pointed to before. Returns their names.
+
+    An index can't have the name of an alias. If ``alias`` is still a
+    concrete index, as before the first ``new_index`` reindex, that index is
+    deleted first: searches fail until the alias is added, a moment later.
+    """
+    aliases = es._send_request('GET', '/_aliases')
+    if alias in aliases:
+        log.warning('Deleting index %s to replace it by an alias.' % alias)
+        es.delete_index(alias)
+    old = [name for name, info in aliases.items()
+           if alias in info.get('aliases', {}) and name != index]
+    actions = [{'remove': {'index': name, 'alias': alias}} for name in old]
+    actions.append({'add': {'index': index, 'alias': alias}})
+    es._send_request('POST', '/_aliases', json.dumps({'actions': actions}))
+    for name in old:
+        es.delete_index(name)
+    return old
+
+
+def abandon(es, checkpoint):
+    """Delete the index of an interrupted ``new_index`` reindex."""
+    if cache.get(BUILDING_KEY) == checkpoint['index']:
+        cache.delete(BUILDING_KEY)
+    if checkpoint['new_index'] and checkpoint['index'] != settings.ES_INDEX:
+        log.info('Deleting abandoned index %s.' % checkpoint['index'])
+        try:
+            es.delete_index(checkpoint['index'])
+        except Exception, e:
+            log.warning('Could not delete index %s: %s' % (
+                checkpoint['index'], e))
+
+
+def reindex(checkpoint_path, processes=None, step=1000, new_index=False,
+            restart=False):
+    """
+    Index all opinions, resuming from ``checkpoint_path`` unless ``restart``.
+    Returns the ids of opinions that failed to index.
+
+    With ``restart``, the index an interrupted ``new_index`` reindex was
+    building is deleted.
+    """
+    es = get_es()
+    checkpoint = read_checkpoint(checkpoint_path)
+    if checkpoint and restart:
+        abandon(es, checkpoint)
+        checkpoint = None
+    if checkpoint:
+        log.info('Resuming reindex into %s after id %d.' % (
+            checkpoint['index'], checkpoint['last_id']))
+    else:
+        index = settings.ES_INDEX
+        if new_index:
+            index = '%s-%s' % (settings.ES_INDEX, time.strftime('%Y%m%d%H%M'))
+            es.create_index(index)
+        checkpoint = {'index': index, 'new_index': new_index, 'last_id': 0,
+                      'failed': []}
+    index = checkpoint['index']
+
+    # Forked workers must not share the parent's database connection.
+    connection.close()
+    pool = multiprocessing.Pool(processes or multiprocessing.cpu_count())
+
+    def done(upto, failed):
+        checkpoint['last_id'] = upto
+        checkpoint['failed'].extend(failed)
+        write_checkpoint(checkpoint_path, checkpoint)
+        if checkpoint['new_index']:
+            cache.set(BUILDING_KEY, index, BUILDING_TIMEOUT)
+
+    done(checkpoint['last_id'], [])
+    start = time.time()
+    count = 0
+    try:
+        ranges = ((after, upto, index) for after, upto in
+                  id_ranges(checkpoint['last_id'], step))
+        for upto, failed in pool.imap(_index_range, ranges):
+            done(upto, failed)
+            count += 1
+            log.info('Indexed up to id %d (%d ranges, %.0fs).' % (
+                upto, count, time.time() - start))
+    finally:
+        pool.close()
+        pool.join()
+
+    if checkpoint['new_index']:
+        # Opinions created since the workers' last range: from now on, they
+        # are written to the new index as they come in.
+        for after, upto in id_ranges(checkpoint['last_id'], step):
+            done(*_index_range((after, upto, index)))
+        deleted = swap_alias(es, settings.ES_INDEX, index)
+        cache.delete(BUILDING_KEY)
+        log.info('Alias %s now points to %s, deleted %s.' % (
+            settings.ES_INDEX, index, ', '.join(deleted) or 'nothing'))
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return checkpoint['failed']
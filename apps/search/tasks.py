@@ -1,12 +1,27 @@
+from django.conf import settings
+
+import commonware.log
 from celeryutils import task
 
-from feedback.models import Opinion
-from elasticutils import get_es, es_required
+from elasticutils import es_required
+from search.bulk import index_opinions
+from search.reindex import write_indexes
+
+log = commonware.log.getLogger('i.task')
 
 
 @task
 @es_required
-def add_to_index(pks, es, **kw):
-    for opinion in Opinion.objects.filter(pk__in=pks):
-        opinion.update_index(bulk=True)
-    es.force_bulk()
+def add_to_index(pks, es, attempt=0, **kw):
+    failed = {}
+    for index in write_indexes():
+        failed.update(index_opinions(es, pks, index=index))
+    if not failed:
+        return
+    if attempt < settings.ES_BULK_RETRIES:
+        log.warning('Indexing %d opinions failed, retrying.' % len(failed))
+        add_to_index.apply_async(args=[failed.keys()],
+                                 kwargs={'attempt': attempt + 1},
+                                 countdown=60 * 2 ** attempt)
+    else:
+        log.error('Indexing opinions failed: %s' % failed)
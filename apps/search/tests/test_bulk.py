@@ -0,0 +1,76 @@
+import json
+
+from mock import patch
+from nose.tools import eq_
+import test_utils
+
+from feedback.models import Opinion
+from search.bulk import BulkIndexer, index_opinions
+
+
+class FakeES(object):
+    """Records bulk requests; answers with the given item results."""
+
+    def __init__(self, *results):
+        self.requests = []
+        self.results = list(results)
+
+    def _send_request(self, method, path, body):
+        self.requests.append(body)
+        lines = body.splitlines()
+        result = self.results.pop(0) if self.results else {'ok': True}
+        if 'status' in result and 'items' not in result:
+            return result  # an error response for the whole request
+        return {'items': [{'index': dict(result, _id=json.loads(a)['index']
+                                         ['_id'])} for a in lines[::2]]}
+
+
+@patch('search.bulk.time.sleep')
+class BulkIndexerTest(test_utils.TestCase):
+    fixtures = ('feedback/opinions',)
+
+    def test_batches(self, sleep):
+        """Requests hold at most max_docs documents and max_bytes bytes."""
+        es = FakeES()
+        indexer = BulkIndexer(es, max_docs=3, max_bytes=10000)
+        for i in range(7):
+            indexer.add(i, {'description': 'x'})
+        eq_(indexer.close(), {})
+        eq_([len(r.splitlines()) / 2 for r in es.requests], [3, 3, 1])
+
+        es = FakeES()
+        indexer = BulkIndexer(es, max_docs=100, max_bytes=300)
+        for i in range(7):
+            indexer.add(i, {'description': 'x' * 100})
+        indexer.close()
+        eq_(len(es.requests), 7)
+        eq_(indexer.indexed, 7)
+
+    def test_failures(self, sleep):
+        """Rejected items are retried, other failures are recorded."""
+        es = FakeES({'error': 'EsRejectedExecutionException[full]'},
+                    {'error': 'MapperParsingException[oops]'})
+        indexer = BulkIndexer(es, retries=2)
+        indexer.add(1, {})
+        eq_(indexer.close(), {1: 'MapperParsingException[oops]'})
+        eq_(len(es.requests), 2)
+        eq_(sleep.call_count, 1)
+
+    def test_request_failures(self, sleep):
+        """Responses without items fail (or retry) the whole batch."""
+        es = FakeES({'status': 429, 'error': 'Too Many Requests'},
+                    {'status': 413, 'error': 'Request Entity Too Large'})
+        indexer = BulkIndexer(es, retries=1)
+        indexer.add(1, {})
+        indexer.add(2, {})
+        eq_(indexer.close(), {1: 'Request Entity Too Large',
+                              2: 'Request Entity Too Large'})
+        eq_(len(es.requests), 2)
+
+    def test_index_opinions(self, sleep):
+        es = FakeES()
+        pks = list(Opinion.objects.values_list('id', flat=True)[:5])
+        eq_(index_opinions(es, pks), {})
+        docs = [json.loads(l) for l in es.requests[0].splitlines()[1::2]]
+        eq_(sorted(d['pk'] for d in docs), sorted(pks))
+        assert all(isinstance(d['created'], unicode) for d in docs)
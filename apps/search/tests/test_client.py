@@ -1,12 +1,15 @@
 import datetime
 import socket
 
-from mock import patch
+from django.conf import settings
+
+from mock import Mock, patch
 from nose.tools import eq_
 
 import input
 from feedback.models import Opinion
-from search.client import Client, SearchError, extract_filters
+from search.client import (Client, ConnectionPool, SearchError,
+                           extract_filters, facet_cache_key)
 from search.tests import SphinxTestCase
 
 query = lambda x='', **kwargs: Client().query(x, **kwargs)
@@ -71,6 +74,29 @@ class SearchTest(SphinxTestCase):
         start = datetime.datetime(2010, 5, 27)
         eq_(num_results(date_start=start), 31)
 
+    @patch.object(settings._wrapped, 'SPHINX_PERSISTENT', True)
+    @patch('search.client.connection_pool')
+    @patch('search.client.sphinx.SphinxClient.RunQueries')
+    def test_failed_query_not_pooled(self, rq, connection_pool):
+        """A connection a query failed on is closed, not reused."""
+        pool = connection_pool.return_value
+        for result in (None, [{'error': ''}]):
+            sock = Mock()
+            pool.get.return_value = sock
+            rq.return_value = result
+            c = Client()
+            if result:
+                c.sphinx._error = 'protocol error'
+            c.run_queries()
+            sock.close.assert_called_with()
+            assert not pool.put.called
+
+        sock = pool.get.return_value = Mock()
+        rq.return_value = [{'error': ''}]
+        Client().run_queries()
+        pool.put.assert_called_with(sock)
+        assert not sock.close.called
+
     @patch('search.client.sphinx.SphinxClient.RunQueries')
     def test_result_empty(self, rq):
         """
@@ -95,6 +121,28 @@ class SearchTest(SphinxTestCase):
         rs = query(date_start=start)
         assert isinstance(rs[0], Opinion)
 
+    @patch.object(settings, 'SEARCH_ROLLUP_FACETS', False)
+    def test_facet_cache(self):
+        """Facets are cached, the results are not."""
+        start = datetime.datetime(2010, 5, 27)
+        c = Client()
+        c.query('', meta=('type',), date_start=start)
+        meta = c.meta
+
+        c = Client()
+        with patch.object(Client, 'add_meta_query') as add_meta_query:
+            eq_(len(c.query('', meta=('type',), date_start=start)), 31)
+            assert not add_meta_query.called
+        eq_(c.meta, meta)
+
+    def test_cursor(self):
+        """Paging with a cursor gives the same results as with an offset."""
+        start = datetime.datetime(2010, 5, 27)
+        first = query(limit=5, date_start=start)
+        second = query(limit=5, date_start=start, before=first.cursor)
+        eq_([o.id for o in second],
+            [o.id for o in query(limit=5, offset=5, date_start=start)])
+
     def test_url_search(self):
         start = datetime.datetime(2010, 5, 27)
         eq_(num_results('url:*', date_start=start), 7)
@@ -110,9 +158,42 @@ def test_date_filter_timezone():
     eq_(ranges['created'][1], 1265011200)
 
 
+def test_facet_cache_key():
+    """Facet cache keys don't depend on the order of facets."""
+    filters = ({'a': 1, 'b': 2}, {'created': (1, 2)})
+    eq_(facet_cache_key('foo', filters, ('type', 'locale')),
+        facet_cache_key('foo', filters, ('locale', 'type')))
+    assert (facet_cache_key('foo', filters, ('type',)) !=
+            facet_cache_key('bar', filters, ('type',)))
+
+
 def test_extract_filters_unknown():
     """
     Test that we return the proper value of unknown that sphinx is expecting.
     """
     _, _, metas = extract_filters(dict(platform='unknown'))
     eq_(metas['platform'], 0)
+
+
+@patch('search.client.sphinx.SphinxClient.Open')
+def test_connection_pool(open):
+    """Live connections are reused, dead ones replaced."""
+    open.return_value = None  # searchd is unreachable.
+    pool = ConnectionPool(('127.0.0.1', 0), size=1)
+    eq_(pool.get(), None)
+
+    conn, other_end = socket.socketpair()
+    pool.put(conn)
+    eq_(pool.get(), conn)
+
+    # searchd hung up.
+    pool.put(conn)
+    other_end.close()
+    eq_(pool.get(), None)
+    eq_(open.call_count, 2)
+
+    # Connections beyond the pool size are closed.
+    a, b = socket.socketpair()
+    pool.put(a)
+    pool.put(b)
+    eq_(pool.idle, [a])
@@ -0,0 +1,55 @@
+import datetime
+import tempfile
+
+from django.conf import settings
+from django.db.models import Max
+
+from mock import patch
+from nose.tools import eq_
+import test_utils
+
+from feedback.models import Opinion
+from search import partitions
+from search.cron import index_delta, merge_delta
+from search.models import SphinxCounter
+
+
+counter = lambda id: SphinxCounter.objects.get(counter_id=id).max_doc_id
+
+
+@patch('search.cron.rotate_indexes')
+@patch.object(settings, 'SPHINX_CATALOG_PATH', tempfile.gettempdir())
+class DeltaTest(test_utils.TestCase):
+    fixtures = ('feedback/opinions',)
+
+    def setUp(self):
+        self.max_id = Opinion.objects.aggregate(m=Max('id'))['m']
+
+    def test_index_delta(self, rotate):
+        index_delta()
+        eq_(counter(partitions.DELTA_COUNTER), self.max_id)
+        rotate.assert_called_with(partitions.DELTA_INDEX)
+
+    def test_merge(self, rotate):
+        """New opinions of this month are merged into its partition."""
+        SphinxCounter.objects.create(counter_id=partitions.MAIN_COUNTER,
+                                     max_doc_id=self.max_id)
+        new = Opinion.objects.create(product=1, description='Fresh.')
+        merge_delta()
+
+        this_month = partitions.month_of(datetime.date.today())
+        eq_(rotate.call_args_list[1][0],
+            ('--merge', partitions.index_name(this_month),
+             partitions.DELTA_INDEX))
+        eq_(counter(partitions.MAIN_COUNTER), new.id)
+
+    def test_merge_old_months(self, rotate):
+        """Partitions of earlier months are reindexed, not merged into."""
+        SphinxCounter.objects.create(counter_id=partitions.MAIN_COUNTER,
+                                     max_doc_id=0)
+        merge_delta()
+
+        indexes = rotate.call_args_list[1][0]
+        eq_(indexes[0], 'opinions_201006')
+        assert '--merge' not in indexes
+        eq_(counter(partitions.MAIN_COUNTER), self.max_id)
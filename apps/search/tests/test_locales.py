@@ -0,0 +1,17 @@
+from django.db import connection
+
+from nose.tools import eq_
+import test_utils
+
+from search.locales import indexed_locale_sql
+
+
+class LocaleTest(test_utils.TestCase):
+
+    def test_indexed_locale_sql(self):
+        """Long locales are kept if listed, else cut to their language."""
+        cursor = connection.cursor()
+        cursor.execute('SELECT %s, %s, %s' % tuple(
+            indexed_locale_sql(column) for column in
+            ("'de-AT'", "'en-US'", "IFNULL(NULL, '')")))
+        eq_(cursor.fetchone(), ('de', 'en-US', ''))
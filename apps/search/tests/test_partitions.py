@@ -0,0 +1,42 @@
+import datetime
+import time
+
+from nose.tools import eq_
+
+from search import partitions
+
+
+def timestamp(*date):
+    return int(time.mktime(datetime.date(*date).timetuple()))
+
+
+def test_add_months():
+    eq_(partitions.add_months((2010, 11), 1), (2010, 12))
+    eq_(partitions.add_months((2010, 12), 1), (2011, 1))
+    eq_(partitions.add_months((2011, 1), -13), (2009, 12))
+
+
+def test_month_bounds():
+    eq_(partitions.month_bounds((2010, 12)),
+        (datetime.date(2010, 12, 1), datetime.date(2011, 1, 1)))
+
+
+def test_indexes_for():
+    """Only the months in range are searched, plus a day on each side."""
+    today = datetime.date(2011, 3, 15)
+    eq_(partitions.indexes_for(timestamp(2010, 12, 5), timestamp(2011, 1, 1),
+                               today),
+        ['opinions_201012', 'opinions_201101', 'opinions_delta'])
+    eq_(partitions.indexes_for(timestamp(2011, 2, 10),
+                               timestamp(2011, 2, 11), today),
+        ['opinions_201102', 'opinions_delta'])
+
+
+def test_indexes_for_unbounded():
+    """Searches without dates go to all months, up to today's."""
+    today = datetime.date(2010, 3, 15)
+    eq_(partitions.indexes_for(0, timestamp(2010, 3, 16), today),
+        ['opinions_201001', 'opinions_201002', 'opinions_201003',
+         'opinions_delta'])
+    eq_(partitions.indexes_for(0, timestamp(2009, 1, 1), today),
+        ['opinions'])
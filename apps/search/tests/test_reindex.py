@@ -0,0 +1,99 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+
+from mock import Mock, patch
+from nose.tools import eq_
+import test_utils
+
+from search.reindex import (BUILDING_KEY, id_ranges, opinions,
+                            read_checkpoint, reindex, swap_alias,
+                            write_checkpoint, write_indexes)
+
+
+class IdRangesTest(test_utils.TestCase):
+    fixtures = ('feedback/opinions',)
+
+    def test_id_ranges(self):
+        """Ranges cover all opinions, ``step`` at a time."""
+        ids = list(opinions().order_by('id').values_list('id', flat=True))
+        ranges = list(id_ranges(0, 7))
+        eq_(ranges[0], (0, ids[6]))
+        eq_(ranges[-1][1], ids[-1])
+        for after, upto in ranges[:-1]:
+            eq_(len([i for i in ids if after < i <= upto]), 7)
+
+        eq_(list(id_ranges(ids[-1], 7)), [])
+
+
+def test_checkpoint():
+    path = os.path.join(tempfile.mkdtemp(), 'sub', 'reindex.json')
+    eq_(read_checkpoint(path), None)
+    write_checkpoint(path, {'last_id': 5})
+    eq_(read_checkpoint(path), {'last_id': 5})
+
+
+def test_swap_alias():
+    es = Mock()
+    es._send_request.return_value = {'input-1': {'aliases': {'input': {}}},
+                                     'other': {'aliases': {}}}
+    eq_(swap_alias(es, 'input', 'input-2'), ['input-1'])
+    body = json.loads(es._send_request.call_args[0][2])
+    eq_(body['actions'], [{'remove': {'index': 'input-1', 'alias': 'input'}},
+                          {'add': {'index': 'input-2', 'alias': 'input'}}])
+    eq_(es.delete_index.call_args_list, [(('input-1',), {})])
+
+
+def test_swap_concrete_index():
+    """A concrete index with the alias' name is deleted before the swap."""
+    es = Mock()
+    es._send_request.return_value = {'input': {'aliases': {}},
+                                     'input-2': {'aliases': {}}}
+    eq_(swap_alias(es, 'input', 'input-2'), [])
+    eq_(es.delete_index.call_args_list, [(('input',), {})])
+    body = json.loads(es._send_request.call_args[0][2])
+    eq_(body['actions'], [{'add': {'index': 'input-2', 'alias': 'input'}}])
+
+
+def test_write_indexes():
+    """Changes go to an index being built, too."""
+    eq_(write_indexes(), [settings.ES_INDEX])
+    cache.set(BUILDING_KEY, 'input-2')
+    try:
+        eq_(write_indexes(), [settings.ES_INDEX, 'input-2'])
+    finally:
+        cache.delete(BUILDING_KEY)
+
+
+@patch('search.reindex.swap_alias')
+@patch('search.reindex.id_ranges')
+@patch('search.reindex.multiprocessing.Pool')
+@patch('search.reindex.get_es')
+def test_restart_new_index(get_es, Pool, id_ranges, swap_alias):
+    """A restart creates a new index and deletes the abandoned one."""
+    Pool.return_value.imap.return_value = []
+    id_ranges.return_value = []
+    swap_alias.return_value = []
+    es = get_es.return_value
+    path = os.path.join(tempfile.mkdtemp(), 'reindex.json')
+    write_checkpoint(path, {'index': 'input-old', 'new_index': True,
+                            'last_id': 5, 'failed': []})
+
+    reindex(path, new_index=True, restart=True)
+    es.delete_index.assert_called_with('input-old')
+    eq_(es.create_index.call_count, 1)
+    index = es.create_index.call_args[0][0]
+    assert index.startswith(settings.ES_INDEX + '-')
+    eq_(swap_alias.call_args[0][1:], (settings.ES_INDEX, index))
+    eq_(cache.get(BUILDING_KEY), None)
+    assert not os.path.exists(path)
+
+    # Resuming writes into the index the checkpoint names.
+    write_checkpoint(path, {'index': 'input-old', 'new_index': True,
+                            'last_id': 5, 'failed': []})
+    reindex(path)
+    eq_(es.create_index.call_count, 1)
+    eq_(swap_alias.call_args[0][1:], (settings.ES_INDEX, 'input-old'))
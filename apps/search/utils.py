@@ -1,6 +1,9 @@
 # TODO(davedash): liberate from zamboni
 
+import fcntl
+import os
 import subprocess
+from contextlib import contextmanager
 
 from django.conf import settings
 
@@ -37,3 +40,31 @@ def stop_sphinx():
 
     call([settings.SPHINX_SEARCHD, '--stop', '--config',
           settings.SPHINX_CONFIG_PATH])[0]
+
+
+def rotate_indexes(*args):
+    """
+    Runs the indexer with ``args`` (index names, or e.g. ``--merge dst src``)
+    and has searchd pick up the new indexes.
+    """
+    return call([settings.SPHINX_INDEXER, '--config',
+                 settings.SPHINX_CONFIG_PATH, '--rotate'] + list(args))[0]
+
+
+@contextmanager
+def indexer_lock(blocking=True):
+    """
+    Holds a lock file so only one process runs the indexer at a time. Yields
+    whether the lock was acquired, which without ``blocking`` it may not be.
+    """
+    f = open(os.path.join(settings.SPHINX_CATALOG_PATH, 'indexer.lock'), 'w')
+    try:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(f, flags)
+        except IOError:
+            yield False
+        else:
+            yield True
+    finally:
+        f.close()
@@ -149,10 +149,10 @@ class SearchFeed(Feed):
 def get_defaults(form):
     """
     Keep form data as default options for further searches, but remove page
-    from defaults so that every parameter change returns to page 1.
+    and cursor from defaults so that every parameter change returns to page 1.
     """
     return dict((k, v) for k, v in form.data.items()
-                if k != 'page' and k in form.fields)
+                if k not in ('page', 'before') and k in form.fields)
 
 
 def get_period(form):
@@ -218,6 +218,8 @@ def index(request):
             data['page'] = pager.page(pager.num_pages)
 
         data['opinions'] = data['page'].object_list
+        if getattr(results, 'cursor', None):
+            data['next_cursor'] = '%d-%d' % results.cursor
         data['sent'] = get_sentiment(metas.get('type', {}))
         data['demo'] = dict(locale=metas.get('locale'),
                             platform=metas.get('platform'),
@@ -1,17 +1,25 @@
 import datetime
 import logging
+import math
+import multiprocessing
+import time
+from collections import namedtuple
 
 from django.conf import settings
-from django.db import transaction
+from django.db import connection, transaction
 
 import cronjobs
 from textcluster import Corpus, search
+from textcluster.cluster import Document, MIN_DOCUMENT_LENGTH
 
 import input
 from feedback.models import Opinion
 from input import (PLATFORM_USAGE, PRODUCT_USAGE, LATEST_BETAS, LATEST_RELEASE,
                    OPINION_PRAISE, OPINION_ISSUE, OPINION_IDEA)
-from themes.models import Theme, Item
+from input.utils import bulk_insert, flag
+from themes.dedupe import collapse
+from themes.models import (CurrentGeneration, Generation, Item, Partition,
+                           Theme)
 
 SIM_THRESHOLD = settings.CLUSTER_SIM_THRESHOLD
 NEW_WORDS = ['new', 'nice', 'love', 'like', 'great', ':)', '(:']
@@ -20,87 +28,475 @@ STOPWORDS.update(dict((w, 1,) for w in NEW_WORDS))
 
 log = logging.getLogger('reporter')
 
+# A cluster: the primary opinion (id) and a list of {'object': opinion id,
+# 'similarity': score} dicts, as textcluster returns them.
+Group = namedtuple('Group', 'primary similars')
+
+# Clustering results of a partition: its dimensions, Groups, and its size
+# and opinions added or aged out since it was last clustered from scratch.
+Result = namedtuple('Result', 'dimensions groups size changed')
+
 
 @cronjobs.register
-@transaction.commit_on_success
-def cluster():
-    log.debug('Removing old clusters')
-    Theme.objects.all().delete()
+def cluster(full=False):
+    """
+    Update the themes of the opinions of the last week, as a new generation.
+
+    Unless ``full`` (e.g. ``./manage.py cron cluster 1``), partitions are
+    updated incrementally (see ``update_groups()``), and only clustered from
+    scratch once the opinions added or aged out since they last were exceed
+    CLUSTER_DRIFT of them.
+    """
+    full = flag(full)
     # Get all the happy/sad issues in the last week.
     week_ago = datetime.datetime.today() - datetime.timedelta(7)
 
     base_qs = Opinion.objects.filter(locale='en-US', created__gte=week_ago)
     log.debug('Beginning clustering')
-    cluster_by_product(base_qs)
+    partitions = partition(base_qs)
+    last_id = max([id for dimensions, docs in partitions
+                   for id, description in docs] or [0])
+    generation, previous_id, previous = current_themes()
+    if full or previous_id is None:
+        previous = {}
+    else:
+        last_id = max(last_id, previous_id)
 
+    results, to_cluster = [], []
+    for dimensions, docs in partitions:
+        key = partition_key(dimensions)
+        if key not in previous:
+            to_cluster.append((dimensions, docs))
+            continue
+        groups, size, changed = previous[key]
+        added = len([id for id, description in docs if id > previous_id])
+        changed += added + max(size + added - len(docs), 0)
+        if changed > settings.CLUSTER_DRIFT * len(docs):
+            log.info('Reclustering %s: %d of %d opinions changed.' % (
+                dimensions, changed, len(docs)))
+            to_cluster.append((dimensions, docs))
+            continue
+        results.append(Result(dimensions,
+                              update_groups(groups, docs, previous_id),
+                              len(docs), changed))
 
-def cluster_by_product(qs):
-    for prod in PRODUCT_USAGE:
-        version = prod.default_version
-        log.debug('Clustering %s %s' % (unicode(prod.pretty), version))
-        qs_product = qs.filter(product=prod.id, version=version)
-        cluster_by_feeling(qs_product, prod)
+    sizes = dict((partition_key(dimensions), len(docs))
+                 for dimensions, docs in to_cluster)
+    for dimensions, groups in cluster_partitions(to_cluster):
+        results.append(Result(dimensions, groups,
+                              sizes[partition_key(dimensions)], 0))
+    save_results(results, last_id, generation)
 
 
-def cluster_by_feeling(qs, prod):
-    """Cluster all products by feeling."""
-    for opinion_type in input.OPINION_USAGE:
-        type_qs = qs.filter(_type=opinion_type.id)
+def partition_key(dimensions):
+    return (dimensions['product'], dimensions['feeling'],
+            dimensions.get('platform', ''))
 
-        cluster_by_platform(type_qs, prod, opinion_type.short)
 
+def partition(qs):
+    """
+    Read the opinions of the default version of each product once, and
+    split them into partitions to cluster: per product and feeling, for all
+    platforms and per platform. Returns a list of (dimensions, documents),
+    where documents are (id, description) tuples.
+    """
+    versions = dict((p.id, p.default_version) for p in PRODUCT_USAGE)
+    feelings = dict((t.id, t.short) for t in input.OPINION_USAGE)
+    platforms = set(p.short for p in PLATFORM_USAGE)
 
-def cluster_by_platform(qs, prod, feeling):
+    partitions = {}
+    rows = (qs.no_cache().filter(product__in=versions.keys(),
+                                 _type__in=feelings.keys())
+            .values_list('id', 'description', 'product', 'version', '_type',
+                         'platform'))
+    for id, description, product, version, type, platform in rows:
+        if version != versions[product]:
+            continue
+        key = (product, feelings[type])
+        partitions.setdefault(key, []).append((id, description))
+        if platform in platforms:
+            partitions.setdefault(key + (platform,), []).append(
+                (id, description))
+
+    result = []
+    for key, docs in sorted(partitions.items()):
+        dimensions = dict(zip(('product', 'feeling', 'platform'), key))
+        result.append((dimensions, docs))
+    return result
+
+
+def _cluster_partition(args):
+    dimensions, docs = args
+    start = time.time()
+    groups = cluster_documents(docs)
+    return dimensions, groups, len(docs), time.time() - start
+
+
+def cluster_partitions(partitions, processes=None):
     """
-    Cluster all products/feelings by platform ('all' as well as separate
-    platforms).
+    Cluster partitions (as from ``partition()``) in a process pool, return a
+    list of (dimensions, groups). Daemonic processes, such as Celery
+    workers running ``themes.tasks.recluster``, can't have children: they
+    cluster one partition after the other.
     """
-    dimensions = dict(product=prod.id, feeling=feeling)
-    cluster_and_save(qs, dimensions)
+    processes = processes or settings.CLUSTER_PROCESSES
+    if (processes == 1 or len(partitions) < 2 or
+        multiprocessing.current_process().daemon):
+        clustered = map(_cluster_partition, partitions)
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            clustered = pool.map(_cluster_partition, partitions)
+        finally:
+            pool.close()
+            pool.join()
 
-    # Create corpora for each platform and inspect each
-    # opinion and put it in the right platform bucket.
-    for platform in PLATFORM_USAGE:
-        dimensions['platform'] = platform.short
-        cluster_and_save(qs.filter(platform=platform.short),
-                                  dimensions)
+    results = []
+    for dimensions, groups, size, seconds in clustered:
+        log.info('Clustered %d opinions of %s in %.2fs.' % (
+            size, dimensions, seconds))
+        results.append((dimensions, groups))
+    return results
 
 
-def cluster_and_save(qs, dimensions):
-    result = cluster_queryset(qs)
-    save_result(result, dimensions)
+def get_corpus():
+    """The Corpus class of the CLUSTER_BACKEND setting."""
+    if settings.CLUSTER_BACKEND == 'sparse':
+        from themes.similarity import Corpus as SparseCorpus
+        return SparseCorpus
+    return Corpus
 
 
-def cluster_queryset(qs):
+def cluster_documents(docs, idf=None):
+    """
+    Cluster (id, description) documents. Returns a list of Groups, whose
+    primary and similars' objects are opinion ids.
+
+    Duplicates are only clustered once, and added back to the groups their
+    representative ends up in. In partitions of at least
+    CLUSTER_DUPLICATE_MIN_DOCUMENTS, near-duplicates count as duplicates
+    too (see themes.dedupe); smaller ones are cheap to cluster as they are.
+
+    Both backends weigh every term by ``log(number of documents)``. With
+    ``idf``, ``docs`` are clustered and scored as if that was their idf,
+    e.g. the idf of the partition they are part of.
+    """
+    # filter short descriptions
+    docs = [(id, description) for id, description in docs
+            if len(description) >= 15]
+    if len(docs) >= settings.CLUSTER_DUPLICATE_MIN_DOCUMENTS:
+        representatives, duplicates = collapse(
+            docs, settings.CLUSTER_DUPLICATE_SIMILARITY)
+    else:
+        representatives, duplicates = distinct(docs)
+
+    c = get_corpus()(similarity=SIM_THRESHOLD, stopwords=STOPWORDS)
+    for id, description in representatives:
+        c.add(id, str=description, key=id)
+
+    scale = 1
+    if idf is not None:
+        if len(c.docs) < 2:
+            return []
+        # Similarities are products of two weights, so they scale with the
+        # square of the idf.
+        scale = (idf / math.log(len(c.docs))) ** 2
+        c.similarity = SIM_THRESHOLD / scale
+    groups = c.cluster() or []
+    if scale != 1:
+        for group in groups:
+            for s in group.similars:
+                s['similarity'] *= scale
+    return expand(groups, duplicates)
+
+
+def distinct(docs):
+    """
+    Collapse (id, description) documents with the same description, like
+    ``themes.dedupe.collapse()`` does near-duplicates.
+    """
+    representatives, duplicates = [], {}
     seen = {}
-    c = Corpus(similarity=SIM_THRESHOLD, stopwords=STOPWORDS)
+    for id, description in docs:
+        if description in seen:
+            duplicates[seen[description]].append(id)
+            continue
+        seen[description] = id
+        duplicates[id] = []
+        representatives.append((id, description))
+    return representatives, duplicates
+
+
+def expand(groups, duplicates):
+    """
+    Add the duplicates of their primaries and similars to groups (of
+    representatives): duplicates of a similar score as that similar, those of
+    the primary as the most similar one. Duplicates of representatives in no
+    group stay out of all. Returns a list of Groups, largest first.
+    """
+    result = []
+    for group in groups:
+        best = max(s['similarity'] for s in group.similars)
+        similars = [{'object': id, 'similarity': best}
+                    for id in duplicates[group.primary]]
+        for s in group.similars:
+            similars.append(s)
+            similars.extend({'object': id, 'similarity': s['similarity']}
+                            for id in duplicates[s['object']])
+        similars.sort(key=lambda s: s['similarity'])
+        result.append(Group(group.primary, similars))
+
+    result.sort(key=lambda group: len(group.similars), reverse=True)
+    return result
+
+
+def cluster_queryset(qs):
+    return cluster_documents(qs.values_list('id', 'description'))
+
+
+def weights(text, idf):
+    """A document's TF-IDF weights, as textcluster computes them."""
+    document = Document(None, text, str=text, stopwords=STOPWORDS)
+    if len(document.tf) < MIN_DOCUMENT_LENGTH:
+        return None
+    return dict((term, tf * idf) for term, tf in document.tf.iteritems())
+
 
-    for op in qs:
+def centroid(vectors):
+    total = {}
+    for vector in vectors:
+        for term, weight in vector.iteritems():
+            total[term] = total.get(term, 0) + weight
+    return dict((term, weight / len(vectors))
+                for term, weight in total.iteritems())
 
-        if op.description in seen:
+
+def dot(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(term, 0) for term, weight in a.iteritems())
+
+
+def most_similar(vector, centroids):
+    """
+    The index of the centroid ``vector`` is most similar to, and that
+    similarity, or None if it is below SIM_THRESHOLD.
+    """
+    if not centroids:
+        return None
+    scores = [dot(vector, c) for c in centroids]
+    best = max(xrange(len(scores)), key=scores.__getitem__)
+    if scores[best] < SIM_THRESHOLD:
+        return None
+    return best, scores[best]
+
+
+def update_groups(groups, docs, last_id):
+    """
+    Carry a partition's Groups over to its current (id, description)
+    documents. Opinions no longer among them (aged out of the window) are
+    dropped from the groups; if the primary is, its most similar opinion
+    takes over.
+
+    If there are opinions newer than ``last_id``, all opinions in no group,
+    old and new, are clustered among themselves, with the idf of the whole
+    partition, so opinions can add up to new groups over several runs. A
+    group found that way is merged into the group whose centroid is most
+    similar to its own, if at least SIM_THRESHOLD, or added as it is. New
+    opinions still in no group then join the group whose centroid they are
+    most similar to, if at least SIM_THRESHOLD: that is their average
+    similarity to its opinions. Returns a list of Groups, largest first.
+    """
+    descriptions = dict(docs)
+    idf = math.log(len(docs) or 1)
+
+    result, centroids = [], []
+    for group in groups:
+        primary = group.primary
+        similars = [s for s in group.similars if s['object'] in descriptions]
+        if primary not in descriptions and similars:
+            primary = max(similars, key=lambda s: s['similarity'])['object']
+            similars = [s for s in similars if s['object'] != primary]
+        if not similars:
             continue
+        vectors = [weights(descriptions[id], idf) for id in
+                   [primary] + [s['object'] for s in similars]]
+        vectors = [v for v in vectors if v]
+        if not vectors:
+            continue
+        result.append(Group(primary, similars))
+        centroids.append(centroid(vectors))
+
+    grouped = set()
+    for group in result:
+        grouped.add(group.primary)
+        grouped.update(s['object'] for s in group.similars)
+    ungrouped = [(id, description) for id, description in docs
+                 if id not in grouped]
+    if [id for id, description in ungrouped if id > last_id]:
+        new_groups = cluster_documents(ungrouped, idf)
+    else:
+        new_groups = []
 
-        # filter short descriptions
-        if len(op.description) < 15:
+    for group in new_groups:
+        members = [group.primary] + [s['object'] for s in group.similars]
+        grouped.update(members)
+        vectors = [(id, weights(descriptions[id], idf)) for id in members]
+        vectors = [(id, v) for id, v in vectors if v]
+        match = vectors and most_similar(centroid([v for id, v in vectors]),
+                                         centroids)
+        if not match:
+            result.append(group)
+            centroids.append(centroid([v for id, v in vectors]) if vectors
+                             else {})
             continue
+        best = centroids[match[0]]
+        result[match[0]].similars.extend(
+            {'object': id, 'similarity': dot(v, best)} for id, v in vectors)
+
+    for id, description in docs:
+        if id <= last_id or id in grouped or len(description) < 15:
+            continue
+        vector = weights(description, idf)
+        match = vector and most_similar(vector, centroids)
+        if match:
+            result[match[0]].similars.append({'object': id,
+                                              'similarity': match[1]})
+
+    for group in result:
+        group.similars.sort(key=lambda s: s['similarity'])
+    result.sort(key=lambda group: len(group.similars), reverse=True)
+    return result
 
-        seen[op.description] = 1
-        c.add(op, str=op.description, key=op.id)
 
-    return c.cluster()
+def current_themes():
+    """
+    The current generation, the last opinion id it clustered, and its
+    themes per partition: ``{partition key: (Groups, size, changed)}``. The
+    last opinion id is None for themes from before generations were kept.
+    """
+    generation = CurrentGeneration.get()
+    try:
+        last_id = Generation.objects.get(id=generation).last_opinion_id
+    except Generation.DoesNotExist:
+        return generation, None, {}
 
+    partitions = {}
+    for p in Partition.objects.filter(generation=generation):
+        partitions[(p.product, p.feeling, p.platform)] = ([], p.size,
+                                                           p.changed)
 
-def save_result(result, dimensions):
-    if result:
-        for group in result:
-            if (group.similars) < 5:
-                continue
+    similars = {}
+    items = (Item.objects.no_cache().filter(theme__generation=generation)
+             .values_list('theme', 'opinion', 'score'))
+    for theme, opinion, score in items:
+        similars.setdefault(theme, []).append({'object': opinion,
+                                               'similarity': score})
+    themes = (Theme.objects.no_cache().filter(generation=generation)
+              .values_list('id', 'pivot', 'product', 'feeling', 'platform'))
+    for id, pivot, product, feeling, platform in themes:
+        key = (product, feeling, platform)
+        if key in partitions:
+            partitions[key][0].append(Group(pivot, similars.get(id, [])))
+    return generation, last_id, partitions
 
-            topic = Theme(**dimensions)
-            topic.num_opinions = len(group.similars) + 1
-            topic.pivot = group.primary
-            topic.save()
 
-            for s in group.similars:
-                Item(theme=topic, opinion=s['object'],
-                     score=s['similarity']).save()
+def save_results(results, last_opinion_id=0, based_on=None):
+    """
+    Write Results as a new generation of themes and publish it (see
+    ``write_generation()``), then drop the themes of the generations it
+    added and deleted from the cache, all at once.
+    """
+    start = time.time()
+    themes, items, stale = write_generation(results, last_opinion_id,
+                                            based_on)
+    if themes or stale:
+        Theme.objects.invalidate(*(themes + stale))
+    log.info('Wrote %d themes and %d items, deleted %d themes in %.2fs.' % (
+        len(themes), items, len(stale), time.time() - start))
+
+
+@transaction.commit_on_success
+def write_generation(results, last_opinion_id=0, based_on=None):
+    """
+    Write Results as a new generation of themes and publish it, in one
+    transaction, unless another generation was published since
+    ``based_on``, the current one when clustering started. Generations
+    older than the one replaced are deleted.
+
+    Returns the themes written, the number of items written, and the themes
+    deleted (only their ids and pivots are set).
+    """
+    if based_on is None:
+        based_on = CurrentGeneration.get()
+    generation = Generation.objects.create(last_opinion_id=last_opinion_id)
+    themes, items, partitions = [], 0, []
+    for result in results:
+        written, count = save_result(result.groups, result.dimensions,
+                                     generation.id)
+        themes.extend(written)
+        items += count
+        partitions.append(Partition(
+            generation=generation.id, size=result.size,
+            changed=result.changed,
+            **dict(zip(('product', 'feeling', 'platform'),
+                       partition_key(result.dimensions)))))
+    bulk_insert(Partition, partitions)
+
+    if not CurrentGeneration.swap(based_on, generation.id):
+        log.warning('Generation %d dropped: another one was published.' %
+                    generation.id)
+        return [], 0, delete_generations('=', generation.id)
+    log.debug('Removing old clusters')
+    return themes, items, delete_generations('<', based_on)
+
+
+def delete_generations(op, generation):
+    """
+    Delete the themes of generations ``op`` (= or <) ``generation``. Returns
+    the themes deleted, with only their ids and pivots set.
+    """
+    lookup = {'=': 'generation', '<': 'generation__lt'}[op]
+    deleted = (Theme.objects.no_cache().filter(**{lookup: generation})
+               .values_list('id', 'pivot'))
+    themes = [Theme(id=id, pivot_id=pivot) for id, pivot in deleted]
+    cursor = connection.cursor()
+    cursor.execute('DELETE FROM theme_item WHERE theme_id IN '
+                   '(SELECT id FROM theme WHERE generation %s %%s)' % op,
+                   [generation])
+    cursor.execute('DELETE FROM theme WHERE generation %s %%s' % op,
+                   [generation])
+    cursor.execute('DELETE FROM theme_partition WHERE generation %s %%s' % op,
+                   [generation])
+    cursor.execute('DELETE FROM theme_generation WHERE id %s %%s' % op,
+                   [generation])
+    return themes
+
+
+def save_result(result, dimensions, generation=0):
+    """
+    Write Groups as themes of ``generation``, with multi-row INSERTs of
+    themes and of their items. Saving them one by one would also invalidate
+    the cache every time: callers invalidate the themes returned, once.
+
+    Returns the themes and the number of items written.
+    """
+    themes, groups = [], []
+    for group in result or []:
+        if (group.similars) < 5:
+            continue
+
+        topic = Theme(generation=generation, **dimensions)
+        topic.num_opinions = len(group.similars) + 1
+        topic.pivot_id = getattr(group.primary, 'id', group.primary)
+        themes.append(topic)
+        groups.append(group)
+    bulk_insert(Theme, themes, batch_size=settings.CLUSTER_BATCH_SIZE)
+
+    items = [Item(theme_id=topic.id,
+                  opinion_id=getattr(s['object'], 'id', s['object']),
+                  score=s['similarity'])
+             for topic, group in zip(themes, groups)
+             for s in group.similars]
+    bulk_insert(Item, items, batch_size=settings.CLUSTER_BATCH_SIZE)
+    return themes, len(items)
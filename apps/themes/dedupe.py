@@ -0,0 +1,129 @@
+"""
+Near-duplicate collapsing for theme clustering.
+
+Feedback holds many comments that are the same but for a word or a typo.
+``collapse()`` compares the sets of character shingles of documents, but
+finds which to compare with MinHash signatures and locality sensitive
+hashing: each document is only compared to the few representatives it
+shares a band of its signature with. It keeps one representative per set of
+near-duplicates. Only representatives are clustered; their duplicates are
+added back to the groups afterwards.
+"""
+import random
+import zlib
+
+import numpy
+
+
+# Characters of the shingles documents are compared by.
+SHINGLE_SIZE = 5
+# MinHash signatures are split into BANDS bands of ROWS hashes, and only
+# documents sharing a band are compared. With 32 bands of 4 rows, documents
+# 80% similar are all but certainly compared, documents 20% similar rarely.
+BANDS, ROWS = 32, 4
+
+# Hash functions (a * x + b) >> 32, modulo 2 ** 64 (multiply-shift hashing),
+# and the coefficients bands are hashed into keys with: the same in every
+# process and version of NumPy.
+_random = random.Random(1)
+
+
+def _coefficients(count):
+    return numpy.array([_random.getrandbits(64) for i in xrange(count)],
+                       dtype=numpy.uint64)
+
+_A = _coefficients(BANDS * ROWS) | 1
+_B = _coefficients(BANDS * ROWS)
+_BAND_KEYS = _coefficients(ROWS)
+
+# Documents whose signatures are computed at once.
+CHUNK_SIZE = 500
+
+STRIP = """\\.!?,(){}[]"'"""
+
+
+def normalize(text):
+    return u' '.join(w.strip(STRIP) for w in text.lower().split())
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """The set of ``size`` byte substrings of normalized, encoded ``text``."""
+    text = text.encode('utf-8')
+    if len(text) <= size:
+        return set([text])
+    return set(text[i:i + size] for i in xrange(len(text) - size + 1))
+
+
+def band_keys(shingle_sets):
+    """
+    The keys of the bands of the MinHash signatures of sets of shingles,
+    one list of BANDS keys per set.
+    """
+    keys = []
+    for start in xrange(0, len(shingle_sets), CHUNK_SIZE):
+        hashes, offsets = [], []
+        for shingles in shingle_sets[start:start + CHUNK_SIZE]:
+            offsets.append(len(hashes))
+            hashes.extend(zlib.crc32(s) & 0xffffffff for s in shingles)
+        hashes = numpy.array(hashes, dtype=numpy.uint64)
+        minhashes = (_A[:, None] * hashes[None, :] + _B[:, None]) >> 32
+        signatures = numpy.minimum.reduceat(minhashes, offsets, axis=1).T
+        # Arithmetic modulo 2 ** 64: distinct bands rarely get the same key,
+        # and if they do, documents are only compared needlessly.
+        keys.extend((signatures.reshape(len(offsets), BANDS, ROWS) *
+                     _BAND_KEYS).sum(axis=2).tolist())
+    return keys
+
+
+def jaccard(a, b):
+    return len(a & b) / float(len(a | b))
+
+
+def collapse(docs, similarity=0.8):
+    """
+    Collapse near-duplicate (id, text) documents: documents whose shingles'
+    Jaccard similarity to those of an earlier representative is at least
+    ``similarity`` become its duplicates.
+
+    Returns the representatives' (id, text) documents, in order, and a dict
+    of ``representative id: [duplicate ids]``.
+    """
+    normalized = [normalize(text) for id, text in docs]
+    unique = {}  # normalized text -> its index in texts
+    for text in normalized:
+        unique.setdefault(text, len(unique))
+    texts = sorted(unique, key=unique.get)
+    shingle_sets = map(shingles, texts)
+    keys = band_keys(shingle_sets)
+
+    representatives, duplicates = [], {}
+    exact = {}  # normalized text -> representative id
+    rep_shingles = {}  # representative id -> its shingles
+    buckets = {}  # (band, key) -> [representative ids]
+    for (id, text), norm in zip(docs, normalized):
+        if norm in exact:
+            duplicates[exact[norm]].append(id)
+            continue
+
+        index = unique[norm]
+        bands = list(enumerate(keys[index]))
+        best, best_similarity = None, similarity
+        candidates = set()
+        for key in bands:
+            candidates.update(buckets.get(key, ()))
+        for candidate in sorted(candidates):
+            score = jaccard(rep_shingles[candidate], shingle_sets[index])
+            if score >= best_similarity:
+                best, best_similarity = candidate, score
+        if best is not None:
+            duplicates[best].append(id)
+            exact[norm] = best
+            continue
+
+        representatives.append((id, text))
+        duplicates[id] = []
+        exact[norm] = id
+        rep_shingles[id] = shingle_sets[index]
+        for key in bands:
+            buckets.setdefault(key, []).append(id)
+    return representatives, duplicates
@@ -1,10 +1,19 @@
 from django.db import models
 
+import caching.base
+
 from feedback.models import Opinion
 from input.models import ModelBase
 from input.urlresolvers import reverse
 
 
+class ThemeManager(caching.base.CachingManager):
+
+    def current(self):
+        """Themes of the published generation."""
+        return self.filter(generation=CurrentGeneration.get())
+
+
 class Theme(ModelBase):
     pivot = models.ForeignKey(Opinion, related_name='group')
     opinions = models.ManyToManyField(Opinion, through='Item')
@@ -15,6 +24,10 @@ class Theme(ModelBase):
     channel = models.CharField(max_length=20)  # beta, release
     platform = models.CharField(max_length=255, db_index=True)
     created = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Themes are written a generation at a time, see CurrentGeneration.
+    generation = models.PositiveIntegerField(default=0, db_index=True)
+
+    objects = ThemeManager()
 
     def __unicode__(self):
         return '%d related opinions to "%s"' % (self.num_opinions,
@@ -37,3 +50,54 @@ class Item(ModelBase):
     class Meta:
         db_table = 'theme_item'
         ordering = ('-score', )
+
+
+class Generation(models.Model):
+    """A set of themes, written by one run of themes.cron.cluster."""
+    # Highest opinion id clustered.
+    last_opinion_id = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'theme_generation'
+
+
+class Partition(models.Model):
+    """
+    State of a partition (product, feeling and platform) of a generation of
+    themes, to tell when incremental updates have drifted too far.
+    """
+    generation = models.PositiveIntegerField(db_index=True)
+    product = models.PositiveSmallIntegerField()
+    feeling = models.CharField(max_length=20)
+    platform = models.CharField(max_length=255)
+    # Opinions in the partition, and opinions added or aged out since it
+    # was last clustered from scratch.
+    size = models.PositiveIntegerField()
+    changed = models.PositiveIntegerField()
+
+    class Meta:
+        db_table = 'theme_partition'
+
+
+class CurrentGeneration(models.Model):
+    """
+    The one row pointing to the generation of themes shown. A new generation
+    is written alongside it and published by updating this row.
+    """
+    generation = models.PositiveIntegerField()
+
+    class Meta:
+        db_table = 'theme_current'
+
+    @classmethod
+    def get(cls):
+        current, created = cls.objects.get_or_create(
+            pk=1, defaults={'generation': 0})
+        return current.generation
+
+    @classmethod
+    def swap(cls, old, new):
+        """Publish generation ``new`` if ``old`` is still the current one."""
+        return bool(cls.objects.filter(pk=1, generation=old)
+                    .update(generation=new))
@@ -0,0 +1,155 @@
+"""
+Sparse TF-IDF clustering backend for themes.
+
+``Corpus`` is a drop-in replacement for ``textcluster.Corpus``: documents are
+tokenized, weighted and grouped the same way, with the same similarity
+threshold and result structure, but similarities are computed as sparse
+matrix products, a block of documents at a time, instead of in pure Python
+loops over pairs of documents.
+
+Needs NumPy and SciPy (see requirements/compiled.txt).
+"""
+import math
+
+import numpy
+from scipy import sparse
+from stemming.porter2 import stem
+from textcluster.cluster import MIN_DOCUMENT_LENGTH
+from textcluster.search import STOPWORDS
+
+
+# Characters stripped from words, as textcluster does.
+STRIP = """\\.!?,(){}[]"'"""
+
+# Documents whose similarities to all others are computed at once.
+BLOCK_SIZE = 1000
+
+
+class Group(object):
+    """A cluster: the primary object and a list of similars."""
+
+    def __init__(self, primary):
+        self.primary = primary
+        # {'object': ..., 'similarity': ...} dicts, least similar first.
+        self.similars = []
+
+
+class Corpus(object):
+    """
+    Clusters documents by TF-IDF similarity.
+
+    Like ``textcluster.Corpus``, a document's weight for a term is its term
+    frequency times the term's idf, the similarity of two documents is the
+    dot product of their weights, and documents are grouped greedily: each
+    document not grouped yet collects all other ungrouped documents at least
+    ``similarity`` similar to it. textcluster never counts document
+    frequencies (``Corpus.words`` stays empty), so every term's idf is
+    ``log(number of documents)``; so is it here, so thresholds mean the same
+    for both.
+    """
+
+    def __init__(self, similarity=0.1, stopwords=STOPWORDS,
+                 block_size=BLOCK_SIZE):
+        self.similarity = similarity
+        self.stopwords = stopwords
+        self.block_size = block_size
+        self.docs = {}  # key -> (object, {term: frequency})
+        self._stems = {}
+
+    def tokenize(self, text):
+        tokens = []
+        for word in text.lower().split():
+            word = word.strip(STRIP)
+            if self.stopwords.get(word) is not None:
+                continue
+            token = self._stems.get(word)
+            if token is None:
+                token = self._stems[word] = stem(word)
+            tokens.append(token)
+        return tokens
+
+    def add(self, document, key=None, str=None):
+        """Adds a document to the corpus."""
+        if not key:
+            key = getattr(document, 'id', document)
+        if not str:
+            str = unicode(document)
+
+        tokens = self.tokenize(str)
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        if len(counts) < MIN_DOCUMENT_LENGTH:
+            return
+        length = float(len(tokens))
+        self.docs[key] = (document, dict((token, count / length)
+                                         for token, count in counts.items()))
+
+    def matrix(self, keys):
+        """The sparse (documents x terms) weight matrix."""
+        idf = math.log(len(keys))
+        terms = {}
+        rows, cols, weights = [], [], []
+        for row, key in enumerate(keys):
+            for term, tf in self.docs[key][1].items():
+                rows.append(row)
+                cols.append(terms.setdefault(term, len(terms)))
+                weights.append(tf * idf)
+        return sparse.csr_matrix((weights, (rows, cols)),
+                                 shape=(len(keys), len(terms)))
+
+    def cluster(self):
+        # Same order as textcluster goes through its documents.
+        keys = list(self.docs)
+        if not keys:
+            return []
+        weights = self.matrix(keys)
+
+        grouped = numpy.zeros(len(keys), dtype=bool)
+        # Documents are only compared to ``columns``, a superset of the
+        # ungrouped ones, narrowed down as groups take documents away.
+        columns = numpy.arange(len(keys))
+        transposed = weights.T.tocsr()
+        scores = []
+        start = 0
+        # Start small: the first documents may well group most others.
+        size = 16
+        while True:
+            pending = numpy.flatnonzero(~grouped[start:]) + start
+            if not len(pending):
+                break
+            if len(pending) * 2 < len(columns):
+                columns = pending
+                transposed = weights[columns].T.tocsr()
+            rows = pending[:size]
+            start = rows[-1] + 1
+            size = min(size * 2, self.block_size)
+
+            block = (weights[rows] * transposed).tocsr()
+            # Only similarities above the threshold matter.
+            block.data[block.data < self.similarity] = 0
+            block.eliminate_zeros()
+            indptr = block.indptr.tolist()
+            for row, doc in enumerate(rows.tolist()):
+                if grouped[doc]:
+                    continue
+                grouped[doc] = True
+                lo, hi = indptr[row], indptr[row + 1]
+                if lo == hi:
+                    continue
+                others = columns[block.indices[lo:hi]]
+                similar = ~grouped[others]
+                if similar.any():
+                    grouped[others[similar]] = True
+                    scores.append((doc, zip(others[similar],
+                                            block.data[lo:hi][similar])))
+
+        scores.sort(key=lambda s: len(s[1]), reverse=True)
+        groups = []
+        for doc, similars in scores:
+            group = Group(self.docs[keys[doc]][0])
+            for other, sim in sorted(similars, key=lambda s: s[1]):
+                group.similars.append({'object': self.docs[keys[other]][0],
+                                       'similarity': float(sim)})
+            groups.append(group)
+        return groups
@@ -1,13 +1,14 @@
 from django.conf import settings
 
 import test_utils
+from mock import patch
 from nose.tools import eq_
 from pyquery import PyQuery as pq
 
 from feedback.models import Opinion
 from input import LATEST_BETAS, FIREFOX
 from input.urlresolvers import reverse
-from themes.models import Theme
+from themes.models import CurrentGeneration, Item, Partition, Theme
 
 
 class TestViews(test_utils.TestCase):
@@ -49,6 +50,93 @@ class TestViews(test_utils.TestCase):
         eq_(Theme.objects.count(), 6)
         eq_(Theme.objects.filter(platform='').count(), 3)
 
+    def test_duplicates(self):
+        """Duplicates are clustered once, then added back to their group."""
+        from themes.cron import cluster_documents
+        theme = Theme.objects.filter(platform='')[0]
+        docs = list(Opinion.objects.values_list('id', 'description'))
+        duplicate = max(id for id, description in docs) + 1
+        docs.append((duplicate, theme.pivot.description))
+        group = [g for g in cluster_documents(docs)
+                 if g.primary == theme.pivot_id][0]
+        assert duplicate in [s['object'] for s in group.similars]
+
+    def test_incremental(self):
+        """New opinions join existing themes, in a new generation."""
+        from themes.cron import cluster
+        generation = CurrentGeneration.get()
+        o = Opinion(description='Despite all my rage, I am still just a rat '
+                    'in a cage cage cage', product=1,
+                    version=FIREFOX.default_version, platform='mac',
+                    locale='en-US')
+        o.save()
+        cluster()
+
+        assert CurrentGeneration.get() != generation
+        themes = Theme.objects.current()
+        # Two rat in a cage opinions no group had make a new theme, as they
+        # would with a full recluster.
+        eq_(themes.count(), 8)
+        eq_(Item.objects.filter(theme__in=themes, opinion=o).count(), 2)
+        eq_(themes.filter(platform='')[0].num_opinions, 9)
+        # The previous generation is kept until the next one is published.
+        eq_(Theme.objects.filter(generation=generation).count(), 6)
+
+    def test_incremental_new_theme(self):
+        """New opinions can make a new theme without a full recluster."""
+        from themes.cron import cluster
+        ids = []
+        for x in xrange(4):
+            o = Opinion(description='Flash video keeps crashing the browser '
+                        + x * 'plugin ', product=1,
+                        version=FIREFOX.default_version, platform='mac',
+                        locale='en-US')
+            o.save()
+            ids.append(o.id)
+        # Cron arguments are strings: '0' is not a full recluster.
+        cluster('0')
+
+        partitions = Partition.objects.filter(
+            generation=CurrentGeneration.get())
+        eq_([p.changed for p in partitions], [4, 4])
+        eq_(Theme.objects.current().filter(pivot__in=ids).count(), 2)
+
+    @patch('themes.cron.multiprocessing.Pool')
+    @patch('themes.cron.multiprocessing.current_process')
+    def test_recluster_task(self, current_process, Pool):
+        """The task clusters without a pool inside daemonic workers."""
+        from themes.tasks import recluster
+        current_process.return_value.daemon = True
+        # Without a previous generation, all partitions are clustered.
+        CurrentGeneration.objects.update(generation=0)
+        recluster()
+        assert not Pool.called
+        eq_(Theme.objects.current().count(), 6)
+
+    def test_save_result(self):
+        """Themes and their items are written in bulk, with ids assigned."""
+        from themes.cron import Group, save_result
+        ids = list(Opinion.objects.values_list('id', flat=True)[:7])
+        group = Group(ids[0], [{'object': id, 'similarity': 3.0}
+                               for id in ids[1:]])
+        themes, items = save_result([group], dict(product=1, feeling='praise'),
+                                    generation=99)
+        eq_(items, 6)
+        theme = Theme.objects.get(generation=99)
+        eq_(theme.id, themes[0].id)
+        eq_(theme.num_opinions, 7)
+        eq_(sorted(theme.items.values_list('opinion', flat=True)),
+            sorted(ids[1:]))
+
+    def test_partition(self):
+        """Opinions are split by feeling, for all and for each platform."""
+        from themes.cron import partition
+        parts = partition(Opinion.objects.all())
+        eq_([d for d, docs in parts],
+            [dict(product=1, feeling='praise'),
+             dict(product=1, feeling='praise', platform='mac')])
+        eq_([len(docs) for d, docs in parts], [27, 27])
+
     def test_index(self):
         r = self.client.get(reverse('themes'))
         eq_(r.status_code, 200)
@@ -72,3 +160,57 @@ class TestViews(test_utils.TestCase):
         id = Theme.objects.all()[0].id
         r = self.client.get(reverse('theme', kwargs={"theme_id": id + 99}))
         eq_(r.status_code, 404)
+
+
+class TestSimilarity(test_utils.TestCase):
+
+    def test_same_as_textcluster(self):
+        """The sparse backend finds the same groups as textcluster."""
+        from textcluster import Corpus
+        from themes.cron import STOPWORDS
+        from themes.similarity import Corpus as SparseCorpus
+
+        docs = ['Skip town. slow down push it to the ' + x * 'east coast '
+                for x in xrange(10)]
+        docs += ['Despite all my rage, I am still just a rat in a ' +
+                 x * 'cage ' for x in xrange(10)]
+        docs += ['It is hammer time ' + x * 'baby ' for x in xrange(4)]
+        docs += ['Firefox crashes on startup every time',
+                 'Flash videos crash the whole browser']
+
+        def groups(corpus):
+            for id, doc in enumerate(docs):
+                corpus.add(id, str=doc, key=id)
+            return sorted((g.primary,
+                           sorted((s['object'], round(s['similarity'], 6))
+                                  for s in g.similars))
+                          for g in corpus.cluster())
+
+        expected = groups(Corpus(similarity=2, stopwords=STOPWORDS))
+        eq_(groups(SparseCorpus(similarity=2, stopwords=STOPWORDS,
+                                block_size=4)), expected)
+        assert len(expected) > 1
+
+
+class TestDedupe(test_utils.TestCase):
+
+    def test_collapse(self):
+        from themes.dedupe import collapse
+        docs = [(1, 'Firefox crashes when I open a new tab'),
+                (2, 'firefox crashes when i open a new tab!'),
+                (3, 'Firefox crashes when I open a new tabs'),
+                (4, 'The bookmarks toolbar disappeared after the update')]
+        representatives, duplicates = collapse(docs, 0.8)
+        eq_(representatives, [docs[0], docs[3]])
+        eq_(duplicates, {1: [2, 3], 4: []})
+
+    def test_expand(self):
+        from themes.cron import expand, Group
+        groups = [Group(1, [{'object': 2, 'similarity': 3.0},
+                            {'object': 3, 'similarity': 4.0}])]
+        duplicates = {1: [4], 2: [5], 3: [], 6: [7], 8: []}
+        eq_(expand(groups, duplicates),
+            [Group(1, [{'object': 2, 'similarity': 3.0},
+                       {'object': 5, 'similarity': 3.0},
+                       {'object': 4, 'similarity': 4.0},
+                       {'object': 3, 'similarity': 4.0}])])
@@ -50,7 +50,8 @@ def _get_platforms(request, product, platform):
     f = Filter(urlparams(url, p=None), _('All'), _('All Platforms'),
                (not platform))
     platforms.append(f)
-    platforms_from_db = (Theme.objects.filter(product=PRODUCTS[product].id)
+    platforms_from_db = (Theme.objects.current()
+                         .filter(product=PRODUCTS[product].id)
                          .values_list('platform', flat=True)
                          .distinct().order_by('platform'))
 
@@ -81,7 +82,7 @@ def _get_products(request, product):
 def index(request):
     """List the themes clusters for beta releases."""
 
-    qs = Theme.objects.filter()
+    qs = Theme.objects.current()
     product = request.GET.get('a', FIREFOX.short)
     products = _get_products(request, product)
     try:
@@ -21,7 +21,9 @@ class Command(BaseCommand):
                     action='store',
                     dest='source',
                     default=None,
-                    help='Custom opinions.tsv (*.bz2 will be decompressed).'),
+                    help='Custom opinions.tsv (*.bz2/*.gz will be decompressed), '
+                         'export manifest (*.json: snapshot + deltas) or '
+                         'columnar export directory.'),
         make_option('--skip-load',
                     action='store_true',
                     dest='skip_load',
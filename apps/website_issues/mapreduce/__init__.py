@@ -1,5 +1,4 @@
 import os, os.path, sys, subprocess, pipes
-import bz2
 from shutil import rmtree
 from tempfile import mkdtemp
 
@@ -8,6 +7,9 @@ from dumbo.util import system
 from django.conf import settings
 from settings import path
 
+from api.columnar import read_schema
+from api.compress import format_for, read_chunks
+from api.cron import MANIFEST_NAME, SNAPSHOT_NAME, manifest_sources
 from website_issues.mapreduce.normalize_to_tsv import normalize_unix
 
 def _system(args, more_env={}):
@@ -23,6 +25,19 @@ def _system(args, more_env={}):
         raise Exception("System call '%s' failed!" % " ".join(args))
 
 
+# rows of a columnar export per line of mapper input
+COLUMNAR_SPLIT = 10000
+
+def _columnar_splits(source, outfile):
+    """Describe a columnar export as lines of (path, first row, end row) for
+       ColumnarSiteSummaryMapper, which reads the columns itself."""
+    source = os.path.abspath(source)
+    rows = read_schema(source)["rows"]
+    for start in xrange(0, rows, COLUMNAR_SPLIT):
+        end = min(start + COLUMNAR_SPLIT, rows)
+        outfile.write("%s\t%d\t%d\n" % (source, start, end))
+
+
 def generate_sites(source, skip_load=False, only_clean=False):
     dest_dir = mkdtemp()
     if only_clean:
@@ -32,18 +47,33 @@ def generate_sites(source, skip_load=False, only_clean=False):
     print "Using work/output directory: %s" % dest_dir
 
     if source is None:
-        source = os.path.join(settings.TSV_EXPORT_DIR, 'opinions.tsv.bz2')
+        manifest = os.path.join(settings.TSV_EXPORT_DIR, MANIFEST_NAME)
+        if os.path.exists(manifest):
+            source = manifest
+        else:
+            source = os.path.join(settings.TSV_EXPORT_DIR, SNAPSHOT_NAME)
     if not os.path.exists(source):
         raise Exception("Missing input file: %s" % source)
-    if source.endswith(".bz2"):
-        print "Decompressing %s" % source
-        # we need to decompress the file to disk for dumbo to work with it
-        infile = bz2.BZ2File(source)
-        outname = os.path.join(dest_dir,
-                               os.path.basename(source[:-len(".bz2")]))
+    columnar = os.path.isdir(source)
+    if columnar:
+        # the mappers read the columns they need straight from the export
+        outname = os.path.join(dest_dir, "opinions.splits")
+        print "Reading columns from %s" % source
+        with open(outname, "w+") as outfile:
+            _columnar_splits(source, outfile)
+        source = outname
+    elif source.endswith(".json"):
+        # snapshot plus delta segments, in order
+        sources = manifest_sources(source)
+    else:
+        sources = [source]
+    if not columnar and (len(sources) > 1 or format_for(sources[0]) != "tsv"):
+        # we need to decompress the file(s) to disk for dumbo to work with it
+        outname = os.path.join(dest_dir, "opinions.tsv")
         with open(outname, "w+") as outfile:
-            for line in infile: outfile.write(line)
-        infile.close()
+            for part in sources:
+                print "Decompressing %s" % part
+                for chunk in read_chunks(part): outfile.write(chunk)
         source = outname
 
     mapreduce_dir = path("apps/website_issues/mapreduce")
@@ -58,6 +88,7 @@ def generate_sites(source, skip_load=False, only_clean=False):
 
     q = lambda s: pipes.quote(s)
     python_env = {"PYTHONPATH": q(":".join(sys.path))}
+    if columnar: python_env["SITES_INPUT"] = "columns"
     _system(["dumbo start", q(dumbo_job_file),
              "-input", q(source), "-output", q(dest),
              "2>&1 | python", q(show_counters)],
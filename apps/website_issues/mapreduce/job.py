@@ -1,3 +1,5 @@
+import os
+
 import dumbo
 from dumbo.lib import identitymapper, identityreducer
 
@@ -21,7 +23,12 @@ from website_issues.mapreduce import tasks
 
 
 def runner(job):
-    job.additer(tasks.SiteSummaryMapper, tasks.CommentClusteringReducer)
+    # generate_sites passes columnar exports as row ranges of the export
+    if os.environ.get("SITES_INPUT") == "columns":
+        mapper = tasks.ColumnarSiteSummaryMapper
+    else:
+        mapper = tasks.SiteSummaryMapper
+    job.additer(mapper, tasks.CommentClusteringReducer)
     job.additer(identitymapper, tasks.ClusterIdReducer)
     job.additer(identitymapper, tasks.SummarySizeReducer)
     job.additer(identitymapper, tasks.SummaryIdReducer)
@@ -2,6 +2,8 @@ from itertools import product as cartesian
 
 from textcluster.cluster import Corpus
 
+from api.columnar import read_columns
+
 from website_issues.utils import normalize_url
 
 from input import OPINION_PRAISE, OPINION_ISSUE, OPINION_BROKEN
@@ -46,20 +48,59 @@ class SiteSummaryMapper(object):
         self.comments_out = self.counters["comments used"]
 
     def __call__(self, data):
-        supported_types = set([OPINION_BROKEN.short,
-                               OPINION_ISSUE.short,
-                               OPINION_PRAISE.short])
         for key, value in recombined(data):
-            self.comments_in += 1
             m_id, ts, type, product, version, platform, locale, \
                 manufacturer, device, url, message = value.split('\t', 10)
-            if not url or type not in supported_types: continue
-            app = '<%s>' % product
-            site = normalize_url(url)
-            out_keys = cartesian((version,), (site,), (app, platform, None), (type,))
-            out_value = (m_id, message)
-            self.comments_out += 1
-            for out_key in out_keys: yield (out_key, out_value)
+            for pair in self.summaries(m_id, type, product, version,
+                                       platform, url, message):
+                yield pair
+
+    def summaries(self, m_id, type, product, version, platform, url, message):
+        supported_types = set([OPINION_BROKEN.short,
+                               OPINION_ISSUE.short,
+                               OPINION_PRAISE.short])
+        self.comments_in += 1
+        if not url or type not in supported_types: return
+        app = '<%s>' % product
+        site = normalize_url(url)
+        out_keys = cartesian((version,), (site,), (app, platform, None), (type,))
+        out_value = (m_id, message)
+        self.comments_out += 1
+        for out_key in out_keys: yield (out_key, out_value)
+
+
+# columns of the opinions export used by the site summary mapper
+MAPPER_COLUMNS = ("id", "type", "product", "version", "platform", "url",
+                  "description")
+
+
+class ColumnarSiteSummaryMapper(SiteSummaryMapper):
+    """Map each site summary to the matching messages, reading the opinions
+    from a columnar export (see api.columnar) instead of TSV lines.
+    Run n mappers.
+
+    > ((byte,), (export path, first row, end row))*
+    < ((version, site, platform/app, type), (m_id, message))*
+    """
+
+    def __init__(self):
+        super(ColumnarSiteSummaryMapper, self).__init__()
+        self.exports = {}
+
+    def __call__(self, data):
+        for key, value in data:
+            path, start, end = value.split('\t')
+            if path not in self.exports:
+                columns = read_columns(path, MAPPER_COLUMNS)
+                self.exports[path] = [columns[name] for name in MAPPER_COLUMNS]
+            columns = self.exports[path]
+            for i in xrange(int(start), int(end)):
+                values = [column[i] for column in columns]
+                # same strings as in the TSV export
+                values = [str(v) if isinstance(v, (int, long)) else
+                          (v or u'').encode('utf-8') for v in values]
+                for pair in self.summaries(*values):
+                    yield pair
 
 
 class CommentClusteringReducer(object):
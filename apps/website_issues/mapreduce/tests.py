@@ -1,8 +1,12 @@
+import os
 import sys
 import bz2
+import shutil
+import tempfile
 import StringIO
 
 import test_utils
+from mock import patch
 from nose.tools import eq_
 from dumbo.backends.common import MapRedBase
 from dumbo.lib import identitymapper
@@ -10,7 +14,8 @@ from django.utils.functional import memoize
 from django.core.management import call_command
 
 from website_issues.mapreduce import tasks
-from website_issues.mapreduce import generate_sites
+from api.columnar import ColumnWriter
+from website_issues.mapreduce import generate_sites, _columnar_splits
 
 
 TEST_FILE = "lib/website_issues/test_opinions.tsv"
@@ -90,6 +95,28 @@ class TestTasks(test_utils.TestCase):
             all_values.extend(values)
         eq_(len(all_values), 141)
 
+    @patch('website_issues.mapreduce.COLUMNAR_SPLIT', 50)
+    def test_columnar_sitesummary_mapper(self):
+        """The mapper reads a columnar export like the same TSV."""
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "opinions.columns")
+            writer = ColumnWriter(path)
+            pairs = tasks.recombined(self._input_pairs(open(TEST_FILE)))
+            for key, value in pairs:
+                row = value.split('\t', 10)
+                writer.append([int(row[0]), int(row[1])] + row[2:])
+            writer.close()
+
+            splits = StringIO.StringIO()
+            _columnar_splits(path, splits)
+            splits.seek(0)
+            mapper = _dumbo_mixin(tasks.ColumnarSiteSummaryMapper)()
+            buckets = _map(mapper, self._input_pairs(splits))
+            eq_(buckets, self._summaries())
+        finally:
+            shutil.rmtree(tmp)
+
     # mapreduce iteration 1
     def _clusters(self):
         bucket_list = _shuffle(self._summaries())
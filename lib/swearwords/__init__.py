@@ -1,19 +1,134 @@
 """
 (Incomplete) bad words list, not to filter every conceivable swear word but
 to encourage constructive feedback.
+
+Words may contain ``*`` wildcards, matching any number of word characters,
+and only match on word boundaries.
 """
 import os
 import re
+import threading
+import time
+
+from swearwords.ahocorasick import Automaton
 
 
 root = os.path.dirname(os.path.realpath(__file__))
+WORDLIST_FILE = os.path.join(root, 'badwords.txt')
+# Seconds between checks whether the word list file changed.
+RELOAD_INTERVAL = 60
+
+WORD_CHAR_RE = re.compile(r'\w')
+
+
+def _reverse_pattern(pieces):
+    """Regex for the (reversed) part of a word left of its anchor."""
+    return re.compile('\w*' + '\w*'.join(re.escape(p[::-1])
+                                         for p in pieces[::-1]) + '(?!\w)')
+
+
+class Matcher(object):
+    """
+    Finds words of a list in a text.
+
+    The longest literal piece of each word (its "anchor") goes into an
+    Aho-Corasick automaton, so the text is scanned once however long the
+    list is. Only where an anchor is found, the rest of the word, wildcards
+    and word boundaries included, is checked with small regexes.
+    """
+
+    def __init__(self, words):
+        self.words = set(w.strip().lower() for w in words if w.strip('* \n'))
+        anchors = {}
+        for word in self.words:
+            pieces = word.split('*')
+            k = max(range(len(pieces)), key=lambda i: len(pieces[i]))
+            # Left of the anchor: matched backwards from the anchor's start.
+            if k:
+                left = _reverse_pattern(pieces[:k])
+            else:
+                left = None
+            # The anchor and everything right of it.
+            right = re.compile('\w*'.join(map(re.escape, pieces[k:])) +
+                               '(?!\w)')
+            anchors.setdefault(pieces[k], []).append((left, right))
+        self.automaton = Automaton(anchors)
+
+    def regex(self):
+        """The equivalent alternation regex (as the old BADWORD_RE)."""
+        return re.compile(r'(?:[^\w]|^)(%s)(?:[^\w]|$)' % '|'.join(
+            '\w*'.join(map(re.escape, w.split('*'))) for w in self.words))
+
+    def spans(self, text):
+        """
+        (start, end) of all matches, leftmost-longest and non-overlapping.
+        """
+        text = text.lower()
+        reverse = None
+        found = {}
+        for start, end, candidates in self.automaton.finditer(text):
+            for left, right in candidates:
+                match = right.match(text, start)
+                if not match:
+                    continue
+                if left:
+                    if reverse is None:
+                        reverse = text[::-1]
+                    rmatch = left.match(reverse, len(text) - start)
+                    if not rmatch:
+                        continue
+                    begin = start - (rmatch.end() - rmatch.start())
+                elif start and WORD_CHAR_RE.match(text, start - 1):
+                    continue
+                else:
+                    begin = start
+                found[begin] = max(found.get(begin, 0), match.end())
+
+        spans, last = [], 0
+        for begin in sorted(found):
+            if begin >= last:
+                spans.append((begin, found[begin]))
+                last = found[begin]
+        return spans
+
+    def findall(self, text):
+        lower = text.lower()
+        return [lower[start:end] for start, end in self.spans(text)]
+
+
+_lock = threading.Lock()
+_loaded = {'mtime': None, 'checked': 0}
+
+
+def load(path=WORDLIST_FILE):
+    """(Re)load the word list, replacing the module's matcher."""
+    global WORDLIST, BADWORD_RE, matcher
+    with _lock:
+        mtime = os.path.getmtime(path)
+        with open(path, 'r') as f:
+            words = set(f.read().splitlines())
+        new = Matcher(words)
+        WORDLIST, BADWORD_RE, matcher = words, new.regex(), new
+        _loaded.update(mtime=mtime, checked=time.time())
+
+
+def reload_if_changed(path=WORDLIST_FILE):
+    """Reload the word list if the file changed, at most every so often."""
+    now = time.time()
+    if now - _loaded['checked'] < RELOAD_INTERVAL:
+        return
+    _loaded['checked'] = now
+    try:
+        changed = os.path.getmtime(path) != _loaded['mtime']
+    except OSError:
+        return
+    if changed:
+        load(path)
+
+load()
 
-WORDLIST = set(
-    open(os.path.join(root, 'badwords.txt'), 'r').read().splitlines())
-BADWORD_RE = re.compile(r'(?:[^\w]|^)(%s)(?:[^\w]|$)' % (
-    '|'.join([ r for r in [ '\w*'.join(map(re.escape, w.split('*'))) for
-                            w in WORDLIST ] ])))
 
 def find_swearwords(str):
     """Find swearwords in a string."""
-    return BADWORD_RE.findall(str.lower())
+    reload_if_changed()
+    return matcher.findall(str)
@@ -0,0 +1,52 @@
+"""
+Aho-Corasick automaton: finds all occurrences of many literal strings in a
+text in one pass, however many strings there are.
+"""
+
+
+class Automaton(object):
+    """
+    Build with a dict of {key string: value}; ``finditer(text)`` then yields
+    ``(start, end, value)`` for every (possibly overlapping) occurrence of
+    a key in ``text``.
+    """
+
+    def __init__(self, keys):
+        # Node 0 is the root. goto[n] maps a character to the child node,
+        # fail[n] is the node for the longest proper suffix of n's string
+        # that is also in the trie, out[n] lists (key length, value) of the
+        # keys ending at n.
+        self.goto, self.fail, self.out = [{}], [0], [[]]
+        for key, value in keys.items():
+            node = 0
+            for c in key:
+                child = self.goto[node].get(c)
+                if child is None:
+                    child = self.goto[node][c] = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                node = child
+            self.out[node].append((len(key), value))
+
+        # Breadth first, so the fail node of each node is done before it.
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for c, child in self.goto[node].items():
+                queue.append(child)
+                fail = self.fail[node]
+                while fail and c not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[child] = self.goto[fail].get(c, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def finditer(self, text):
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        for i, c in enumerate(text):
+            while node and c not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(c, 0)
+            if out[node]:
+                for length, value in out[node]:
+                    yield i + 1 - length, i + 1, value
@@ -5,3 +5,32 @@ def test_swearwords():
     ['shit', 'piss', 'fuck', 'cunt', 'cocksucker', 'motherfucker', 'tits']
     """
     pass
+
+
+def test_wildcards_and_boundaries():
+    """
+    >>> from swearwords import find_swearwords
+    >>> find_swearwords('You bastards! Classic assessment, f u c king @$$ ok')
+    ['bastards', 'f u c king', '@$$']
+    >>> find_swearwords('shit piss')
+    ['shit', 'piss']
+    """
+    pass
+
+
+def test_reload():
+    """
+    >>> import os, tempfile, swearwords
+    >>> fd, path = tempfile.mkstemp()
+    >>> os.write(fd, 'foo*\\n*bar\\n')
+    10
+    >>> os.close(fd)
+    >>> swearwords.load(path)
+    >>> swearwords.find_swearwords('Foobar is foolish, shit, crowbar')
+    ['foobar', 'foolish', 'crowbar']
+    >>> swearwords.load()
+    >>> os.remove(path)
+    >>> swearwords.find_swearwords('Foobar is foolish, shit')
+    ['shit']
+    """
+    pass
@@ -0,0 +1,20 @@
+CREATE TABLE `feedback_daily_count` (
+    `id` integer AUTO_INCREMENT NOT NULL PRIMARY KEY,
+    `day` integer UNSIGNED NOT NULL,
+    `product` smallint UNSIGNED NOT NULL,
+    `version` varchar(30) NOT NULL,
+    `type` smallint UNSIGNED NOT NULL,
+    `platform` varchar(30) NOT NULL,
+    `locale` varchar(30) NOT NULL,
+    `manufacturer` varchar(255) NOT NULL,
+    `device` varchar(255) NOT NULL,
+    `dimensions` char(32) NOT NULL,
+    `count` integer UNSIGNED NOT NULL,
+    UNIQUE (`day`, `dimensions`),
+    INDEX (`product`, `version`, `day`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+CREATE TABLE `feedback_rollup_state` (
+    `name` varchar(50) NOT NULL PRIMARY KEY,
+    `last_id` integer UNSIGNED NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
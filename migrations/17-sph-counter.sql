@@ -0,0 +1,6 @@
+-- Highest opinion ids in the Sphinx main (counter_id 1) and delta
+-- (counter_id 2) indexes. See configs/sphinx/sphinx.conf.
+CREATE TABLE `sph_counter` (
+    `counter_id` integer NOT NULL PRIMARY KEY,
+    `max_doc_id` integer UNSIGNED NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
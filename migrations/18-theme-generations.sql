@@ -0,0 +1,28 @@
+-- Themes are written a generation at a time; theme_current points to the
+-- generation shown. See themes.cron.
+ALTER TABLE `theme` ADD `generation` integer UNSIGNED NOT NULL DEFAULT 0,
+    ADD INDEX (`generation`);
+
+CREATE TABLE `theme_generation` (
+    `id` integer AUTO_INCREMENT NOT NULL PRIMARY KEY,
+    `last_opinion_id` integer UNSIGNED NOT NULL,
+    `created` datetime NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+CREATE TABLE `theme_partition` (
+    `id` integer AUTO_INCREMENT NOT NULL PRIMARY KEY,
+    `generation` integer UNSIGNED NOT NULL,
+    `product` smallint UNSIGNED NOT NULL,
+    `feeling` varchar(20) NOT NULL,
+    `platform` varchar(255) NOT NULL,
+    `size` integer UNSIGNED NOT NULL,
+    `changed` integer UNSIGNED NOT NULL,
+    INDEX (`generation`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+CREATE TABLE `theme_current` (
+    `id` integer NOT NULL PRIMARY KEY,
+    `generation` integer UNSIGNED NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+INSERT INTO `theme_current` (`id`, `generation`) VALUES (1, 0);
@@ -0,0 +1,10 @@
+-- Batches of ids input.coalesce queues are sending, until their task is
+-- queued. Batches never queued are sent by the flush_coalesced cron job.
+CREATE TABLE `coalesce_pending` (
+    `id` integer AUTO_INCREMENT NOT NULL PRIMARY KEY,
+    `task` varchar(100) NOT NULL,
+    `object_id` integer UNSIGNED NOT NULL,
+    `created` datetime NOT NULL,
+    UNIQUE (`task`, `object_id`),
+    INDEX (`created`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Benchmark theme clustering backends.
+
+Clusters synthetic weeks of comments with the sparse backend
+(``themes.similarity.Corpus``) and, up to ``--compare-max`` comments, with
+``textcluster.Corpus``, and checks both find the same groups. Comments are
+made from the descriptions in the website issues test corpus
+(``lib/website_issues/test_opinions.tsv``): some are copied with a few words
+changed, so there is something to cluster, the rest are random words from
+it.
+
+Usage: scripts/benchmarks/bench_clustering.py [--sizes 10000,50000,200000]
+           [--compare-max N] [--threshold T]
+"""
+import os
+import random
+import site
+import sys
+import time
+from optparse import OptionParser
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+for d in ('apps', 'lib', 'vendor', 'vendor/lib/python'):
+    site.addsitedir(os.path.join(ROOT, d))
+sys.path.insert(0, ROOT)
+
+from textcluster import Corpus
+from textcluster.search import STOPWORDS
+
+from themes.similarity import Corpus as SparseCorpus
+
+
+CORPUS = os.path.join(ROOT, 'lib', 'website_issues', 'test_opinions.tsv')
+
+
+def comments(texts, count, seed=0):
+    """``count`` (id, comment) documents made from ``texts``."""
+    rand = random.Random(seed)
+    vocabulary = ' '.join(texts).split()
+    docs = []
+    for id in xrange(1, count + 1):
+        if rand.random() < 0.3:
+            words = rand.choice(texts).split()
+            for i in xrange(rand.randint(0, 2)):
+                words[rand.randrange(len(words))] = rand.choice(vocabulary)
+        else:
+            words = [rand.choice(vocabulary)
+                     for i in xrange(rand.randint(5, 30))]
+        docs.append((id, ' '.join(words)))
+    return docs
+
+
+def bench(label, corpus, docs):
+    start = time.time()
+    for id, text in docs:
+        corpus.add(id, str=text, key=id)
+    groups = corpus.cluster()
+    elapsed = time.time() - start
+    print '%-8d %-12s %8.2fs %6d groups' % (len(docs), label, elapsed,
+                                            len(groups))
+    return sorted((g.primary, sorted(s['object'] for s in g.similars))
+                  for g in groups)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--sizes', default='10000,50000,200000',
+                      help='Comma separated numbers of comments.')
+    parser.add_option('--compare-max', type='int', default=50000,
+                      help='Largest size to also cluster with textcluster.')
+    parser.add_option('--threshold', type='float', default=2,
+                      help='Similarity threshold (CLUSTER_SIM_THRESHOLD).')
+    options, args = parser.parse_args()
+
+    with open(CORPUS) as f:
+        texts = [line.rstrip('\n').split('\t')[-1].decode('utf-8')
+                 for line in f]
+    texts = [t for t in texts if len(t.split()) > 2]
+
+    for size in map(int, options.sizes.split(',')):
+        docs = comments(texts, size)
+        sparse = bench('sparse', SparseCorpus(similarity=options.threshold,
+                                              stopwords=STOPWORDS), docs)
+        if size <= options.compare_max:
+            reference = bench('textcluster',
+                              Corpus(similarity=options.threshold,
+                                     stopwords=STOPWORDS), docs)
+            if sparse != reference:
+                print 'Groups differ!'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Benchmark the opinion export's compression stage.
+
+Serializes a synthetic opinions table (5M rows by default) into TSV buckets
+the way ``api.cron.export_tsv`` does and times writing it in each export
+format, compared to the old single-stream ``bz2.BZ2File`` writer.
+
+Usage: scripts/benchmarks/bench_export.py [--rows N] [--processes N]
+"""
+import bz2
+import os
+import random
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, os.path.join(ROOT, 'apps', 'api'))
+
+from compress import FORMATS, write_compressed
+
+
+WORDS = ('firefox crash slow fast tabs startup memory flash video page '
+         'love hate addon update bookmark sync search bar menu button').split()
+TYPES = ('praise', 'issue', 'idea')
+PLATFORMS = ('winxp', 'win7', 'vista', 'mac', 'linux', 'android', 'maemo')
+LOCALES = ('en-US', 'de', 'fr', 'es', 'ja', 'ru', '')
+URLS = ('', '', '', 'http://example.com', 'https://mail.example.org')
+
+
+def synthetic_chunks(rows, bucket_size):
+    """Yield TSV buckets of synthetic opinion rows."""
+    rnd = random.Random(42)
+    ts = 1277268743
+    for start in xrange(0, rows, bucket_size):
+        lines = []
+        for id in xrange(start + 1, min(start + bucket_size, rows) + 1):
+            ts += rnd.randint(0, 20)
+            lines.append('\t'.join((
+                str(id), str(ts), rnd.choice(TYPES), 'firefox', '4.0b12',
+                rnd.choice(PLATFORMS), rnd.choice(LOCALES), '', '',
+                rnd.choice(URLS),
+                ' '.join(rnd.choice(WORDS) for i in xrange(15)))))
+        yield '\n'.join(lines) + '\n'
+
+
+def bench(label, func, path):
+    start = time.time()
+    func()
+    elapsed = time.time() - start
+    size = os.path.getsize(path)
+    print '%-22s %8.1fs %10.1f MB' % (label, elapsed, size / 1024.0 / 1024)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--rows', type='int', default=5 * 10 ** 6)
+    parser.add_option('--bucket', type='int', default=10000)
+    parser.add_option('--processes', type='int', default=None)
+    options, args = parser.parse_args()
+
+    chunks = lambda: synthetic_chunks(options.rows, options.bucket)
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+
+    def old_bz2():
+        outfile = bz2.BZ2File(path, 'w')
+        for chunk in chunks():
+            outfile.write(chunk)
+        outfile.close()
+
+    def new(format, processes):
+        def run():
+            with open(path, 'wb') as outfile:
+                write_compressed(outfile, chunks(), format, processes)
+        return run
+
+    try:
+        print '%d rows, %d rows per chunk.' % (options.rows, options.bucket)
+        bench('serialize only', lambda: sum(1 for c in chunks()), path)
+        bench('bz2 (BZ2File)', old_bz2, path)
+        for format in sorted(FORMATS):
+            bench('%s (1 process)' % format, new(format, 1), path)
+            bench('%s (pool)' % format, new(format, options.processes), path)
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Benchmark swear word matching.
+
+Times the old alternation regex (``BADWORD_RE``) against the Aho-Corasick
+``swearwords.Matcher`` on the website issues test corpus, with the real
+word list and with a list ``--scale`` times as long (the real words plus
+made up variants of them).
+
+Usage: scripts/benchmarks/bench_swearwords.py [--scale N] [--passes N]
+"""
+import os
+import random
+import string
+import sys
+import time
+from optparse import OptionParser
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, os.path.join(ROOT, 'lib'))
+
+import swearwords
+from swearwords import Matcher
+
+
+CORPUS = os.path.join(ROOT, 'lib', 'website_issues', 'test_opinions.tsv')
+
+
+def scaled(words, scale):
+    """The word list plus (scale - 1) random variants of each word."""
+    rnd = random.Random(42)
+    out = set(words)
+    for word in words:
+        for i in xrange(scale - 1):
+            pos = rnd.randint(0, len(word))
+            out.add(word[:pos] + rnd.choice(string.ascii_lowercase) * 2 +
+                    word[pos:])
+    return out
+
+
+def bench(label, func, texts, passes):
+    start = time.time()
+    for i in xrange(passes):
+        for text in texts:
+            func(text)
+    elapsed = time.time() - start
+    count = len(texts) * passes
+    print '%-28s %8.2fs %10.0f texts/s' % (label, elapsed,
+                                           count / (elapsed or 1e-9))
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--scale', type='int', default=10)
+    parser.add_option('--passes', type='int', default=5)
+    options, args = parser.parse_args()
+
+    with open(CORPUS) as f:
+        texts = [line.rstrip('\n').split('\t')[-1].decode('utf-8')
+                 for line in f]
+
+    for scale in (1, options.scale):
+        words = scaled(swearwords.WORDLIST, scale)
+        start = time.time()
+        matcher = Matcher(words)
+        built = time.time() - start
+        regex = matcher.regex()
+        print '%d words (matcher built in %.2fs), %d texts, %d passes.' % (
+            len(words), built, len(texts), options.passes)
+        bench('regex', lambda t: regex.findall(t.lower()), texts,
+              options.passes)
+        bench('aho-corasick', matcher.findall, texts, options.passes)
+
+
+if __name__ == '__main__':
+    main()
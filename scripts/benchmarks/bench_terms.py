@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Benchmark term extraction per comment.
+
+Extracts terms from every description in the website issues test corpus
+(``lib/website_issues/test_opinions.tsv``) with the old implementation (a
+new ``TermExtractor`` per comment), with pooled extractors, and with pooled
+extractors plus the per-process word cache.
+
+The first pass over the corpus is reported on its own: only it shows what
+the cache does for comments it hasn't seen. Further passes (``--passes``)
+are reported on a separate line; for the cache, they are all hits.
+
+Usage: scripts/benchmarks/bench_terms.py [--passes N]
+"""
+import os
+import site
+import sys
+import time
+from optparse import OptionParser
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+for d in ('apps', 'lib', 'vendor', 'vendor/lib/python'):
+    site.addsitedir(os.path.join(ROOT, d))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+
+from django.conf import settings
+from topia.termextract import extract
+
+from feedback import utils
+
+
+CORPUS = os.path.join(ROOT, 'lib', 'website_issues', 'test_opinions.tsv')
+
+
+def old_extract_terms(text):
+    extractor = extract.TermExtractor()
+    extractor.filter = extract.permissiveFilter
+    terms = extractor(text)
+    return [t[0].lower() for t in terms if t[2] == 1 and
+            settings.MIN_TERM_LENGTH <= len(t[0]) <= settings.MAX_TERM_LENGTH]
+
+
+def report(label, elapsed, count):
+    print '%-32s %8.2fs %10.3f ms/comment' % (label, elapsed,
+                                              elapsed * 1000 / count)
+
+
+def bench(label, func, texts, passes):
+    times = []
+    for i in xrange(passes):
+        start = time.time()
+        for text in texts:
+            func(text)
+        times.append(time.time() - start)
+    report(label, times[0], len(texts))
+    if passes > 1:
+        report('  passes 2-%d' % passes, sum(times[1:]),
+               len(texts) * (passes - 1))
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--passes', type='int', default=1,
+                      help='Times to go through the corpus. Passes after '
+                           'the first are reported separately.')
+    options, args = parser.parse_args()
+
+    with open(CORPUS) as f:
+        texts = [line.rstrip('\n').split('\t')[-1].decode('utf-8')
+                 for line in f]
+    print '%d comments, %d passes.' % (len(texts), options.passes)
+
+    bench('new extractor per call', old_extract_terms, texts, options.passes)
+    bench('pooled extractor', utils._extract_terms, texts, options.passes)
+    utils._terms_cache.clear()
+    bench('pooled + word cache', utils.extract_terms, texts, options.passes)
+    print 'cache:', utils._terms_cache.stats()
+
+
+if __name__ == '__main__':
+    main()
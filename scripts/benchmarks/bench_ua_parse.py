@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Benchmark User-Agent parsing.
+
+Parses real UA strings from the opinions table (the latest ``--limit``
+opinions, or one UA per line from ``--file``) with the old implementation
+(``re.match`` per browser pattern, ``str.find`` per platform) and with the
+single-scan ``feedback.utils`` parser, uncached and cached. Also reports
+any UA strings the two parse differently.
+
+Usage: scripts/benchmarks/bench_ua_parse.py [--limit N | --file FILE]
+"""
+import os
+import re
+import site
+import sys
+import time
+from optparse import OptionParser
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+for d in ('apps', 'lib', 'vendor', 'vendor/lib/python'):
+    site.addsitedir(os.path.join(ROOT, d))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+
+from product_details.version_compare import Version
+
+from input import BROWSERS, PLATFORM_OTHER, PLATFORM_PATTERNS
+from feedback import utils
+from feedback.models import Opinion
+
+
+def old_ua_parse(ua):
+    if not ua:
+        return None
+    detected = {}
+    for browser in BROWSERS:
+        match = re.match(browser[1], ua)
+        if match:
+            try:
+                version = Version(match.group(2))
+            except:
+                return None
+            detected = {'browser': browser[0], 'version': str(version)}
+            break
+    if not detected:
+        return None
+    platform = PLATFORM_OTHER.short
+    for pattern in PLATFORM_PATTERNS:
+        if ua.find(pattern[0]) >= 0:
+            platform = pattern[1]
+            break
+    detected['platform'] = platform
+    return detected
+
+
+def bench(label, func, uas):
+    start = time.time()
+    for ua in uas:
+        func(ua)
+    elapsed = time.time() - start
+    print '%-22s %8.2fs %12.0f UAs/s' % (label, elapsed,
+                                         len(uas) / (elapsed or 1e-9))
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--limit', type='int', default=100000,
+                      help='Number of opinions to read UAs from.')
+    parser.add_option('--file', help='Read UA strings from this file.')
+    options, args = parser.parse_args()
+
+    if options.file:
+        with open(options.file) as f:
+            uas = [line.rstrip('\n') for line in f]
+    else:
+        uas = list(Opinion.objects.order_by('-id')
+                   .values_list('user_agent', flat=True)[:options.limit])
+    print '%d UA strings, %d distinct.' % (len(uas), len(set(uas)))
+
+    bench('old', old_ua_parse, uas)
+    bench('single scan', utils._ua_parse, uas)
+    utils.ua_parse.cache.clear()
+    bench('single scan + cache', utils.ua_parse, uas)
+    print 'cache:', utils.ua_parse.cache.stats()
+
+    differ = [ua for ua in set(uas) if old_ua_parse(ua) != utils._ua_parse(ua)]
+    print '%d UA strings parsed differently.' % len(differ)
+    for ua in differ[:10]:
+        print '  %r' % ua
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Benchmark validation of feedback descriptions in the form layer.
+
+Cleans every description of the website issues test corpus (plus some
+that fail validation) with a form field using the old chain of
+validators and with one using ``validate_description``, and reports
+submissions per second. The duplicate check of ``FeedbackForm.clean``
+needs the database and is left out.
+
+Usage: scripts/benchmarks/bench_validators.py [--passes N]
+"""
+import os
+import site
+import sys
+import time
+from optparse import OptionParser
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+for d in ('apps', 'lib', 'vendor', 'vendor/lib/python'):
+    site.addsitedir(os.path.join(ROOT, d))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+
+from django import forms
+from django.core.exceptions import ValidationError
+
+from input import OPINION_ISSUE
+from feedback.validators import (validate_swearwords, validate_no_html,
+                                 validate_no_email, validate_no_urls,
+                                 validate_description)
+
+
+CORPUS = os.path.join(ROOT, 'lib', 'website_issues', 'test_opinions.tsv')
+INVALID = (
+    u'This damn thing crashes all the time!',
+    u'Mail me at someone@example.com, I can explain.',
+    u'It breaks on http://example.com/page, see <a href="#">here</a>.',
+)
+
+
+def field(validators):
+    return forms.CharField(max_length=OPINION_ISSUE.max_length,
+                           validators=validators)
+
+
+def bench(label, field, texts, passes):
+    failed = 0
+    start = time.time()
+    for i in xrange(passes):
+        for text in texts:
+            try:
+                field.clean(text)
+            except ValidationError:
+                failed += 1
+    elapsed = time.time() - start
+    count = len(texts) * passes
+    print '%-18s %8.2fs %10.0f submissions/s (%d invalid)' % (
+        label, elapsed, count / (elapsed or 1e-9), failed / passes)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--passes', type='int', default=10)
+    options, args = parser.parse_args()
+
+    with open(CORPUS) as f:
+        texts = [line.rstrip('\n').split('\t')[-1].decode('utf-8')
+                 for line in f]
+    texts.extend(INVALID)
+    print '%d descriptions, %d passes.' % (len(texts), options.passes)
+
+    bench('validator chain', field([validate_swearwords, validate_no_html,
+                                    validate_no_email, validate_no_urls]),
+          texts, options.passes)
+    bench('combined', field([validate_description]), texts, options.passes)
+
+
+if __name__ == '__main__':
+    main()
@@ -42,6 +42,9 @@ SLAVE_DATABASES = []
 CACHE_DEFAULT_PERIOD = CACHE_MIDDLEWARE_SECONDS = 60 * 5  # 5 minutes
 CACHE_COUNT_TIMEOUT = 60  # seconds
 CACHE_PREFIX = CACHE_MIDDLEWARE_KEY_PREFIX = 'reporter:'
+# Opinions cached by id for search results; dropped from the cache on save.
+OPINION_CACHE_TIMEOUT = 60 * 60
+
 # L10n
 
 # Local time zone for this installation. Choices can be found here:
@@ -288,6 +291,10 @@ PROD_DETAILS_DIR = path('lib/product_details_json')
 # Term filter options
 MIN_TERM_LENGTH = 3
 MAX_TERM_LENGTH = 25
+# Number of words whose term extraction tags are cached per process.
+TERMS_CACHE_SIZE = 10000
+# Number of parsed User-Agent strings cached per process.
+UA_PARSE_CACHE_SIZE = 5000
 
 # Number of items to show in the "Trends" box and Messages box.
 MESSAGES_COUNT = 10
@@ -302,6 +309,10 @@ SPHINX_INDEXER = 'indexer'
 SPHINX_CATALOG_PATH = path('tmp/data/sphinx')
 SPHINX_LOG_PATH = path('tmp/log/searchd')
 SPHINX_CONFIG_PATH = path('configs/sphinx/sphinx.conf')
+# Keep connections to searchd open and reuse them across requests, up to
+# SPHINX_POOL_SIZE idle connections per process.
+SPHINX_PERSISTENT = False
+SPHINX_POOL_SIZE = 4
 
 TEST_SPHINX_PORT = 3414
 TEST_SPHINXQL_PORT = 3409
@@ -311,10 +322,32 @@ TEST_SPHINX_LOG_PATH = path('tmp/test/log/searchd')
 SEARCH_MAX_RESULTS = 1000
 SEARCH_PERPAGE = 20  # results per page
 SEARCH_MAX_PAGES = SEARCH_MAX_RESULTS / SEARCH_PERPAGE
+# Seconds facet counts (search meta queries) are fresh, and after that how
+# long stale counts are still served while they are being recomputed.
+SEARCH_FACET_CACHE_TIMEOUT = 60
+SEARCH_FACET_STALE_TIMEOUT = 60 * 5
+# Count facets of searches without a term from the daily rollup table (see
+# the update_daily_counts cron) instead of asking Sphinx.
+SEARCH_ROLLUP_FACETS = True
 
 TEST_RUNNER = 'test_utils.runner.RadicalTestSuiteRunner'
 
 CLUSTER_SIM_THRESHOLD = 2
+# Processes clustering themes in parallel (None: one per CPU).
+CLUSTER_PROCESSES = None
+# How themes are clustered: 'textcluster', or 'sparse' for the equivalent
+# but vectorized themes.similarity (needs NumPy and SciPy).
+CLUSTER_BACKEND = 'textcluster'
+# Opinions this similar (estimated Jaccard similarity of their character
+# shingles) are collapsed into one before clustering (see themes.dedupe).
+CLUSTER_DUPLICATE_SIMILARITY = 0.8
+# Partitions with fewer opinions only have exact duplicates collapsed.
+CLUSTER_DUPLICATE_MIN_DOCUMENTS = 1000
+# Share of a partition's opinions that may be added or aged out since it was
+# last clustered from scratch before it is again (see themes.cron.cluster).
+CLUSTER_DRIFT = 0.3
+# Rows per INSERT statement when writing themes and their items.
+CLUSTER_BATCH_SIZE = 1000
 
 ## Celery
 BROKER_HOST = "127.0.0.1"
@@ -332,14 +365,32 @@ djcelery.setup_loader()
 
 ## API
 TSV_EXPORT_DIR = path('media/data')
+# Processes compressing gz and pbz2 TSV exports in parallel. None: one per
+# CPU. bz2 exports are a single stream, compressed in one process.
+TSV_EXPORT_PROCESSES = None
 
 # URL for reporting arecibo errors too. If not set, won't be sent.
 ARECIBO_SERVER_URL = ""
 
+# Maximum number of opinions accepted by one bulk feedback request.
+BULK_FEEDBACK_MAX = 500
+
 ## ElasticSearch
 ES_HOSTS = []
 ES_INDEX = 'input'
 ES_DISABLED = True
+# Largest bulk indexing request, in documents and bytes, and how often
+# failed documents are retried.
+ES_BULK_DOCS = 500
+ES_BULK_BYTES = 5 * 1024 * 1024
+ES_BULK_RETRIES = 3
+# Ids for batched tasks (e.g. opinions to reindex) are collected for up to
+# this many seconds, or until there are this many, then sent as one task.
+COALESCE_WINDOW = 2
+COALESCE_SIZE = 200
+# Stored batches of ids this many seconds old were never queued; the
+# flush_coalesced cron job sends them.
+COALESCE_STALE = 5 * 60
 ## FEATURE FLAGS:
 # Setting this to False allows feedback to be collected from any user agent.
 # (good for testing)
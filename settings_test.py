@@ -1,2 +1,3 @@
 DISABLE_TERMS = True
 ES_DISABLED = True
+COALESCE_WINDOW = 0